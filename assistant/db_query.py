@@ -7,8 +7,12 @@ from django.utils import timezone
 from core.models import User
 from courses.models import Course, Lesson, Enrollment
 from payments.models import PaymentTransaction
+from payments.aggregates import daily_revenue, revenue_totals
 from invoices.models import Invoice, CompanyConfig
 from scheduler.models import Event, EventLocation as Studio, Course, EventParticipant
+from scheduler.availability import Availability
+from scheduler.booking import BookingConflict, book_event
+from scheduler.participants import add_participants
 from django.db.models import Q
 import re
 import pytz
@@ -149,15 +153,16 @@ def get_financial_data():
         result = "# 💰 Relatório Financeiro Completo\n\n"
         
         try:
-            # Dados gerais de pagamentos
+            # Dados gerais de pagamentos (rollup diário)
             transactions = PaymentTransaction.objects.all()
-            total_revenue = transactions.filter(status='PAID').aggregate(Sum('amount'))['amount__sum'] or 0
-            pending_amount = transactions.filter(status='PENDING').aggregate(Sum('amount'))['amount__sum'] or 0
+            totals = revenue_totals()
+            total_revenue = totals['paid_amount']
+            pending_amount = totals['pending_amount']
             
             # Contagens de transações
-            total_paid = transactions.filter(status='PAID').count()
-            total_pending = transactions.filter(status='PENDING').count()
-            total_cancelled = transactions.filter(status='CANCELLED').count()
+            total_paid = totals['paid_count']
+            total_pending = totals['pending_count']
+            total_cancelled = totals.get('cancelled_count', 0)
         except Exception as payment_error:
             # Se ocorrer erro com transações, definir valores padrão
             result += f"_Aviso: Erro ao acessar transações: {str(payment_error)}_\n\n"
@@ -196,59 +201,27 @@ def get_financial_data():
         # Top cursos por faturamento - com tratamento de erro
         try:
             result += "## Top Cursos por Faturamento\n"
-            top_courses = Course.objects.all()
-            course_revenues = []
-            
-            # Calcular receita para cada curso com tratamento de exceções
-            for course in top_courses:
-                try:
-                    # Obter matrículas do curso
-                    enrollments = Enrollment.objects.filter(course=course)
-                    # Obter pagamentos para essas matrículas
-                    course_revenue = 0
-                    for enrollment in enrollments:
-                        try:
-                            # Verificação robusta do relacionamento enrollment-payment
-                            # Tenta diferentes possíveis nomes de campos
-                            try:
-                                paid = PaymentTransaction.objects.filter(
-                                    enrollment=enrollment,
-                                    status='PAID'
-                                ).aggregate(Sum('amount'))['amount__sum'] or 0
-                            except:
-                                # Tentar outra abordagem com ID direto
-                                paid = PaymentTransaction.objects.filter(
-                                    enrollment_id=enrollment.id,
-                                    status='PAID'
-                                ).aggregate(Sum('amount'))['amount__sum'] or 0
-                                
-                            course_revenue += paid
-                        except Exception:
-                            # Ignorar erros neste nível e continuar
-                            pass
-                    
-                    # Registrar curso e receita, mesmo que seja zero
-                    course_revenues.append({
-                        'course': course,
-                        'revenue': course_revenue,
-                        'enrollment_count': enrollments.count()
-                    })
-                except Exception as course_error:
-                    # Registrar erro para este curso e continuar com os outros
-                    result += f"_Erro ao calcular receita para o curso '{course.title}': {str(course_error)}_\n"
+            # Receita paga por curso lida do rollup diário
+            course_revenues = list(
+                daily_revenue(status='PAID').exclude(course__isnull=True).order_by().values(
+                    'course_id', 'course__title'
+                ).annotate(revenue=Sum('amount_sum')).order_by('-revenue')[:5]
+            )
+            enrollment_counts = dict(
+                Enrollment.objects.filter(
+                    course_id__in=[item['course_id'] for item in course_revenues]
+                ).order_by().values('course_id').annotate(total=Count('id')).values_list('course_id', 'total')
+            )
+            for item in course_revenues:
+                item['enrollment_count'] = enrollment_counts.get(item['course_id'], 0)
             
-            # Ordenar por receita e obter os top 5
             if course_revenues:
-                course_revenues.sort(key=lambda x: x['revenue'], reverse=True)
-                top_courses_with_revenue = course_revenues[:5]
-                
                 # Mostrar os cursos com maior faturamento
-                for i, course_data in enumerate(top_courses_with_revenue, 1):
-                    course = course_data['course']
+                for i, course_data in enumerate(course_revenues, 1):
                     revenue = course_data['revenue']
                     enrollment_count = course_data['enrollment_count']
                     
-                    result += f"**{i}. {course.title}**\n"
+                    result += f"**{i}. {course_data['course__title']}**\n"
                     result += f"- Faturamento: R$ {float(revenue):.2f}\n"
                     result += f"- Matrículas: {enrollment_count}\n\n"
             else:
@@ -1347,23 +1320,15 @@ def create_studio_booking(query):
         start_datetime = timezone.make_aware(tomorrow_naive, timezone=timezone_obj)
         end_datetime = start_datetime + timedelta(minutes=duration)
     
-    # Verificar disponibilidade do estúdio
+    # Verificar disponibilidade do estúdio e das demais unidades em uma única consulta
     try:
         # Garantir que ambas as datas estejam no mesmo timezone para a consulta ao banco
         start_datetime_utc = start_datetime.astimezone(timezone.utc)
         end_datetime_utc = end_datetime.astimezone(timezone.utc)
         
-        conflicting_events = Event.objects.filter(
-            Q(location_id=studio_id) &
-            (
-                # Eventos que começam durante o novo evento
-                (Q(start_time__gte=start_datetime_utc) & Q(start_time__lt=end_datetime_utc)) |
-                # Eventos que terminam durante o novo evento
-                (Q(end_time__gt=start_datetime_utc) & Q(end_time__lte=end_datetime_utc)) |
-                # Eventos que englobam completamente o novo evento
-                (Q(start_time__lte=start_datetime_utc) & Q(end_time__gte=end_datetime_utc))
-            )
-        )
+        other_studios = list(Studio.objects.filter(is_active=True).exclude(id=studio_id))
+        availability = Availability([studio_id] + other_studios, start_datetime_utc, end_datetime_utc)
+        conflicting_events = availability.conflicts(start_datetime_utc, end_datetime_utc, studio_id)
     except Exception as e:
         return {
             "response_type": "text",
@@ -1371,7 +1336,7 @@ def create_studio_booking(query):
         }
     
     # Se houver conflitos, sugerir horários alternativos
-    if conflicting_events.exists():
+    if conflicting_events:
         conflict_list = []
         for event in conflicting_events:
             start_time = event.start_time.strftime('%H:%M')
@@ -1411,27 +1376,11 @@ def create_studio_booking(query):
                 # Corrigir calculando o fim como início + duração
                 alt_end_3 = alt_start_3 + timedelta(minutes=duration)
             
-            # Buscar outras unidades disponíveis no mesmo horário
-            other_studios = Studio.objects.filter(is_active=True).exclude(id=studio_id)
-            available_studios = []
-            
-            for other_studio in other_studios:
-                # Verificar se há conflitos nesta unidade no mesmo horário
-                try:
-                    conflicts = Event.objects.filter(
-                        Q(location=other_studio) &
-                        (
-                            (Q(start_time__gte=start_datetime_utc) & Q(start_time__lt=end_datetime_utc)) |
-                            (Q(end_time__gt=start_datetime_utc) & Q(end_time__lte=end_datetime_utc)) |
-                            (Q(start_time__lte=start_datetime_utc) & Q(end_time__gte=end_datetime_utc))
-                        )
-                    ).exists()
-                    
-                    if not conflicts:
-                        available_studios.append(other_studio)
-                except Exception as e:
-                    # Ignorar erro e continuar com os próximos estúdios
-                    continue
+            # Outras unidades disponíveis no mesmo horário
+            free_studio_ids = set(availability.free_locations(start_datetime_utc, end_datetime_utc))
+            available_studios = [
+                other_studio for other_studio in other_studios if other_studio.id in free_studio_ids
+            ]
         except Exception as e:
             return {
                 "response_type": "text",
@@ -1501,16 +1450,23 @@ def create_studio_booking(query):
             course, _ = course_info
             event.course = course
         
-        event.save()
+        # Gravação atômica: o horário pode ter sido reservado depois da verificação acima
+        try:
+            book_event(event)
+        except BookingConflict:
+            return {
+                "response_type": "text",
+                "content": f"⚠️ O horário das {start_datetime.strftime('%H:%M')} às {end_datetime.strftime('%H:%M')} "
+                           f"do dia {start_datetime.strftime('%d/%m/%Y')} no {studio.name} "
+                           f"acabou de ser reservado por outra pessoa. Gostaria de tentar outro horário?"
+            }
         
         # Adicionar participantes, se especificados
         if participants_info:
-            for participant, _ in participants_info:
-                EventParticipant.objects.create(
-                    event=event,
-                    student=participant,
-                    attendance_status="CONFIRMED"  # Usando o valor correto do modelo
-                )
+            add_participants(
+                event, [participant.id for participant, _ in participants_info],
+                attendance_status="CONFIRMED"
+            )
         
         # Preparar resposta de confirmação
         participants_str = ""
@@ -6,6 +6,7 @@ from django.db.models import Q, Count, Sum
 from core.models import User
 from courses.models import Course, Enrollment
 from payments.models import PaymentTransaction
+from payments.aggregates import revenue_totals
 
 def format_financial_data():
     """
@@ -14,15 +15,15 @@ def format_financial_data():
     Returns:
         String formatada com dados financeiros
     """
-    # Buscar receita total
-    total_revenue = PaymentTransaction.objects.filter(status='PAID').aggregate(Sum('amount'))['amount__sum'] or 0
+    # Receita total e transações por status (rollup diário)
+    totals = revenue_totals()
+    total_revenue = totals['paid_amount']
     
-    # Contar transações por status
     transactions_by_status = {
-        'PAID': PaymentTransaction.objects.filter(status='PAID').count(),
-        'PENDING': PaymentTransaction.objects.filter(status='PENDING').count(),
-        'CANCELLED': PaymentTransaction.objects.filter(status='CANCELLED').count(),
-        'REFUNDED': PaymentTransaction.objects.filter(status='REFUNDED').count(),
+        'PAID': totals['paid_count'],
+        'PENDING': totals['pending_count'],
+        'CANCELLED': totals.get('cancelled_count', 0),
+        'REFUNDED': totals['refunded_count'],
     }
     
     # Buscar o melhor cliente (que mais gastou)
@@ -10,6 +10,7 @@ from datetime import timedelta
 from core.models import User
 from courses.models import Course, Lesson, Enrollment
 from payments.models import PaymentTransaction
+from payments.aggregates import revenue_totals
 from assistant.advanced_queries import AdvancedQueries
 
 def process_query(query):
@@ -167,45 +168,33 @@ def extend_advanced_queries():
                 Dicionário com estatísticas financeiras
             """
             try:
-                # Estatísticas gerais
-                transactions = PaymentTransaction.objects.all()
-                
-                # Pagamentos por status
-                paid = transactions.filter(status='PAID')
-                pending = transactions.filter(status='PENDING')
-                cancelled = transactions.filter(status='CANCELLED')
-                
-                # Valores totais
-                total_revenue = paid.aggregate(Sum('amount'))['amount__sum'] or 0
-                pending_amount = pending.aggregate(Sum('amount'))['amount__sum'] or 0
-                
+                # Totais por status, lidos do rollup diário
+                totals = revenue_totals()
+                total_revenue = totals['paid_amount']
+                pending_amount = totals['pending_amount']
+
                 # Estatísticas por período
                 today = timezone.now().date()
                 last_month = today - timedelta(days=30)
                 last_week = today - timedelta(days=7)
-                
+
                 # Faturamento por período
-                revenue_last_month = paid.filter(
-                    created_at__date__gte=last_month
-                ).aggregate(Sum('amount'))['amount__sum'] or 0
-                
-                revenue_last_week = paid.filter(
-                    created_at__date__gte=last_week
-                ).aggregate(Sum('amount'))['amount__sum'] or 0
-                
+                revenue_last_month = revenue_totals(start=last_month, status='PAID')['paid_amount']
+                revenue_last_week = revenue_totals(start=last_week, status='PAID')['paid_amount']
+
                 # Ticket médio
-                avg_ticket = paid.aggregate(Avg('amount'))['amount__avg'] or 0
-                
+                avg_ticket = total_revenue / totals['paid_count'] if totals['paid_count'] else 0
+
                 return {
                     'success': True,
                     'financials': {
                         'total_revenue': float(total_revenue),
                         'pending_amount': float(pending_amount),
                         'transactions_count': {
-                            'paid': paid.count(),
-                            'pending': pending.count(),
-                            'cancelled': cancelled.count(),
-                            'total': transactions.count()
+                            'paid': totals['paid_count'],
+                            'pending': totals['pending_count'],
+                            'cancelled': totals.get('cancelled_count', 0),
+                            'total': totals['total_count']
                         },
                         'period_revenue': {
                             'last_month': float(revenue_last_month),
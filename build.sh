@@ -58,5 +58,8 @@ fi
 # Executar migrações
 python manage.py migrate
 
+# Tabela do cache compartilhado (CACHES em config/settings.py)
+python manage.py createcachetable
+
 # Criar usuários iniciais em todos os ambientes para teste inicial
 python manage.py create_default_users
\ No newline at end of file
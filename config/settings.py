@@ -123,6 +123,23 @@ else:
     }
 
 
+# Cache padrão em memória local, por processo. Os snapshots de cursos
+# (courses/outline.py) usam o alias 'outline', compartilhado por todos os
+# processos (workers do gunicorn, comandos e cron) no banco de dados: a
+# invalidação feita em um processo precisa valer para os demais, o que o cache
+# em memória local não faz. A tabela é criada com createcachetable (build.sh e
+# start_server.sh)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'outline': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': config('CACHE_TABLE', default='django_cache'),
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -217,10 +234,35 @@ LOGOUT_REDIRECT_URL = 'login'
 # Para usar modelo de usuário customizado (será criado no app core)
 AUTH_USER_MODEL = 'core.User'
 
+# Progresso de vídeo: com write-behind ativo, os heartbeats do player ficam em
+# memória e são gravados no banco a cada VIDEO_PROGRESS_FLUSH_INTERVAL segundos
+VIDEO_PROGRESS_WRITE_BEHIND = config('VIDEO_PROGRESS_WRITE_BEHIND', default=False, cast=bool)
+VIDEO_PROGRESS_FLUSH_INTERVAL = config('VIDEO_PROGRESS_FLUSH_INTERVAL', default=15, cast=int)
+
+# Cliente HTTP das APIs externas (OpenPix, Pagar.me, NFE.io): timeouts em
+# segundos, tentativas das chamadas idempotentes e conexões mantidas por host
+GATEWAY_HTTP_CONNECT_TIMEOUT = config('GATEWAY_HTTP_CONNECT_TIMEOUT', default=5, cast=float)
+GATEWAY_HTTP_READ_TIMEOUT = config('GATEWAY_HTTP_READ_TIMEOUT', default=30, cast=float)
+GATEWAY_HTTP_RETRIES = config('GATEWAY_HTTP_RETRIES', default=3, cast=int)
+GATEWAY_HTTP_BACKOFF = config('GATEWAY_HTTP_BACKOFF', default=0.5, cast=float)
+GATEWAY_HTTP_POOL_SIZE = config('GATEWAY_HTTP_POOL_SIZE', default=10, cast=int)
+# Substitui o host de um gateway por outra URL base (servidor local em testes)
+GATEWAY_HTTP_OVERRIDES = {}
+
 # Configuração do OpenPix (integração de pagamento PIX)
 OPENPIX_TOKEN = config('OPENPIX_TOKEN', default="Q2xpZW50X0lkXzkyZTNlM2Q4LTM1ZTctNDk1My04ODJiLTY1MTc0MmE3NWIwMTpDbGllbnRfU2VjcmV0XzlXdHVKTTgwSXFYYkNEVzl6MjVxTmh4REFLcnhVTXRqeFBkNmk1cTZnKzQ9")
 OPENPIX_WEBHOOK_SECRET = config('OPENPIX_WEBHOOK_SECRET', default="")  # Será definido posteriormente
 
+# Webhooks de pagamento: os eventos ficam na caixa de entrada (WebhookEvent) e
+# são processados pelo comando process_webhooks. Sem worker (desenvolvimento),
+# WEBHOOK_INLINE_PROCESSING processa cada evento logo após gravá-lo
+WEBHOOK_INLINE_PROCESSING = config('WEBHOOK_INLINE_PROCESSING', default=False, cast=bool)
+WEBHOOK_MAX_ATTEMPTS = config('WEBHOOK_MAX_ATTEMPTS', default=5, cast=int)
+
+# Consulta central das cobranças PIX pendentes (comando poll_pix_charges):
+# intervalo entre as rodadas (cada cobrança tem sua própria agenda de consultas)
+PIX_POLL_INTERVAL = config('PIX_POLL_INTERVAL', default=15, cast=float)
+
 # Configuração do Pagar.me (integração de pagamento com cartão)
 PAGARME_API_KEY = config('PAGARME_API_KEY', default="chave_de_api_simulada_pagarme")
 PAGARME_ENCRYPTION_KEY = config('PAGARME_ENCRYPTION_KEY', default="chave_de_criptografia_simulada_pagarme")
@@ -243,12 +285,41 @@ NFEIO_API_KEY = config('NFEIO_API_KEY', default='')
 NFEIO_COMPANY_ID = config('NFEIO_COMPANY_ID', default='')
 NFEIO_ENVIRONMENT = config('NFEIO_ENVIRONMENT', default='Development')
 
+# Emissão de notas em lote (comando process_invoice_jobs): threads de envio e
+# limite de requisições por segundo à NFE.io. Sem worker (desenvolvimento),
+# INVOICE_JOBS_INLINE_PROCESSING envia o lote em segundo plano no próprio servidor
+INVOICE_BULK_WORKERS = config('INVOICE_BULK_WORKERS', default=4, cast=int)
+INVOICE_BULK_RATE = config('INVOICE_BULK_RATE', default=5, cast=float)
+INVOICE_JOBS_INLINE_PROCESSING = config('INVOICE_JOBS_INLINE_PROCESSING', default=False, cast=bool)
+
+# Números de RPS reservados por vez em cada processo (ver invoices/rps.py)
+RPS_BLOCK_SIZE = config('RPS_BLOCK_SIZE', default=20, cast=int)
+
+# Downloads simultâneos de PDFs/XMLs na exportação de notas (ver invoices/export.py)
+INVOICE_EXPORT_WORKERS = config('INVOICE_EXPORT_WORKERS', default=4, cast=int)
+
 # Configurações do SendGrid
 SENDGRID_API_KEY = config('SENDGRID_API_KEY', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='')
 
 
 # Configurações de email processadas no email_service.py
+# Servidor SMTP das notas fiscais (SendGrid por padrão). INVOICE_EMAIL_BACKEND
+# troca a classe de conexão, por exemplo por um servidor SMTP local em testes
+INVOICE_EMAIL_BACKEND = config('INVOICE_EMAIL_BACKEND', default='invoices.email_service.SMTPConnection')
+INVOICE_EMAIL_SMTP_HOST = config('INVOICE_EMAIL_SMTP_HOST', default='smtp.sendgrid.net')
+INVOICE_EMAIL_SMTP_PORT = config('INVOICE_EMAIL_SMTP_PORT', default=587, cast=int)
+INVOICE_EMAIL_SMTP_TLS = config('INVOICE_EMAIL_SMTP_TLS', default=True, cast=bool)
+INVOICE_EMAIL_SMTP_USERNAME = config('INVOICE_EMAIL_SMTP_USERNAME', default='apikey')
+
+# Fila de emails das notas (comando process_email_outbox): tentativas, espera
+# inicial entre elas (dobra a cada falha) e janela, em segundos, em que o mesmo
+# email para o mesmo destinatário não é reenviado. Sem worker (desenvolvimento),
+# EMAIL_OUTBOX_INLINE_PROCESSING envia a fila em segundo plano no próprio servidor
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+EMAIL_OUTBOX_RETRY_DELAY = config('EMAIL_OUTBOX_RETRY_DELAY', default=30, cast=int)
+EMAIL_OUTBOX_DEDUP_WINDOW = config('EMAIL_OUTBOX_DEDUP_WINDOW', default=600, cast=int)
+EMAIL_OUTBOX_INLINE_PROCESSING = config('EMAIL_OUTBOX_INLINE_PROCESSING', default=False, cast=bool)
 
 
 
@@ -0,0 +1,126 @@
+"""
+Cliente HTTP compartilhado para as APIs externas (OpenPix, Pagar.me, NFE.io).
+
+Mantém uma requests.Session por host em cada thread, com pool de conexões
+keep-alive: chamadas seguidas ao mesmo gateway reaproveitam a conexão
+TCP/TLS em vez de abrir uma nova a cada requisição. Toda requisição tem
+timeout de conexão e de leitura (GATEWAY_HTTP_CONNECT_TIMEOUT e
+GATEWAY_HTTP_READ_TIMEOUT) e as chamadas idempotentes (GET, PUT, DELETE...)
+são repetidas com espera crescente em falhas de rede e respostas 502/503/504.
+POST só é repetido quando a conexão nem chegou a ser aberta.
+
+Para testes com um servidor local no lugar do gateway, os serviços aceitam
+um GatewayClient próprio (parâmetro http) ou GATEWAY_HTTP_OVERRIDES mapeia o
+host real para outra URL base, por exemplo
+{'api.openpix.com.br': 'http://127.0.0.1:8001'}.
+"""
+import threading
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Métodos repetidos automaticamente em caso de falha
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+
+# Respostas que indicam indisponibilidade temporária do gateway
+RETRY_STATUSES = (502, 503, 504)
+
+_local = threading.local()
+
+
+def default_timeout():
+    """Tupla (conexão, leitura) em segundos."""
+    return (
+        getattr(settings, 'GATEWAY_HTTP_CONNECT_TIMEOUT', 5),
+        getattr(settings, 'GATEWAY_HTTP_READ_TIMEOUT', 30),
+    )
+
+
+def _retry_policy():
+    retries = getattr(settings, 'GATEWAY_HTTP_RETRIES', 3)
+    return Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=getattr(settings, 'GATEWAY_HTTP_BACKOFF', 0.5),
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=IDEMPOTENT_METHODS,
+        raise_on_status=False,
+        respect_retry_after_header=True,
+    )
+
+
+def _host_key(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_session(url):
+    """Session (com pool keep-alive e retry) do host da URL na thread atual."""
+    sessions = getattr(_local, 'sessions', None)
+    if sessions is None:
+        sessions = _local.sessions = {}
+
+    key = _host_key(url)
+    session = sessions.get(key)
+    if session is None:
+        pool_size = getattr(settings, 'GATEWAY_HTTP_POOL_SIZE', 10)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=_retry_policy())
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        sessions[key] = session
+    return session
+
+
+def close_sessions():
+    """Fecha as sessões da thread atual (fim de comandos longos e testes)."""
+    for session in getattr(_local, 'sessions', {}).values():
+        session.close()
+    _local.sessions = {}
+
+
+def _apply_override(url):
+    overrides = getattr(settings, 'GATEWAY_HTTP_OVERRIDES', None) or {}
+    parts = urlsplit(url)
+    replacement = overrides.get(parts.netloc) or overrides.get(parts.hostname)
+    if not replacement:
+        return url
+    target = urlsplit(replacement)
+    path = target.path.rstrip('/') + parts.path
+    return urlunsplit((target.scheme, target.netloc, path, parts.query, parts.fragment))
+
+
+class GatewayClient:
+    """
+    Cliente de uma API externa. Caminhos relativos são resolvidos a partir de
+    base_url; URLs absolutas (links de PDF, por exemplo) são usadas como estão.
+    """
+
+    def __init__(self, base_url='', headers=None, timeout=None, verify=True):
+        self.base_url = base_url.rstrip('/')
+        self.headers = headers or {}
+        self.timeout = timeout or default_timeout()
+        self.verify = verify
+
+    def url(self, path):
+        if '://' in path:
+            return _apply_override(path)
+        return _apply_override(f"{self.base_url}/{path.lstrip('/')}")
+
+    def request(self, method, path, **kwargs):
+        url = self.url(path)
+        headers = {**self.headers, **(kwargs.pop('headers', None) or {})}
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs.setdefault('verify', self.verify)
+        return get_session(url).request(method, url, headers=headers, **kwargs)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
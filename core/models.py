@@ -128,6 +128,11 @@ class User(AbstractUser):
         null=True
     )
     date_joined = models.DateTimeField(_('data de cadastro'), auto_now_add=True)
+    calendar_token_version = models.PositiveIntegerField(
+        _('versão do link da agenda'),
+        default=1,
+        help_text=_('Incrementada ao gerar um novo link de assinatura da agenda; os links antigos deixam de funcionar')
+    )
     
     # Define o email como campo de login
     USERNAME_FIELD = 'email'
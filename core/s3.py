@@ -0,0 +1,96 @@
+"""
+Acesso compartilhado ao S3.
+
+Mantém um único cliente boto3 por processo (clientes boto3 são thread-safe) e
+um cache de URLs pré-assinadas por chave de objeto. Cada URL é reaproveitada
+até pouco antes de expirar, evitando assinar a mesma imagem a cada requisição.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Prefixo das chaves de mídia no bucket (ver MediaStorage.location)
+MEDIA_PREFIX = 'media-courses'
+
+# Margem de segurança: a URL sai do cache este número de segundos antes de expirar
+PRESIGNED_URL_SAFETY_MARGIN = 300
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """Retorna o cliente S3 compartilhado do processo, criando-o na primeira chamada."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import boto3
+
+                _client = boto3.client(
+                    's3',
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_S3_REGION_NAME
+                )
+    return _client
+
+
+def media_key(name):
+    """Converte o nome de um arquivo de mídia na chave do objeto no bucket."""
+    return f"{MEDIA_PREFIX}/{name}"
+
+
+def _expires_in():
+    return getattr(settings, 'AWS_QUERYSTRING_EXPIRE', 3600)
+
+
+def _cache_key(key):
+    digest = hashlib.md5(f"{settings.AWS_STORAGE_BUCKET_NAME}/{key}".encode()).hexdigest()
+    return f"s3_presigned_url_{digest}"
+
+
+def _sign(key):
+    return get_s3_client().generate_presigned_url(
+        'get_object',
+        Params={
+            'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
+            'Key': key
+        },
+        ExpiresIn=_expires_in()
+    )
+
+
+def get_presigned_url(name):
+    """
+    Retorna a URL pré-assinada do arquivo de mídia, usando o cache enquanto
+    a URL ainda tiver validade suficiente.
+    """
+    return get_presigned_urls([name])[name]
+
+
+def get_presigned_urls(names):
+    """
+    Assina as URLs de vários arquivos de mídia de uma vez.
+    Faz uma única leitura e uma única escrita no cache para todo o lote.
+    Retorna um dicionário {nome do arquivo: URL}.
+    """
+    keys = {name: media_key(name) for name in set(names)}
+    cache_keys = {name: _cache_key(key) for name, key in keys.items()}
+
+    cached = cache.get_many(cache_keys.values())
+    urls = {}
+    to_cache = {}
+    for name, key in keys.items():
+        url = cached.get(cache_keys[name])
+        if url is None:
+            url = _sign(key)
+            to_cache[cache_keys[name]] = url
+        urls[name] = url
+
+    if to_cache:
+        cache.set_many(to_cache, max(_expires_in() - PRESIGNED_URL_SAFETY_MARGIN, 0))
+
+    return urls
@@ -7,6 +7,7 @@ from django.template.response import TemplateResponse
 from django.urls import path
 
 from .models import Course, Lesson, Enrollment, ClassGroup, LessonRelease, Module, ModuleProgress, LessonAttachment
+from .outline import invalidate_course_outlines
 
 
 @admin.register(ClassGroup)
@@ -66,7 +67,11 @@ class LessonReleaseAdmin(admin.ModelAdmin):
     
     def mark_as_released(self, request, queryset):
         """Marca as liberações selecionadas como liberadas."""
+        course_ids = set(queryset.values_list('lesson__course_id', flat=True))
         updated = queryset.update(is_released=True)
+        # update() não dispara sinais, então invalida os snapshots manualmente
+        for course_id in course_ids:
+            invalidate_course_outlines(course_id)
         messages.success(request, _(f'{updated} liberações marcadas como liberadas com sucesso.'))
     mark_as_released.short_description = _('Marcar como liberadas')
 
@@ -1,3 +1,6 @@
+import json
+
+from django.conf import settings
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
@@ -6,6 +9,7 @@ from django.utils import timezone
 from django.contrib.auth.decorators import login_required
 
 from .models import Lesson, LessonProgress, VideoProgress, Enrollment
+from .progress import MAX_HEARTBEATS_PER_BATCH, HeartbeatError, parse_heartbeat, ingest_heartbeats, heartbeat_buffer
 
 
 @login_required
@@ -36,7 +40,6 @@ def update_video_progress(request):
             duration = int(float(duration))
         
         if watched_segments:
-            import json
             watched_segments = json.loads(watched_segments)
     except (ValueError, TypeError, json.JSONDecodeError):
         return JsonResponse({
@@ -44,43 +47,61 @@ def update_video_progress(request):
             'message': 'Formato inválido de parâmetros. Verifique os tipos de dados enviados.'
         }, status=400)
     
-    # Busca a aula
-    lesson = get_object_or_404(Lesson, id=lesson_id)
-    
-    # Verifica se o aluno está matriculado no curso da aula
-    try:
-        enrollment = Enrollment.objects.get(
-            student=request.user,
-            course=lesson.course,
-            status=Enrollment.Status.ACTIVE
-        )
-    except Enrollment.DoesNotExist:
+    write_behind = settings.VIDEO_PROGRESS_WRITE_BEHIND
+
+    # No modo write-behind, heartbeats seguintes reaproveitam o progresso em memória
+    video_progress = heartbeat_buffer.get(request.user.id, lesson_id) if write_behind else None
+
+    if video_progress is not None and not Enrollment.objects.filter(
+        pk=video_progress.lesson_progress.enrollment_id,
+        status=Enrollment.Status.ACTIVE
+    ).exists():
+        # A matrícula deixou de estar ativa desde o primeiro heartbeat
+        heartbeat_buffer.discard(request.user.id, lesson_id)
         return JsonResponse({
             'success': False,
             'message': 'Você não está matriculado neste curso ou sua matrícula não está ativa.'
         }, status=403)
-    
-    # Obtém ou cria o progresso da aula
-    lesson_progress, created = LessonProgress.objects.get_or_create(
-        enrollment=enrollment,
-        lesson=lesson
-    )
-    
-    # Obtém ou cria o progresso do vídeo
-    video_progress, created = VideoProgress.objects.get_or_create(
-        lesson_progress=lesson_progress,
-        defaults={
-            'video_duration': duration or 0,
-        }
-    )
-    
-    # Se temos a duração e ela mudou, atualiza
-    if duration and video_progress.video_duration != duration:
-        video_progress.video_duration = duration
-    
-    # Atualiza o progresso
-    video_progress.update_progress(current_time, watched_segments)
-    
+
+    if video_progress is None:
+        # Busca a aula
+        lesson = get_object_or_404(Lesson, id=lesson_id)
+
+        # Verifica se o aluno está matriculado no curso da aula
+        try:
+            enrollment = Enrollment.objects.get(
+                student=request.user,
+                course=lesson.course,
+                status=Enrollment.Status.ACTIVE
+            )
+        except Enrollment.DoesNotExist:
+            return JsonResponse({
+                'success': False,
+                'message': 'Você não está matriculado neste curso ou sua matrícula não está ativa.'
+            }, status=403)
+
+        # Obtém ou cria o progresso da aula
+        lesson_progress, created = LessonProgress.objects.get_or_create(
+            enrollment=enrollment,
+            lesson=lesson
+        )
+
+        # Obtém ou cria o progresso do vídeo
+        video_progress, created = VideoProgress.objects.get_or_create(
+            lesson_progress=lesson_progress,
+            defaults={
+                'video_duration': duration or 0,
+            }
+        )
+
+    # Atualiza o progresso (e a duração, se ela mudou)
+    if write_behind:
+        video_progress = heartbeat_buffer.add(request.user.id, lesson_id, video_progress, current_time, watched_segments, duration)
+    else:
+        video_progress.update_progress(current_time, watched_segments, duration=duration)
+
+    lesson_progress = video_progress.lesson_progress
+
     # Resposta com o progresso atualizado
     return JsonResponse({
         'success': True,
@@ -95,6 +116,39 @@ def update_video_progress(request):
     })
 
 
+@login_required
+@require_POST
+def update_video_progress_batch(request):
+    """
+    API endpoint para atualizar o progresso de vários vídeos de uma só vez.
+    Recebe um JSON no formato {"heartbeats": [{"lesson_id", "current_time",
+    "duration", "watched_segments"}, ...]}, podendo conter várias posições de
+    várias aulas. Os heartbeats de uma mesma aula são consolidados e cada
+    progresso é gravado apenas uma vez.
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+        heartbeats = payload.get('heartbeats') if isinstance(payload, dict) else None
+        if not isinstance(heartbeats, list) or not heartbeats:
+            raise HeartbeatError('É necessário fornecer uma lista de heartbeats.')
+        if len(heartbeats) > MAX_HEARTBEATS_PER_BATCH:
+            raise HeartbeatError(f'Máximo de {MAX_HEARTBEATS_PER_BATCH} heartbeats por requisição.')
+        heartbeats = [parse_heartbeat(heartbeat) for heartbeat in heartbeats]
+    except (ValueError, json.JSONDecodeError) as e:
+        return JsonResponse({
+            'success': False,
+            'message': str(e) if isinstance(e, HeartbeatError) else 'JSON inválido.'
+        }, status=400)
+
+    results = ingest_heartbeats(request.user, heartbeats)
+
+    return JsonResponse({
+        'success': True,
+        'message': 'Progresso atualizado com sucesso.',
+        'data': results,
+    })
+
+
 @login_required
 def get_video_progress(request, lesson_id):
     """
@@ -123,9 +177,9 @@ def get_video_progress(request, lesson_id):
             lesson=lesson
         )
         
-        # Tenta obter o progresso do vídeo
+        # Tenta obter o progresso do vídeo (do buffer write-behind, se ainda não foi gravado)
         try:
-            video_progress = lesson_progress.video_progress
+            video_progress = heartbeat_buffer.get(request.user.id, lesson.id) or lesson_progress.video_progress
             
             return JsonResponse({
                 'success': True,
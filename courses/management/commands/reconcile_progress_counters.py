@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from courses.progress import reconcile_progress_counters
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os contadores de aulas publicadas e concluídas das matrículas e módulos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--course',
+            type=int,
+            action='append',
+            dest='course_ids',
+            help='ID do curso a reconciliar (pode ser repetido). Sem este parâmetro, todos os cursos.'
+        )
+
+    def handle(self, *args, **options):
+        enrollments, modules = reconcile_progress_counters(options['course_ids'])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✅ Contadores reconciliados: {enrollments} matrículas e {modules} progressos de módulo atualizados.'
+            )
+        )
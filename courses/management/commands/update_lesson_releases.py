@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from courses.models import LessonRelease
+from courses.outline import invalidate_course_outlines
 
 
 class Command(BaseCommand):
@@ -20,7 +21,12 @@ class Command(BaseCommand):
         
         if count > 0:
             # Atualizar status para liberado
+            course_ids = set(pending_releases.values_list('lesson__course_id', flat=True))
             pending_releases.update(is_released=True)
+
+            # update() não dispara sinais, então invalida os snapshots manualmente
+            for course_id in course_ids:
+                invalidate_course_outlines(course_id)
             self.stdout.write(
                 self.style.SUCCESS(f'✅ {count} aulas liberadas com sucesso!')
             )
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.10 on 2026-10-18 18:22
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    """Preenche os contadores a partir das aulas e progressos existentes."""
+    Lesson = apps.get_model('courses', 'Lesson')
+    LessonProgress = apps.get_model('courses', 'LessonProgress')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    ModuleProgress = apps.get_model('courses', 'ModuleProgress')
+
+    def count(queryset, group_by):
+        return Coalesce(
+            Subquery(queryset.order_by().values(group_by).annotate(total=Count('id')).values('total')),
+            Value(0)
+        )
+
+    published = Lesson.objects.filter(status='PUBLISHED')
+    completed = LessonProgress.objects.filter(is_completed=True, lesson__status='PUBLISHED')
+
+    Enrollment.objects.update(
+        total_lessons_count=count(published.filter(course_id=OuterRef('course_id')), 'course_id'),
+        completed_lessons_count=count(completed.filter(enrollment_id=OuterRef('pk')), 'enrollment_id'),
+    )
+    ModuleProgress.objects.update(
+        total_lessons_count=count(published.filter(module_id=OuterRef('module_id')), 'module_id'),
+        completed_lessons_count=count(
+            completed.filter(enrollment_id=OuterRef('enrollment_id'), lesson__module_id=OuterRef('module_id')),
+            'enrollment_id'
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_lessonattachment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_lessons_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='aulas concluídas'),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='total_lessons_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='total de aulas publicadas'),
+        ),
+        migrations.AddField(
+            model_name='moduleprogress',
+            name='completed_lessons_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='aulas concluídas'),
+        ),
+        migrations.AddField(
+            model_name='moduleprogress',
+            name='total_lessons_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='total de aulas publicadas'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
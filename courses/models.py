@@ -1,11 +1,27 @@
 from django.db import models
+from django.db.models import F, Case, When, Value
+from django.db.models.functions import Least
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from django.utils.text import slugify
 import uuid
 import os
-import boto3
+
+from core.s3 import get_presigned_url, get_presigned_urls
+
+
+def progress_expression(completed, total, current):
+    """
+    Expressão SQL que calcula a porcentagem (0-100) de aulas concluídas a
+    partir dos contadores. Se não houver aulas, mantém o valor atual.
+    """
+    return Case(
+        When(**{f'{total}__gt': 0}, then=Least(completed * 100 / F(total), Value(100))),
+        default=F(current),
+        output_field=models.IntegerField()
+    )
+
 
 class ClassGroup(models.Model):
     """
@@ -175,27 +191,13 @@ class Course(models.Model):
             return None
 
         if settings.USE_S3:
+            # URL já assinada em lote por prefetch_image_urls
+            if getattr(self, '_presigned_image_url', None):
+                return self._presigned_image_url
+
             try:
-                # Gerar URL pré-assinada do S3
-                s3_client = boto3.client(
-                    's3',
-                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                    region_name=settings.AWS_S3_REGION_NAME
-                )
-
-                # A chave no S3 inclui o prefixo 'media-courses/'
-                key = f"media-courses/{self.image.name}"
-
-                url = s3_client.generate_presigned_url(
-                    'get_object',
-                    Params={
-                        'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
-                        'Key': key
-                    },
-                    ExpiresIn=3600  # URL válida por 1 hora
-                )
-                return url
+                # URL pré-assinada do S3 (reaproveitada do cache enquanto válida)
+                return get_presigned_url(self.image.name)
             except Exception as e:
                 print(f"Erro ao gerar URL pré-assinada: {e}")
                 # Fallback para URL padrão
@@ -204,6 +206,25 @@ class Course(models.Model):
             # Retornar URL local
             return self.image.url
 
+    @staticmethod
+    def prefetch_image_urls(courses):
+        """
+        Assina de uma só vez as URLs das imagens de vários cursos, para que a
+        renderização de listas não precise assinar uma imagem por vez.
+        """
+        if not settings.USE_S3:
+            return
+
+        courses = [course for course in courses if course.image]
+        try:
+            urls = get_presigned_urls([course.image.name for course in courses])
+        except Exception as e:
+            print(f"Erro ao gerar URLs pré-assinadas: {e}")
+            return
+
+        for course in courses:
+            course._presigned_image_url = urls.get(course.image.name)
+
 
 class Module(models.Model):
     """
@@ -449,6 +470,8 @@ class Enrollment(models.Model):
         default=Status.PENDING
     )
     progress = models.IntegerField(_('progresso'), default=0, help_text=_('Progresso em porcentagem (0-100)'))
+    completed_lessons_count = models.PositiveIntegerField(_('aulas concluídas'), default=0)
+    total_lessons_count = models.PositiveIntegerField(_('total de aulas publicadas'), default=0)
     enrolled_at = models.DateTimeField(_('matriculado em'), auto_now_add=True)
     completed_at = models.DateTimeField(_('concluído em'), null=True, blank=True)
     
@@ -468,6 +491,10 @@ class Enrollment(models.Model):
         # Verificar se é uma nova matrícula (sem ID ainda)
         is_new = self.pk is None
         
+        # Inicializa o contador de aulas publicadas do curso
+        if is_new and not self.total_lessons_count:
+            self.total_lessons_count = self.course.lessons.filter(status=Lesson.Status.PUBLISHED).count()
+        
         # Salvar a matrícula
         super().save(*args, **kwargs)
         
@@ -502,23 +529,28 @@ class Enrollment(models.Model):
         self.status = self.Status.COMPLETED
         self.completed_at = timezone.now()
         self.progress = 100
-        self.save()
+        self.save(update_fields=['status', 'completed_at', 'progress'])
     
     def cancel(self):
         """Cancela a matrícula do aluno no curso."""
         self.status = self.Status.CANCELLED
         self.save()
     
-    def update_progress(self, completed_lessons_count):
-        """Atualiza o progresso do aluno com base no número de aulas concluídas."""
-        total_lessons = self.course.get_total_lessons()
-        if total_lessons > 0:
-            self.progress = int((completed_lessons_count / total_lessons) * 100)
-            self.save()
-            
-            # Se o progresso for 100%, marca o curso como concluído
-            if self.progress == 100:
-                self.complete()
+    def register_completed_lesson(self):
+        """
+        Incrementa atomicamente o contador de aulas concluídas e recalcula o
+        progresso no mesmo UPDATE, sem recontar as aulas do curso.
+        """
+        completed = F('completed_lessons_count') + 1
+        Enrollment.objects.filter(pk=self.pk).update(
+            completed_lessons_count=completed,
+            progress=progress_expression(completed, 'total_lessons_count', 'progress')
+        )
+        self.refresh_from_db(fields=['completed_lessons_count', 'total_lessons_count', 'progress'])
+
+        # Se o progresso for 100%, marca o curso como concluído
+        if self.progress == 100 and not self.is_completed:
+            self.complete()
 
 
 class LessonProgress(models.Model):
@@ -556,26 +588,43 @@ class LessonProgress(models.Model):
     
     def complete(self):
         """Marca a aula como concluída pelo aluno."""
-        if not self.is_completed:
-            self.is_completed = True
-            self.completed_at = timezone.now()
-            self.save()
+        if self.is_completed:
+            return
 
-            # Atualiza o progresso geral do aluno no curso
-            completed_lessons = LessonProgress.objects.filter(
-                enrollment=self.enrollment,
-                is_completed=True
-            ).count()
-
-            self.enrollment.update_progress(completed_lessons)
+        self.is_completed = True
+        self.completed_at = timezone.now()
 
-            # Se a aula pertence a um módulo, atualiza o progresso do módulo
-            if self.lesson.module:
-                module_progress, created = ModuleProgress.objects.get_or_create(
-                    enrollment=self.enrollment,
-                    module=self.lesson.module
-                )
+        # Só a requisição que efetivamente marcar a aula atualiza os contadores
+        updated = LessonProgress.objects.filter(pk=self.pk, is_completed=False).update(
+            is_completed=True,
+            completed_at=self.completed_at,
+            last_accessed_at=self.completed_at
+        )
+        if not updated:
+            return
+
+        # update() não dispara sinais, então invalida o snapshot do curso manualmente
+        from .outline import invalidate_enrollment_outline
+        invalidate_enrollment_outline(self.enrollment_id)
+
+        # Apenas aulas publicadas entram nos contadores de progresso
+        if not self.lesson.is_published:
+            return
+
+        # Atualiza o progresso geral do aluno no curso
+        self.enrollment.register_completed_lesson()
+
+        # Se a aula pertence a um módulo, atualiza o progresso do módulo
+        if self.lesson.module_id:
+            module_progress, created = ModuleProgress.objects.get_or_create(
+                enrollment=self.enrollment,
+                module_id=self.lesson.module_id
+            )
+            if created:
+                # Novo registro: conta as aulas do módulo uma única vez
                 module_progress.update_progress()
+            else:
+                module_progress.register_completed_lesson()
 
 
 class LessonAttachment(models.Model):
@@ -681,32 +730,10 @@ class LessonAttachment(models.Model):
         if not self.file:
             return None
 
-        # Se estiver usando S3, gerar URL pré-assinada
+        # Se estiver usando S3, gerar URL pré-assinada (reaproveitada do cache enquanto válida)
         if settings.USE_S3:
             try:
-                import boto3
-                from botocore.exceptions import ClientError
-
-                s3_client = boto3.client(
-                    's3',
-                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                    region_name=settings.AWS_S3_REGION_NAME
-                )
-
-                # Construir a chave do objeto
-                key = f"media-courses/{self.file.name}"
-
-                # Gerar URL pré-assinada
-                url = s3_client.generate_presigned_url(
-                    'get_object',
-                    Params={
-                        'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
-                        'Key': key
-                    },
-                    ExpiresIn=3600  # 1 hora
-                )
-                return url
+                return get_presigned_url(self.file.name)
             except Exception:
                 # Se falhar, retornar URL padrão
                 return self.file.url
@@ -757,49 +784,121 @@ class VideoProgress(models.Model):
     def __str__(self):
         return f"Vídeo: {self.lesson_progress.lesson.title} - {self.watched_percentage}% assistido"
     
-    def update_progress(self, current_time, watched_segments=None):
+    # Número máximo de intervalos guardados em watched_segments
+    MAX_WATCHED_SEGMENTS = 50
+
+    # Intervalos separados por até este número de segundos são unidos
+    SEGMENT_MERGE_GAP = 1
+
+    # Porcentagem assistida a partir da qual a aula é considerada concluída
+    COMPLETION_THRESHOLD = 90
+
+    @classmethod
+    def merge_segments(cls, *segment_lists, duration=0):
         """
-        Atualiza o progresso do vídeo com base na posição atual e segmentos assistidos.
+        Une listas de segmentos [[início, fim], ...] em um conjunto canônico de
+        intervalos ordenados e sem sobreposição.
+
+        Segmentos inválidos são descartados e, se houver duração, os intervalos
+        são limitados a [0, duration]. Quando o resultado passa de
+        MAX_WATCHED_SEGMENTS, só os intervalos mais longos são mantidos: os
+        espaços não assistidos nunca entram na conta, então o tempo assistido
+        pode ficar abaixo do real, mas nunca acima.
         """
-        # Atualiza a posição atual
-        self.current_position = current_time
-        
-        # Atualiza os segmentos assistidos, se fornecidos
+        intervals = []
+        for segments in segment_lists:
+            for segment in segments or []:
+                try:
+                    start, end = int(segment[0]), int(segment[1])
+                except (TypeError, ValueError, IndexError, KeyError):
+                    continue
+                start = max(0, start)
+                if duration:
+                    end = min(end, duration)
+                if end > start:
+                    intervals.append([start, end])
+
+        intervals.sort()
+        merged = []
+        for start, end in intervals:
+            if merged and start <= merged[-1][1] + cls.SEGMENT_MERGE_GAP:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+
+        if len(merged) > cls.MAX_WATCHED_SEGMENTS:
+            # Descarta os intervalos mais curtos
+            longest = sorted(merged, key=lambda interval: interval[1] - interval[0], reverse=True)
+            merged = sorted(longest[:cls.MAX_WATCHED_SEGMENTS])
+
+        return merged
+
+    def apply_heartbeat(self, current_time, duration=None, watched_segments=None):
+        """
+        Aplica os dados de um heartbeat do player sem salvar.
+        Os segmentos recebidos são unidos aos já registrados.
+        Retorna a lista de campos alterados.
+        """
+        changed_fields = []
+
+        if duration and self.video_duration != duration:
+            self.video_duration = duration
+            changed_fields.append('video_duration')
+
+        if self.current_position != current_time:
+            self.current_position = current_time
+            changed_fields.append('current_position')
+
         if watched_segments is not None:
-            self.watched_segments = watched_segments
-            
+            segments = self.merge_segments(self.watched_segments, watched_segments, duration=self.video_duration)
+            if segments != self.watched_segments:
+                self.watched_segments = segments
+                changed_fields.append('watched_segments')
+
             # Calcula a porcentagem assistida com base nos segmentos
             if self.video_duration > 0 and self.watched_segments:
-                total_watched_time = self.get_total_watched_time()
-                self.watched_percentage = min(100, int((total_watched_time / self.video_duration) * 100))
-        else:
+                percentage = min(100, int((self.get_total_watched_time() / self.video_duration) * 100))
+            else:
+                percentage = self.watched_percentage
+        elif self.video_duration > 0:
             # Calcula a porcentagem com base apenas na posição atual
-            if self.video_duration > 0:
-                self.watched_percentage = min(100, int((current_time / self.video_duration) * 100))
-        
-        self.save()
-        
+            percentage = min(100, int((current_time / self.video_duration) * 100))
+        else:
+            percentage = self.watched_percentage
+
+        if percentage != self.watched_percentage:
+            self.watched_percentage = percentage
+            changed_fields.append('watched_percentage')
+
+        return changed_fields
+
+    def update_progress(self, current_time, watched_segments=None, duration=None):
+        """
+        Atualiza o progresso do vídeo com base na posição atual e segmentos assistidos.
+        """
+        changed_fields = self.apply_heartbeat(current_time, duration, watched_segments)
+
+        if self.pk is None:
+            self.save()
+        elif changed_fields:
+            self.save(update_fields=changed_fields + ['last_updated'])
+
         # Verifica se deve marcar a aula como concluída (se assistiu mais de 90%)
-        if self.watched_percentage >= 90 and not self.lesson_progress.is_completed:
+        if self.watched_percentage >= self.COMPLETION_THRESHOLD and not self.lesson_progress.is_completed:
             self.lesson_progress.complete()
-            
+
         return self.watched_percentage
-    
+
     def get_total_watched_time(self):
         """
         Calcula o tempo total assistido com base nos segmentos.
+        Trechos assistidos mais de uma vez são contados apenas uma vez.
         Retorna o tempo total em segundos.
         """
         if not self.watched_segments:
             return self.current_position
-            
-        total_time = 0
-        for start, end in self.watched_segments:
-            segment_duration = end - start
-            if segment_duration > 0:
-                total_time += segment_duration
-                
-        return total_time
+
+        return sum(end - start for start, end in self.merge_segments(self.watched_segments))
 
 
 class ModuleProgress(models.Model):
@@ -828,6 +927,8 @@ class ModuleProgress(models.Model):
         default=0,
         help_text=_('Porcentagem de aulas concluídas no módulo (0-100)')
     )
+    completed_lessons_count = models.PositiveIntegerField(_('aulas concluídas'), default=0)
+    total_lessons_count = models.PositiveIntegerField(_('total de aulas publicadas'), default=0)
     last_accessed_at = models.DateTimeField(_('último acesso em'), auto_now=True)
 
     class Meta:
@@ -842,37 +943,61 @@ class ModuleProgress(models.Model):
 
     def update_progress(self):
         """
-        Atualiza o progresso do módulo baseado nas aulas concluídas.
+        Recalcula o progresso do módulo contando as aulas publicadas e as
+        aulas concluídas pelo aluno. Usado ao criar o registro e na reconciliação.
         """
-        total_lessons = self.module.get_total_lessons()
+        self.total_lessons_count = self.module.get_published_lessons().count()
+        self.completed_lessons_count = LessonProgress.objects.filter(
+            enrollment=self.enrollment,
+            lesson__module=self.module,
+            lesson__status=Lesson.Status.PUBLISHED,
+            is_completed=True
+        ).count()
+
+        self.apply_counters()
+        self.save()
+
+        # Verifica se deve desbloquear o próximo módulo (se o curso tem módulos sequenciais)
+        if self.is_completed and self.module.course.sequential_modules:
+            self.check_next_module_unlock()
 
-        if total_lessons == 0:
+    def apply_counters(self):
+        """
+        Atualiza porcentagem e conclusão a partir dos contadores, sem salvar.
+        """
+        if self.total_lessons_count == 0:
             self.progress_percentage = 100
-            self.is_completed = True
-            self.completed_at = timezone.now()
         else:
-            # Conta quantas aulas do módulo foram concluídas
-            completed_lessons = LessonProgress.objects.filter(
-                enrollment=self.enrollment,
-                lesson__module=self.module,
-                is_completed=True
-            ).count()
-
-            self.progress_percentage = int((completed_lessons / total_lessons) * 100)
+            self.progress_percentage = min(100, int((self.completed_lessons_count / self.total_lessons_count) * 100))
 
-            # Se todas as aulas foram concluídas, marca o módulo como concluído
-            if self.progress_percentage >= 100:
+        # Se todas as aulas foram concluídas, marca o módulo como concluído
+        if self.progress_percentage >= 100:
+            if not self.is_completed:
                 self.is_completed = True
                 self.completed_at = timezone.now()
-            else:
-                self.is_completed = False
-                self.completed_at = None
+        else:
+            self.is_completed = False
+            self.completed_at = None
 
-        self.save()
+    def register_completed_lesson(self):
+        """
+        Incrementa atomicamente o contador de aulas concluídas do módulo.
+        """
+        completed = F('completed_lessons_count') + 1
+        ModuleProgress.objects.filter(pk=self.pk).update(
+            completed_lessons_count=completed,
+            progress_percentage=progress_expression(completed, 'total_lessons_count', 'progress_percentage')
+        )
+        self.refresh_from_db(fields=['completed_lessons_count', 'total_lessons_count', 'progress_percentage'])
+
+        if self.progress_percentage >= 100 and not self.is_completed:
+            self.is_completed = True
+            self.completed_at = timezone.now()
+            self.save(update_fields=['is_completed', 'completed_at', 'last_accessed_at'])
 
-        # Verifica se deve desbloquear o próximo módulo (se o curso tem módulos sequenciais)
-        if self.is_completed and self.module.course.sequential_modules:
-            self.check_next_module_unlock()
+            # Verifica se deve desbloquear o próximo módulo (se o curso tem módulos sequenciais)
+            if self.module.course.sequential_modules:
+                self.check_next_module_unlock()
 
     def check_next_module_unlock(self):
         """
@@ -891,4 +1016,8 @@ class ModuleProgress(models.Model):
                 defaults={'progress_percentage': 0}
             )
 
+            # Inicializa os contadores do novo registro
+            if created:
+                next_progress.update_progress()
+
             # O próximo módulo já está acessível através do método is_accessible_by_student
@@ -0,0 +1,264 @@
+"""
+Snapshot pré-calculado da estrutura de um curso ("outline") usado pela tela
+de aprendizado do aluno (CourseLearnView).
+
+O snapshot reúne, em um número fixo de consultas, as aulas ordenadas, as
+liberações da turma, o progresso do aluno e o progresso dos módulos. Ele é
+guardado no cache por matrícula e invalidado pelos sinais em courses/signals.py
+quando LessonProgress, ModuleProgress, LessonRelease, Module ou Lesson mudam.
+
+A invalidação depende do cache ser compartilhado entre os processos (o alias
+'outline' de CACHES usa o banco de dados): o comando update_lesson_releases e os demais workers
+do gunicorn alteram a versão vista pelo processo que atende o aluno.
+"""
+import time
+
+from django.core.cache import caches
+from django.db.models import Prefetch
+
+from .models import Module, Lesson, LessonRelease, LessonProgress, ModuleProgress
+
+# Alias de CACHES compartilhado entre os processos
+OUTLINE_CACHE_ALIAS = 'outline'
+
+# Tempo máximo que um snapshot permanece no cache (segundos)
+OUTLINE_CACHE_TIMEOUT = 60 * 10
+
+
+def _cache():
+    return caches[OUTLINE_CACHE_ALIAS]
+
+
+def _version_key(course_id):
+    return f"course_outline_version_{course_id}"
+
+
+def _outline_key(course_id, enrollment_id=None):
+    if enrollment_id is None:
+        # Visão do professor (sem matrícula)
+        return f"course_outline_course_{course_id}"
+    return f"course_outline_enrollment_{enrollment_id}"
+
+
+def get_outline_version(course_id):
+    """
+    Retorna a versão atual da estrutura do curso.
+    Se a chave tiver expirado, uma nova versão é gerada, o que descarta
+    qualquer snapshot antigo.
+    """
+    version = _cache().get(_version_key(course_id))
+    if version is None:
+        version = time.time_ns()
+        _cache().set(_version_key(course_id), version, None)
+    return version
+
+
+def invalidate_course_outlines(course_id):
+    """Invalida os snapshots de todas as matrículas de um curso."""
+    _cache().set(_version_key(course_id), time.time_ns(), None)
+
+
+def invalidate_enrollment_outline(enrollment_id):
+    """Invalida o snapshot de uma única matrícula."""
+    _cache().delete(_outline_key(None, enrollment_id))
+
+
+class CourseOutline:
+    """
+    Estrutura do curso do ponto de vista de uma matrícula (ou do professor,
+    quando enrollment é None).
+
+    Datas de liberação são guardadas como estão e avaliadas no momento do uso,
+    assim um snapshot em cache continua correto quando uma data é atingida.
+    """
+
+    def __init__(self, course, enrollment=None):
+        self.course_id = course.id
+        self.sequential_modules = course.sequential_modules
+        self.enrollment_id = enrollment.id if enrollment else None
+        self.class_group_id = enrollment.class_group_id if enrollment else None
+        self.modules = []
+        self.lessons = []
+        self.releases = []
+        self.progress = {}
+        self.module_progresses = {}
+        self._module_ids_by_order = {}
+
+    @classmethod
+    def build(cls, course, enrollment=None):
+        """Monta o snapshot consultando o banco de dados."""
+        outline = cls(course, enrollment)
+
+        all_modules = list(
+            Module.objects.filter(course=course).order_by('order').prefetch_related(
+                Prefetch('lessons', queryset=Lesson.objects.filter(status=Lesson.Status.PUBLISHED).order_by('order'))
+            )
+        )
+        outline.modules = [module for module in all_modules if module.is_active]
+        outline._module_ids_by_order = {module.order: module.id for module in all_modules}
+
+        outline.lessons = list(
+            Lesson.objects.filter(
+                course=course,
+                status=Lesson.Status.PUBLISHED
+            ).select_related('module').order_by('module__order', 'order')
+        )
+
+        if enrollment:
+            if enrollment.class_group_id:
+                outline.releases = list(
+                    LessonRelease.objects.filter(
+                        class_group_id=enrollment.class_group_id
+                    ).select_related('lesson').order_by('release_date')
+                )
+
+            outline.progress = dict(
+                LessonProgress.objects.filter(enrollment=enrollment).order_by().values_list('lesson_id', 'is_completed')
+            )
+
+            if course.sequential_modules and outline.modules:
+                outline.module_progresses = {
+                    module_progress.module_id: module_progress
+                    for module_progress in ModuleProgress.objects.filter(enrollment=enrollment)
+                }
+
+        return outline
+
+    @property
+    def has_releases(self):
+        """Indica se a turma possui configuração de liberação de aulas."""
+        return bool(self.releases)
+
+    @property
+    def visible_lessons(self):
+        """Aulas exibidas ao aluno, na ordem do curso."""
+        if not self.has_releases:
+            return self.lessons
+        released_ids = {release.lesson_id for release in self.releases if release.is_released}
+        return [lesson for lesson in self.lessons if lesson.id in released_ids]
+
+    @property
+    def pending_releases(self):
+        """Liberações ainda não efetivadas, ordenadas por data."""
+        return [release for release in self.releases if not release.is_released]
+
+    @property
+    def completed_lesson_ids(self):
+        return [lesson_id for lesson_id, is_completed in self.progress.items() if is_completed]
+
+    def released_lesson_ids(self, now):
+        """IDs das aulas liberadas cuja data de liberação já passou."""
+        return [
+            release.lesson_id for release in self.releases
+            if release.is_released and release.release_date <= now
+        ]
+
+    def get_release(self, lesson_id):
+        for release in self.releases:
+            if release.lesson_id == lesson_id:
+                return release
+        return None
+
+    def get_lesson(self, lesson_id):
+        """Retorna a aula visível com o ID informado ou None."""
+        try:
+            lesson_id = int(lesson_id)
+        except (TypeError, ValueError):
+            return None
+        for lesson in self.visible_lessons:
+            if lesson.id == lesson_id:
+                return lesson
+        return None
+
+    def first_lesson_in(self, lesson_ids):
+        """Primeira aula visível (na ordem do curso) entre os IDs informados."""
+        lesson_ids = set(lesson_ids)
+        for lesson in self.visible_lessons:
+            if lesson.id in lesson_ids:
+                return lesson
+        return None
+
+    def default_lesson(self, now):
+        """
+        Aula que o aluno deve assistir quando nenhuma foi escolhida: a primeira
+        aula iniciada e não concluída ou, na falta dela, a primeira disponível.
+        """
+        lessons = self.visible_lessons
+        if not lessons:
+            return None
+
+        if self.enrollment_id is None or self.class_group_id is None:
+            # Professores ou alunos sem turma
+            return lessons[0]
+
+        started_ids = [lesson_id for lesson_id, is_completed in self.progress.items() if not is_completed]
+
+        if self.has_releases:
+            released_ids = set(self.released_lesson_ids(now))
+            if not released_ids:
+                return None
+            return (
+                self.first_lesson_in(released_ids.intersection(started_ids))
+                or self.first_lesson_in(released_ids)
+            )
+
+        return self.first_lesson_in(started_ids) or lessons[0]
+
+    def get_neighbours(self, lesson):
+        """Retorna a tupla (aula anterior, próxima aula) dentro das aulas visíveis."""
+        lessons = self.visible_lessons
+        ids = [item.id for item in lessons]
+        if lesson.id not in ids:
+            return None, None
+        index = ids.index(lesson.id)
+        prev_lesson = lessons[index - 1] if index > 0 else None
+        next_lesson = lessons[index + 1] if index < len(lessons) - 1 else None
+        return prev_lesson, next_lesson
+
+    def is_module_accessible(self, module):
+        """
+        Equivalente a Module.is_accessible_by_student, mas sem consultas.
+        """
+        if not self.sequential_modules or module.order == 1:
+            return True
+
+        previous_module_id = self._module_ids_by_order.get(module.order - 1)
+        if previous_module_id:
+            previous_progress = self.module_progresses.get(previous_module_id)
+            if previous_progress:
+                return previous_progress.is_completed
+
+        return False
+
+    def get_module_progresses(self):
+        """Lista de progresso e acessibilidade de cada módulo ativo."""
+        module_progresses = []
+        for module in self.modules:
+            module_progress = self.module_progresses.get(module.id)
+            if module_progress is None:
+                module_progress = ModuleProgress(enrollment_id=self.enrollment_id, module=module)
+            module_progresses.append({
+                'module': module,
+                'progress': module_progress,
+                'is_accessible': self.is_module_accessible(module),
+            })
+        return module_progresses
+
+
+def get_course_outline(course, enrollment=None):
+    """
+    Retorna o snapshot do curso para a matrícula, usando o cache sempre que
+    a versão da estrutura do curso não tiver mudado.
+    """
+    version = get_outline_version(course.id)
+    key = _outline_key(course.id, enrollment.id if enrollment else None)
+
+    cached = _cache().get(key)
+    if cached is not None:
+        cached_version, outline = cached
+        if cached_version == version:
+            return outline
+
+    outline = CourseOutline.build(course, enrollment)
+    _cache().set(key, (version, outline), OUTLINE_CACHE_TIMEOUT)
+    return outline
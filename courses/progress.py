@@ -0,0 +1,479 @@
+"""
+Serviços de ingestão dos heartbeats de progresso de vídeo.
+
+Um lote pode trazer vários heartbeats de várias aulas. Os heartbeats de uma
+mesma aula são consolidados em memória e cada VideoProgress alterado é gravado
+uma única vez com bulk_update, apenas com os campos que mudaram.
+
+Com VIDEO_PROGRESS_WRITE_BEHIND ativo, os heartbeats (individuais e em lote)
+ficam em um buffer em memória do processo (HeartbeatBuffer) e são gravados
+periodicamente por uma thread, no máximo a cada VIDEO_PROGRESS_FLUSH_INTERVAL
+segundos.
+
+reconcile_progress_counters recalcula os contadores desnormalizados de
+Enrollment e ModuleProgress quando aulas são publicadas, despublicadas,
+movidas de módulo ou excluídas.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import transaction, connection
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Lesson, Enrollment, LessonProgress, VideoProgress, Module, ModuleProgress
+from .outline import invalidate_enrollment_outline
+
+logger = logging.getLogger(__name__)
+
+# Número máximo de heartbeats aceitos em uma única requisição
+MAX_HEARTBEATS_PER_BATCH = 200
+
+# Tamanho dos lotes de bulk_update na reconciliação de contadores
+RECONCILE_BATCH_SIZE = 500
+
+
+class HeartbeatError(ValueError):
+    """Heartbeat com formato inválido."""
+
+
+def parse_heartbeat(data):
+    """
+    Valida e normaliza um heartbeat recebido do player.
+    Retorna um dicionário com lesson_id, current_time, duration e watched_segments.
+    """
+    if not isinstance(data, dict):
+        raise HeartbeatError('Cada heartbeat deve ser um objeto.')
+
+    lesson_id = data.get('lesson_id')
+    current_time = data.get('current_time')
+    if lesson_id in (None, '') or current_time in (None, ''):
+        raise HeartbeatError('É necessário fornecer lesson_id e current_time.')
+
+    try:
+        heartbeat = {
+            'lesson_id': int(lesson_id),
+            'current_time': max(0, int(float(current_time))),
+            'duration': int(float(data['duration'])) if data.get('duration') else None,
+            'watched_segments': None,
+        }
+    except (TypeError, ValueError):
+        raise HeartbeatError('Formato inválido de parâmetros. Verifique os tipos de dados enviados.')
+
+    watched_segments = data.get('watched_segments')
+    if watched_segments is not None:
+        if not isinstance(watched_segments, list):
+            raise HeartbeatError('watched_segments deve ser uma lista de pares [início, fim].')
+        heartbeat['watched_segments'] = watched_segments
+
+    return heartbeat
+
+
+def coalesce_heartbeats(heartbeats):
+    """
+    Consolida os heartbeats por aula, mantendo a ordem de chegada: a última
+    posição vence, a maior duração informada vence e os segmentos são unidos.
+    """
+    coalesced = {}
+    for heartbeat in heartbeats:
+        current = coalesced.get(heartbeat['lesson_id'])
+        if current is None:
+            coalesced[heartbeat['lesson_id']] = dict(heartbeat)
+            continue
+
+        current['current_time'] = heartbeat['current_time']
+        if heartbeat['duration']:
+            current['duration'] = max(current['duration'] or 0, heartbeat['duration'])
+        if heartbeat['watched_segments'] is not None:
+            current['watched_segments'] = VideoProgress.merge_segments(
+                current['watched_segments'], heartbeat['watched_segments']
+            )
+    return coalesced
+
+
+def ingest_heartbeats(user, heartbeats):
+    """
+    Aplica um lote de heartbeats do aluno.
+
+    Retorna uma lista com o resultado de cada aula: o progresso atualizado ou
+    um erro quando a aula não existe ou o aluno não tem matrícula ativa.
+    """
+    coalesced = coalesce_heartbeats(heartbeats)
+    if not coalesced:
+        return []
+
+    lesson_courses = dict(
+        Lesson.objects.filter(id__in=coalesced.keys()).values_list('id', 'course_id')
+    )
+
+    enrollments = {}
+    for enrollment in Enrollment.objects.filter(
+        student=user,
+        course_id__in=set(lesson_courses.values()),
+        status=Enrollment.Status.ACTIVE
+    ).order_by('enrolled_at'):
+        enrollments.setdefault(enrollment.course_id, enrollment)
+
+    # Aulas às quais o aluno tem acesso, com a matrícula correspondente
+    targets = {
+        lesson_id: enrollments[course_id]
+        for lesson_id, course_id in lesson_courses.items()
+        if course_id in enrollments
+    }
+
+    results = []
+    for lesson_id in coalesced:
+        if lesson_id not in lesson_courses:
+            results.append({'lesson_id': lesson_id, 'success': False, 'message': 'Aula não encontrada.'})
+        elif lesson_id not in targets:
+            results.append({
+                'lesson_id': lesson_id,
+                'success': False,
+                'message': 'Você não está matriculado neste curso ou sua matrícula não está ativa.'
+            })
+
+    if not targets:
+        return results
+
+    write_behind = settings.VIDEO_PROGRESS_WRITE_BEHIND
+
+    with transaction.atomic():
+        progresses = _get_or_create_lesson_progresses(targets)
+        video_progresses = _get_or_create_video_progresses(progresses.values(), coalesced)
+
+        now = timezone.now()
+        changed = []
+        changed_fields = set()
+        for lesson_id, lesson_progress in progresses.items():
+            heartbeat = coalesced[lesson_id]
+            video_progress = video_progresses[lesson_progress.id]
+            if write_behind:
+                # Passa pelo buffer para não sobrescrever heartbeats ainda não gravados
+                video_progresses[lesson_progress.id] = heartbeat_buffer.add(
+                    user.id, lesson_id, video_progress,
+                    heartbeat['current_time'], heartbeat['watched_segments'], heartbeat['duration']
+                )
+                continue
+            fields = video_progress.apply_heartbeat(
+                heartbeat['current_time'],
+                heartbeat['duration'],
+                heartbeat['watched_segments']
+            )
+            if fields:
+                video_progress.last_updated = now
+                changed.append(video_progress)
+                changed_fields.update(fields)
+
+        if changed:
+            VideoProgress.objects.bulk_update(changed, sorted(changed_fields) + ['last_updated'])
+
+        for lesson_id, lesson_progress in progresses.items():
+            video_progress = video_progresses[lesson_progress.id]
+            lesson_progress = video_progress.lesson_progress
+
+            # Verifica se deve marcar a aula como concluída (se assistiu mais de 90%)
+            if (video_progress.watched_percentage >= VideoProgress.COMPLETION_THRESHOLD
+                    and not lesson_progress.is_completed):
+                lesson_progress.complete()
+
+            results.append({
+                'lesson_id': lesson_id,
+                'success': True,
+                'current_time': video_progress.current_position,
+                'duration': video_progress.video_duration,
+                'percentage': video_progress.watched_percentage,
+                'is_completed': lesson_progress.is_completed,
+            })
+
+    return results
+
+
+def _get_or_create_lesson_progresses(targets):
+    """
+    Retorna {lesson_id: LessonProgress} criando em lote os registros que faltam.
+    """
+    def fetch():
+        return {
+            progress.lesson_id: progress
+            for progress in LessonProgress.objects.filter(
+                enrollment_id__in={enrollment.id for enrollment in targets.values()},
+                lesson_id__in=targets.keys()
+            ).select_related('enrollment')
+            if progress.enrollment_id == targets[progress.lesson_id].id
+        }
+
+    progresses = fetch()
+    missing = [lesson_id for lesson_id in targets if lesson_id not in progresses]
+    if missing:
+        LessonProgress.objects.bulk_create(
+            [LessonProgress(enrollment=targets[lesson_id], lesson_id=lesson_id) for lesson_id in missing],
+            ignore_conflicts=True
+        )
+        # bulk_create não dispara sinais, então invalida os snapshots manualmente
+        for enrollment_id in {targets[lesson_id].id for lesson_id in missing}:
+            invalidate_enrollment_outline(enrollment_id)
+        progresses = fetch()
+    return progresses
+
+
+def _get_or_create_video_progresses(lesson_progresses, coalesced):
+    """
+    Retorna {lesson_progress_id: VideoProgress} criando em lote os registros que faltam.
+    """
+    lesson_progresses = list(lesson_progresses)
+
+    def fetch():
+        return {
+            video_progress.lesson_progress_id: video_progress
+            for video_progress in VideoProgress.objects.filter(
+                lesson_progress__in=lesson_progresses
+            )
+        }
+
+    video_progresses = fetch()
+    missing = [progress for progress in lesson_progresses if progress.id not in video_progresses]
+    if missing:
+        VideoProgress.objects.bulk_create(
+            [
+                VideoProgress(
+                    lesson_progress=progress,
+                    video_duration=coalesced[progress.lesson_id]['duration'] or 0
+                )
+                for progress in missing
+            ],
+            ignore_conflicts=True
+        )
+        video_progresses = fetch()
+
+    # Reaproveita as instâncias já carregadas para evitar novas consultas
+    progresses_by_id = {progress.id: progress for progress in lesson_progresses}
+    for video_progress in video_progresses.values():
+        video_progress.lesson_progress = progresses_by_id[video_progress.lesson_progress_id]
+    return video_progresses
+
+
+class HeartbeatBuffer:
+    """
+    Buffer write-behind dos heartbeats de vídeo, chaveado pelo id do
+    VideoProgress (com um índice por (aluno, aula) para a busca das views).
+
+    Cada entrada guarda o VideoProgress carregado na primeira requisição e os
+    campos alterados desde a última gravação. Heartbeats seguintes, mesmo que
+    tragam outra instância carregada do banco, são aplicados à instância em
+    buffer, então nada do que ainda não foi gravado se perde. O flush grava um
+    único UPDATE por entrada; entradas sem heartbeats desde o flush anterior
+    são descartadas. Ao atingir o limite de conclusão, a entrada é gravada na
+    hora e a aula é concluída sem esperar o próximo flush.
+    """
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self._entries = {}
+        self._keys = {}
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def get(self, user_id, lesson_id):
+        """Retorna o VideoProgress em buffer para o aluno e a aula, se houver."""
+        with self._lock:
+            entry = self._entries.get(self._keys.get((user_id, lesson_id)))
+            return entry['video_progress'] if entry else None
+
+    def discard(self, user_id, lesson_id):
+        """Grava o que estiver pendente para o aluno e a aula e tira a entrada do buffer."""
+        with self._lock:
+            entry = self._entries.pop(self._keys.pop((user_id, lesson_id), None), None)
+            changes = self._pop_changes(entry) if entry else None
+        self._write(changes)
+
+    def add(self, user_id, lesson_id, video_progress, current_time, watched_segments=None, duration=None):
+        """
+        Aplica um heartbeat ao VideoProgress em memória (o já em buffer, se
+        houver). Retorna a instância atualizada.
+        """
+        changes = None
+        with self._lock:
+            entry = self._entries.get(video_progress.pk)
+            if entry is None:
+                entry = {'video_progress': video_progress, 'key': (user_id, lesson_id), 'fields': set(), 'touched': True}
+                self._entries[video_progress.pk] = entry
+                self._keys[entry['key']] = video_progress.pk
+            video_progress = entry['video_progress']
+
+            entry['fields'].update(video_progress.apply_heartbeat(current_time, duration, watched_segments))
+            entry['touched'] = True
+
+            lesson_progress = video_progress.lesson_progress
+            must_complete = (
+                video_progress.watched_percentage >= VideoProgress.COMPLETION_THRESHOLD
+                and not lesson_progress.is_completed
+            )
+            if must_complete:
+                changes = self._pop_changes(entry)
+
+        if must_complete:
+            self._write(changes)
+            lesson_progress.complete()
+        else:
+            self._schedule()
+
+        return video_progress
+
+    def flush(self):
+        """Grava todas as entradas alteradas. Retorna o número de UPDATEs executados."""
+        pending = []
+        with self._lock:
+            for pk, entry in list(self._entries.items()):
+                changes = self._pop_changes(entry)
+                if changes:
+                    pending.append(changes)
+                if entry['touched']:
+                    entry['touched'] = False
+                else:
+                    # Nenhum heartbeat desde o último flush: libera a memória
+                    del self._entries[pk]
+                    del self._keys[entry['key']]
+
+        for changes in pending:
+            self._write(changes)
+        return len(pending)
+
+    def _pop_changes(self, entry):
+        """Retorna (pk, valores alterados) da entrada e limpa os campos pendentes."""
+        fields = entry['fields']
+        if not fields:
+            return None
+        video_progress = entry['video_progress']
+        video_progress.last_updated = timezone.now()
+        entry['fields'] = set()
+        return video_progress.pk, {field: getattr(video_progress, field) for field in fields | {'last_updated'}}
+
+    def _write(self, changes):
+        if changes:
+            pk, values = changes
+            VideoProgress.objects.filter(pk=pk).update(**values)
+
+    def _schedule(self):
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.flush_interval, self._run)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _run(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Erro ao gravar o buffer de progresso de vídeo')
+        finally:
+            # A thread do timer abre sua própria conexão; fecha para não vazar
+            connection.close()
+            with self._lock:
+                self._timer = None
+                pending = bool(self._entries)
+            if pending:
+                self._schedule()
+
+
+heartbeat_buffer = HeartbeatBuffer(settings.VIDEO_PROGRESS_FLUSH_INTERVAL)
+
+# Grava o que estiver pendente quando o processo encerrar normalmente
+atexit.register(heartbeat_buffer.flush)
+
+
+def reconcile_progress_counters(course_ids=None):
+    """
+    Recalcula os contadores de aulas publicadas/concluídas das matrículas e
+    dos progressos de módulo (de todos os cursos ou apenas dos informados)
+    e grava somente os registros que mudaram.
+
+    O status das matrículas não é alterado: apenas os contadores e as
+    porcentagens. Retorna a tupla (matrículas atualizadas, módulos atualizados).
+    """
+    published = Q(lessons__status=Lesson.Status.PUBLISHED)
+    completed_published = Q(
+        lesson_progresses__is_completed=True,
+        lesson_progresses__lesson__status=Lesson.Status.PUBLISHED
+    )
+
+    courses_filter = Q() if course_ids is None else Q(course_id__in=course_ids)
+
+    # Total de aulas publicadas por curso e por módulo
+    course_totals = dict(
+        Lesson.objects.filter(courses_filter, status=Lesson.Status.PUBLISHED)
+        .order_by().values('course_id').annotate(total=Count('id')).values_list('course_id', 'total')
+    )
+    module_totals = dict(
+        Module.objects.filter(courses_filter)
+        .order_by().annotate(total=Count('lessons', filter=published)).values_list('id', 'total')
+    )
+
+    # Aulas publicadas concluídas por matrícula e por (matrícula, módulo)
+    enrollment_completed = dict(
+        Enrollment.objects.filter(courses_filter)
+        .order_by().annotate(done=Count('lesson_progresses', filter=completed_published)).values_list('id', 'done')
+    )
+    module_completed = {
+        (row['enrollment_id'], row['lesson__module_id']): row['done']
+        for row in LessonProgress.objects.filter(
+            Q() if course_ids is None else Q(enrollment__course_id__in=course_ids),
+            is_completed=True,
+            lesson__status=Lesson.Status.PUBLISHED,
+            lesson__module__isnull=False
+        ).order_by().values('enrollment_id', 'lesson__module_id').annotate(done=Count('id'))
+    }
+
+    changed_enrollments = []
+    for enrollment in Enrollment.objects.filter(courses_filter).only(
+        'id', 'course_id', 'completed_lessons_count', 'total_lessons_count', 'progress'
+    ):
+        total = course_totals.get(enrollment.course_id, 0)
+        done = min(enrollment_completed.get(enrollment.id, 0), total)
+        progress = int((done / total) * 100) if total else enrollment.progress
+        if (enrollment.total_lessons_count, enrollment.completed_lessons_count, enrollment.progress) != (total, done, progress):
+            enrollment.total_lessons_count = total
+            enrollment.completed_lessons_count = done
+            enrollment.progress = progress
+            changed_enrollments.append(enrollment)
+
+    Enrollment.objects.bulk_update(
+        changed_enrollments,
+        ['total_lessons_count', 'completed_lessons_count', 'progress'],
+        batch_size=RECONCILE_BATCH_SIZE
+    )
+
+    changed_modules = []
+    module_progresses = ModuleProgress.objects.filter(
+        Q() if course_ids is None else Q(module__course_id__in=course_ids)
+    )
+    for module_progress in module_progresses:
+        total = module_totals.get(module_progress.module_id, 0)
+        done = min(module_completed.get((module_progress.enrollment_id, module_progress.module_id), 0), total)
+        before = (
+            module_progress.total_lessons_count, module_progress.completed_lessons_count,
+            module_progress.progress_percentage, module_progress.is_completed
+        )
+        module_progress.total_lessons_count = total
+        module_progress.completed_lessons_count = done
+        module_progress.apply_counters()
+        after = (
+            module_progress.total_lessons_count, module_progress.completed_lessons_count,
+            module_progress.progress_percentage, module_progress.is_completed
+        )
+        if before != after:
+            changed_modules.append(module_progress)
+
+    ModuleProgress.objects.bulk_update(
+        changed_modules,
+        ['total_lessons_count', 'completed_lessons_count', 'progress_percentage', 'is_completed', 'completed_at'],
+        batch_size=RECONCILE_BATCH_SIZE
+    )
+
+    # bulk_update não dispara sinais, então invalida os snapshots manualmente
+    for enrollment_id in {item.id for item in changed_enrollments} | {item.enrollment_id for item in changed_modules}:
+        invalidate_enrollment_outline(enrollment_id)
+
+    return len(changed_enrollments), len(changed_modules)
@@ -0,0 +1,91 @@
+"""
+Sinais para o aplicativo de cursos.
+"""
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Module, Lesson, LessonRelease, Enrollment, LessonProgress, ModuleProgress
+from .outline import invalidate_course_outlines, invalidate_enrollment_outline
+
+
+@receiver([post_save, post_delete], sender=Module)
+@receiver([post_save, post_delete], sender=Lesson)
+def course_structure_changed(sender, instance, **kwargs):
+    """
+    Invalida os snapshots do curso quando um módulo ou uma aula muda.
+    """
+    invalidate_course_outlines(instance.course_id)
+
+
+@receiver([post_save, post_delete], sender=LessonRelease)
+def lesson_release_changed(sender, instance, **kwargs):
+    """
+    Invalida os snapshots do curso quando a liberação de uma aula muda.
+    """
+    course_id = Lesson.objects.filter(pk=instance.lesson_id).values_list('course_id', flat=True).first()
+    if course_id:
+        invalidate_course_outlines(course_id)
+
+
+@receiver([post_save, post_delete], sender=LessonProgress)
+@receiver([post_save, post_delete], sender=ModuleProgress)
+def progress_changed(sender, instance, **kwargs):
+    """
+    Invalida o snapshot da matrícula quando o progresso do aluno muda.
+    """
+    invalidate_enrollment_outline(instance.enrollment_id)
+
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def enrollment_changed(sender, instance, **kwargs):
+    """
+    Invalida o snapshot da matrícula (por exemplo, quando a turma muda).
+    """
+    invalidate_enrollment_outline(instance.id)
+
+
+def _schedule_reconciliation(course_id):
+    """Agenda a reconciliação dos contadores do curso para depois do commit."""
+    transaction.on_commit(lambda: call_command('reconcile_progress_counters', course_ids=[course_id]))
+
+
+@receiver(pre_save, sender=Lesson)
+def remember_lesson_state(sender, instance, **kwargs):
+    """
+    Guarda o status e o módulo anteriores da aula para detectar publicação,
+    despublicação ou troca de módulo no post_save.
+    """
+    instance._previous_state = None
+    if instance.pk:
+        instance._previous_state = Lesson.objects.filter(pk=instance.pk).values_list('status', 'module_id').first()
+
+
+@receiver(post_save, sender=Lesson)
+def lesson_publication_changed(sender, instance, created, **kwargs):
+    """
+    Reconcilia os contadores de progresso quando uma aula publicada é criada,
+    publicada, despublicada ou movida para outro módulo.
+    """
+    previous_state = getattr(instance, '_previous_state', None)
+    if created or previous_state is None:
+        changed = instance.is_published
+    else:
+        previous_status, previous_module_id = previous_state
+        changed = (
+            previous_status != instance.status
+            or (instance.is_published and previous_module_id != instance.module_id)
+        )
+
+    if changed:
+        _schedule_reconciliation(instance.course_id)
+
+
+@receiver(post_delete, sender=Lesson)
+def lesson_deleted(sender, instance, **kwargs):
+    """
+    Reconcilia os contadores de progresso quando uma aula publicada é excluída.
+    """
+    if instance.is_published:
+        _schedule_reconciliation(instance.course_id)
@@ -3,12 +3,13 @@ from django.urls import reverse_lazy, reverse
 from django.views.generic import ListView, DetailView, FormView, View
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib import messages
-from django.db.models import Q, Count, Case, When, IntegerField, Prefetch
+from django.db.models import Q, Count, Case, When, IntegerField
 from django.http import HttpResponseRedirect, JsonResponse
 from django.utils import timezone
 
-from .models import Course, Lesson, Enrollment, LessonProgress, ClassGroup, LessonRelease, Module, ModuleProgress
+from .models import Course, Lesson, Enrollment, LessonProgress, ClassGroup, LessonRelease
 from .forms import CourseEnrollForm, CourseSearchForm
+from .outline import get_course_outline
 from core.models import User
 from scheduler.models import EventParticipant
 
@@ -290,6 +291,8 @@ class CourseListView(LoginRequiredMixin, StudentOrProfessorRequiredMixin, ListVi
         context['search_form'] = CourseSearchForm(self.request.GET)
         context['is_professor'] = self.request.user.is_professor
         context['is_student'] = self.request.user.is_student
+        # Assina as URLs das imagens dos cursos da página de uma vez
+        Course.prefetch_image_urls(context['courses'])
         return context
 
 
@@ -577,18 +580,13 @@ class CourseLearnView(LoginRequiredMixin, DetailView):
         # Se não for professor/autor, verifica se está matriculado e com status ACTIVE
         if not (is_professor and is_course_author):
             # Primeiro verificamos se o usuário tem acesso via turma
-            has_class_group_access = ClassGroup.objects.filter(
+            class_group = ClassGroup.objects.filter(
                 students=request.user,
                 courses=course
-            ).exists()
+            ).first()
             
             # Se tem acesso via turma, criamos ou atualizamos a matrícula automaticamente
-            if has_class_group_access:
-                class_group = ClassGroup.objects.filter(
-                    students=request.user,
-                    courses=course
-                ).first()
-                
+            if class_group:
                 # Verifica se já existe matrícula ou cria uma nova
                 enrollment, created = Enrollment.objects.get_or_create(
                     student=request.user,
@@ -683,12 +681,6 @@ class CourseLearnView(LoginRequiredMixin, DetailView):
 
         context['is_professor'] = is_professor
         context['is_course_author'] = is_course_author
-
-        # Obtém módulos do curso
-        modules = Module.objects.filter(course=course, is_active=True).order_by('order').prefetch_related(
-            Prefetch('lessons', queryset=Lesson.objects.filter(status=Lesson.Status.PUBLISHED).order_by('order'))
-        )
-        context['modules'] = modules
         context['sequential_modules'] = course.sequential_modules
 
         # Se é professor e autor do curso, permite acesso sem matrícula
@@ -697,12 +689,6 @@ class CourseLearnView(LoginRequiredMixin, DetailView):
             context['enrollment'] = None
             context['progress_width'] = "100%"
             context['viewing_as_professor'] = True
-
-            # Obtém todas as aulas do curso em ordem
-            lessons = Lesson.objects.filter(
-                course=course,
-                status=Lesson.Status.PUBLISHED
-            ).order_by('module__order', 'order')
         else:
             # Obtém a matrícula do aluno
             enrollment = get_object_or_404(
@@ -711,228 +697,98 @@ class CourseLearnView(LoginRequiredMixin, DetailView):
                 course=course,
                 status=Enrollment.Status.ACTIVE
             )
-            
+
             context['enrollment'] = enrollment
             context['progress_width'] = f"{enrollment.progress}%"
 
+        # Snapshot da estrutura do curso (aulas, liberações e progresso),
+        # calculado uma única vez e reaproveitado do cache
+        outline = get_course_outline(course, enrollment)
+        now = timezone.now()
+
+        context['modules'] = outline.modules
+
+        if enrollment:
             # Adiciona progresso dos módulos
-            if course.sequential_modules and modules.exists():
-                module_progresses = []
-                for module in modules:
-                    module_progress, created = ModuleProgress.objects.get_or_create(
-                        enrollment=enrollment,
-                        module=module
-                    )
-                    # Verifica se o módulo está acessível
-                    is_accessible = module.is_accessible_by_student(enrollment)
-                    module_progresses.append({
-                        'module': module,
-                        'progress': module_progress,
-                        'is_accessible': is_accessible
-                    })
-                context['module_progresses'] = module_progresses
-            
-            # Verifica se o aluno está matriculado através de uma turma
-            if enrollment.class_group:
-                # Obtém aulas liberadas para a turma
-                released_lesson_ids = LessonRelease.objects.filter(
-                    class_group=enrollment.class_group,
-                    is_released=True
-                ).values_list('lesson_id', flat=True)
-                
-                # Obtém apenas as aulas liberadas ou todas se não houver configuração de liberação
-                lessons_with_releases = Lesson.objects.filter(
-                    course=course,
-                    status=Lesson.Status.PUBLISHED,
-                    id__in=released_lesson_ids
-                ).order_by('module__order', 'order')
-                
-                # Se não houver aulas liberadas explicitamente, verificamos se há configurações de liberação
-                has_releases = LessonRelease.objects.filter(
-                    class_group=enrollment.class_group
-                ).exists()
-                
-                if has_releases:
-                    # Se há configurações, só mostra aulas liberadas
-                    lessons = lessons_with_releases
-                    context['has_lesson_releases'] = True
-                    
-                    # Adiciona informações sobre aulas pendentes
-                    pending_releases = LessonRelease.objects.filter(
-                        class_group=enrollment.class_group,
-                        is_released=False
-                    ).select_related('lesson').order_by('release_date')
-                    
-                    context['pending_releases'] = pending_releases
-                    
-                    # MODIFICAÇÃO: Obter e passar para o template a lista de aulas efetivamente liberadas
-                    # considerando tanto is_released quanto a data de liberação
-                    released_lessons = LessonRelease.objects.filter(
-                        class_group=enrollment.class_group,
-                        is_released=True,
-                        release_date__lte=timezone.now()  # Garantir que a data já passou
-                    ).values_list('lesson_id', flat=True)
-                    
-                    context['released_lessons'] = list(released_lessons)
-                else:
-                    # Se não há configurações de liberação, mostra todas as aulas
-                    lessons = Lesson.objects.filter(
-                        course=course,
-                        status=Lesson.Status.PUBLISHED
-                    ).order_by('module__order', 'order')
-            else:
-                # Se não tem turma, mostra todas as aulas
-                lessons = Lesson.objects.filter(
-                    course=course,
-                    status=Lesson.Status.PUBLISHED
-                ).order_by('module__order', 'order')
-        
+            if course.sequential_modules and outline.modules:
+                context['module_progresses'] = outline.get_module_progresses()
+
+            # Se há configurações de liberação para a turma, só mostra aulas liberadas
+            if outline.has_releases:
+                context['has_lesson_releases'] = True
+                context['pending_releases'] = outline.pending_releases
+                # Aulas efetivamente liberadas, considerando tanto is_released quanto a data de liberação
+                context['released_lessons'] = outline.released_lesson_ids(now)
+
+        lessons = outline.visible_lessons
         context['lessons'] = lessons
-        
+
         # Verifica qual aula o aluno deve assistir agora (parâmetro ou próxima não concluída)
         lesson_id = self.request.GET.get('lesson_id')
         current_lesson = None
-        
+
         if lesson_id:
             # Se um ID de aula foi fornecido, usa essa aula
-            try:
-                current_lesson = lessons.get(pk=lesson_id)
-            except Lesson.DoesNotExist:
-                pass
-                
-        if not current_lesson and lessons.exists():
-            # Encontra a primeira aula não concluída ou a primeira aula
-            if enrollment and enrollment.class_group:
-                # Primeiro, verificar se existem liberações para esta turma
-                has_releases = LessonRelease.objects.filter(
-                    class_group=enrollment.class_group
-                ).exists()
-                
-                if has_releases:
-                    # Se existem liberações configuradas, só considerar aulas liberadas
-                    released_lessons = LessonRelease.objects.filter(
-                        class_group=enrollment.class_group,
-                        is_released=True,
-                        release_date__lte=timezone.now()  # Garantir que a data já passou
-                    ).values_list('lesson_id', flat=True)
-                    
-                    print(f"[DEBUG] Aulas liberadas para turma {enrollment.class_group.id}: {list(released_lessons)}")
-                    
-                    # MODIFICAÇÃO: Adicionar released_lessons ao contexto se ainda não foi adicionado
-                    if 'released_lessons' not in context:
-                        context['released_lessons'] = list(released_lessons)
-                    
-                    if released_lessons:
-                        # Encontrar a primeira aula não concluída entre as liberadas
-                        lesson_progress = LessonProgress.objects.filter(
-                            enrollment=enrollment,
-                            is_completed=False,
-                            lesson__id__in=released_lessons  # Apenas aulas liberadas
-                        ).order_by('lesson__order').first()
-                        
-                        if lesson_progress:
-                            current_lesson = lesson_progress.lesson
-                            print(f"[DEBUG] Selecionada aula não concluída liberada: {current_lesson.id}")
-                        else:
-                            # Se todas estão concluídas, pega a primeira liberada
-                            first_released_lesson = Lesson.objects.filter(
-                                id__in=released_lessons,
-                                course=course
-                            ).order_by('order').first()
-                            
-                            if first_released_lesson:
-                                current_lesson = first_released_lesson
-                                print(f"[DEBUG] Todas concluídas, selecionada primeira liberada: {current_lesson.id}")
-                    
-                    # Se não encontrou nenhuma aula liberada, não seleciona nenhuma
-                    if not current_lesson:
-                        print("[DEBUG] Nenhuma aula liberada encontrada para este curso")
-                else:
-                    # Comportamento normal quando não há liberações configuradas
-                    lesson_progress = LessonProgress.objects.filter(
-                        enrollment=enrollment,
-                        is_completed=False,
-                        lesson__in=lessons
-                    ).order_by('lesson__order').first()
-                    
-                    if lesson_progress:
-                        current_lesson = lesson_progress.lesson
-                    else:
-                        current_lesson = lessons.first()
-            else:
-                # Para professores ou alunos sem turma, comportamento normal
-                current_lesson = lessons.first()
-        
-        context['current_lesson'] = current_lesson
-        
+            current_lesson = outline.get_lesson(lesson_id)
+
+        if not current_lesson:
+            current_lesson = outline.default_lesson(now)
+            if not current_lesson and outline.has_releases:
+                print("[DEBUG] Nenhuma aula liberada encontrada para este curso")
+
         # Busca as aulas que o aluno já completou para marcar visualmente
         if enrollment:
-            completed_lessons = LessonProgress.objects.filter(
-                enrollment=enrollment,
-                is_completed=True
-            ).values_list('lesson_id', flat=True)
-            context['completed_lessons'] = completed_lessons
+            context['completed_lessons'] = outline.completed_lesson_ids
         else:
             # Para professores, todas as aulas são consideradas completas
-            context['completed_lessons'] = [lesson.id for lesson in context['lessons']]
-        
+            context['completed_lessons'] = [lesson.id for lesson in lessons]
+
         if current_lesson:
             # Verificar se a aula está liberada (para alunos em turmas)
             is_lesson_released = True  # Padrão: liberada
             release_date = None
-            
-            if enrollment and enrollment.class_group and not (is_professor and is_course_author):
+
+            if enrollment and enrollment.class_group_id and not (is_professor and is_course_author):
                 # Buscar liberação desta aula para esta turma
-                lesson_release = LessonRelease.objects.filter(
-                    class_group=enrollment.class_group,
-                    lesson=current_lesson
-                ).first()
-                
+                lesson_release = outline.get_release(current_lesson.id)
+
                 if lesson_release:
                     # Verificar não apenas o flag is_released, mas também a data
-                    if lesson_release.release_date > timezone.now():
+                    if lesson_release.release_date > now:
                         # Se a data é futura, forçar is_lesson_released = False
                         is_lesson_released = False
                         print(f"[DEBUG] get_context_data: Forçando bloqueio da aula {current_lesson.id} - data futura")
                     else:
                         is_lesson_released = lesson_release.is_released
-                    
+
                     release_date = lesson_release.release_date
                     print(f"[DEBUG] get_context_data: Aula {current_lesson.id}, release_date={release_date}, is_released={is_lesson_released}")
 
-                # MODIFICAÇÃO: Se a aula não estiver liberada e não for a primeira acesso,
-                # substitua por uma aula liberada ou mostre mensagem
-                if not is_lesson_released and not self.request.GET.get('lesson_id'):
-                    # Tentar encontrar a primeira aula liberada
-                    if 'released_lessons' in context and context['released_lessons']:
-                        try:
-                            current_lesson = Lesson.objects.filter(
-                                id__in=context['released_lessons'],
-                                course=course
-                            ).order_by('order').first()
-                            
-                            if current_lesson:
-                                is_lesson_released = True
-                                print(f"[DEBUG] Substituindo por primeira aula liberada: {current_lesson.id}")
-                        except Exception as e:
-                            print(f"[DEBUG] Erro ao buscar aula liberada: {e}")
-            
+                # Se a aula não estiver liberada e não foi escolhida explicitamente,
+                # substitua pela primeira aula liberada
+                if not is_lesson_released and not lesson_id and context.get('released_lessons'):
+                    first_released_lesson = outline.first_lesson_in(context['released_lessons'])
+                    if first_released_lesson:
+                        current_lesson = first_released_lesson
+                        is_lesson_released = True
+                        print(f"[DEBUG] Substituindo por primeira aula liberada: {current_lesson.id}")
+
             context['is_lesson_released'] = is_lesson_released
             context['release_date'] = release_date
-            
+
             # Atualiza ou cria um registro de progresso para esta aula (apenas para alunos)
-            if enrollment:
-                lesson_progress, created = LessonProgress.objects.get_or_create(
+            if enrollment and current_lesson.id not in outline.progress:
+                LessonProgress.objects.get_or_create(
                     enrollment=enrollment,
                     lesson=current_lesson
                 )
-            
+
             # Extrai o ID do vídeo do YouTube, se for um vídeo do YouTube
             youtube_video_id = None
             if current_lesson.video_url and is_lesson_released:
                 import re
                 from urllib.parse import urlparse, parse_qs
-                
+
                 # Verifica se temos uma URL de vídeo privado configurada
                 if current_lesson.private_video_url:
                     # O vídeo privado tem prioridade sobre o YouTube
@@ -940,7 +796,7 @@ class CourseLearnView(LoginRequiredMixin, DetailView):
                 else:
                     # Pattern para URLs completas do YouTube
                     youtube_regex = r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})'
-                    
+
                     youtube_match = re.match(youtube_regex, current_lesson.video_url)
                     if youtube_match:
                         youtube_video_id = youtube_match.group(6)
@@ -949,7 +805,7 @@ class CourseLearnView(LoginRequiredMixin, DetailView):
                         parsed_url = urlparse(current_lesson.video_url)
                         if 'youtu.be' in parsed_url.netloc:
                             youtube_video_id = parsed_url.path.lstrip('/')
-                        
+
                         # Para URLs do formato youtube.com/watch?v=ID
                         elif 'youtube.com' in parsed_url.netloc:
                             query = parse_qs(parsed_url.query)
@@ -962,17 +818,18 @@ class CourseLearnView(LoginRequiredMixin, DetailView):
                 # Limpar todas as URLs de vídeo no contexto se não estiver liberada
                 context['youtube_video_id'] = None
                 context['private_video_url'] = None
-            
+
             # Determina a aula anterior e a próxima
-            lesson_list = list(lessons)
-            current_index = lesson_list.index(current_lesson)
-            
-            if current_index > 0:
-                context['prev_lesson'] = lesson_list[current_index - 1]
-                
-            if current_index < len(lesson_list) - 1:
-                context['next_lesson'] = lesson_list[current_index + 1]
-            
+            prev_lesson, next_lesson = outline.get_neighbours(current_lesson)
+
+            if prev_lesson:
+                context['prev_lesson'] = prev_lesson
+
+            if next_lesson:
+                context['next_lesson'] = next_lesson
+
+        context['current_lesson'] = current_lesson
+
         return context
 
 
@@ -54,6 +54,7 @@ urlpatterns = [
     
     # APIs de progresso de vídeo
     path('api/video-progress/update/', api.update_video_progress, name='api_update_video_progress'),
+    path('api/video-progress/batch/', api.update_video_progress_batch, name='api_update_video_progress_batch'),
     path('api/video-progress/<int:lesson_id>/', api.get_video_progress, name='api_get_video_progress'),
     path('api/course-progress/<int:course_id>/', api.get_course_video_progress, name='api_course_progress'),
     
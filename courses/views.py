@@ -11,10 +11,11 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
 from django.core.files.base import ContentFile
-import boto3
 import os
 from datetime import datetime
 
+from core.s3 import get_s3_client, media_key
+
 from .models import Course, Lesson, Enrollment, ClassGroup, LessonRelease, Module, ModuleProgress, LessonAttachment
 from .forms import CourseForm, LessonForm, CoursePublishForm, ModuleForm
 
@@ -36,15 +37,10 @@ def upload_attachment_to_s3(uploaded_file):
     filename = f"{filename_base}_{datetime.now().strftime('%Y%m%d%H%M%S')}.{ext}"
     file_path = f"lesson_attachments/{datetime.now().strftime('%Y/%m')}/{filename}"
 
-    # Upload para S3
-    s3_client = boto3.client(
-        's3',
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_S3_REGION_NAME
-    )
+    # Upload para S3 com o cliente compartilhado do processo
+    s3_client = get_s3_client()
 
-    s3_key = f"media-courses/{file_path}"
+    s3_key = media_key(file_path)
 
     # Fazer upload
     uploaded_file.seek(0)  # Garantir que estamos no início do arquivo
@@ -278,6 +274,12 @@ class CourseListView(LoginRequiredMixin, ProfessorOrAdminRequiredMixin, ListView
         # Se é um professor, filtra apenas os cursos dele
         return Course.objects.filter(professor=self.request.user).order_by('-created_at')
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Assina as URLs das imagens de todos os cursos da lista de uma vez
+        Course.prefetch_image_urls(context['courses'])
+        return context
+
 
 class CourseDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
     """
@@ -764,6 +766,7 @@ class ClassGroupDetailView(LoginRequiredMixin, ProfessorClassGroupMixin, DetailV
         
         # Adiciona dados sobre os cursos da turma
         context['courses'] = self.object.courses.all()
+        Course.prefetch_image_urls(context['courses'])
         context['courses_count'] = self.object.courses.count()
         
         # Adiciona dados sobre as liberações de aulas da turma
@@ -7,6 +7,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django.setup()
 
 from invoices.models import Invoice
+from invoices.documents import fetch_document
 from invoices.email_service import EmailService
 
 # Configurar logging
@@ -71,22 +72,21 @@ def debug_invoice_pdf():
     email_service = EmailService()
     
     print(f"   NFE.io API Key: {'✅ Configurada' if email_service.nfeio_api_key else '❌ Não configurada'}")
-    print(f"   NFE.io Company ID: {email_service.nfeio_company_id}")
     print(f"   SendGrid API Key: {'✅ Configurada' if email_service.api_key else '❌ Não configurada'}")
     
     # Testar busca de PDF
     print(f"\n📎 TESTANDO BUSCA DE PDF:")
     
-    # Teste 1: API NFE.io
-    if invoice.external_id and email_service.nfeio_api_key:
+    # Teste 1: API NFE.io (com a empresa da nota)
+    if invoice.external_id:
         print("🔍 Teste 1: Buscar PDF na API NFE.io...")
-        pdf_content = email_service.get_pdf_from_nfeio_api(invoice)
+        pdf_content = fetch_document(invoice, 'pdf')
         if pdf_content:
             print(f"✅ SUCESSO: PDF encontrado na API ({len(pdf_content)} bytes)")
         else:
             print("❌ FALHA: PDF não encontrado na API")
     else:
-        print("⚠️ Teste 1 IGNORADO: External ID ou credenciais não disponíveis")
+        print("⚠️ Teste 1 IGNORADO: External ID não disponível")
     
     # Teste 2: Focus PDF URL
     if invoice.focus_pdf_url:
@@ -116,13 +116,13 @@ def debug_invoice_pdf():
     else:
         print("⚠️ Teste 2 IGNORADO: focus_pdf_url não disponível")
     
-    # Teste 3: Protocolo forçado completo
-    print("🔍 Teste 3: Protocolo forçado completo...")
-    attachment = email_service.force_pdf_attachment(invoice)
+    # Teste 3: Mesmo caminho do envio real (cache de documentos, API e focus_pdf_url)
+    print("🔍 Teste 3: PDF usado no envio do email...")
+    attachment = email_service.resolve_pdf(invoice)
     if attachment:
-        print("🎉 SUCESSO: Anexo criado com protocolo forçado!")
+        print(f"🎉 SUCESSO: PDF seria anexado ({len(attachment)} bytes)")
     else:
-        print("❌ FALHA: Protocolo forçado não funcionou")
+        print("❌ FALHA: PDF não encontrado")
     
     # Resumo final
     print(f"\n📊 RESUMO:")
@@ -134,7 +134,7 @@ def debug_invoice_pdf():
     print(f"   PDF URL: {'✅' if has_pdf_url else '❌'}")
     print(f"   Credenciais: {'✅' if has_credentials else '❌'}")
     
-    can_attach = attachment is not None
+    can_attach = bool(attachment)
     print(f"\n🎯 RESULTADO: {'✅ PDF PODE SER ANEXADO' if can_attach else '❌ PDF NÃO PODE SER ANEXADO'}")
 
 if __name__ == "__main__":
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
-from .models import CompanyConfig, Invoice
+from .models import CompanyConfig, EmailOutbox, Invoice, InvoiceBatchJob, InvoiceDocument, RpsBlock
 
 # Register your models here.
 
@@ -64,3 +64,35 @@ class InvoiceAdmin(admin.ModelAdmin):
     def has_add_permission(self, request):
         # Desabilita a criação de notas fiscais pelo admin
         return False
+
+
+@admin.register(InvoiceBatchJob)
+class InvoiceBatchJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'professor', 'status', 'total', 'succeeded', 'failed', 'skipped', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('professor__email',)
+    readonly_fields = ('created_at', 'started_at', 'finished_at')
+
+
+@admin.register(RpsBlock)
+class RpsBlockAdmin(admin.ModelAdmin):
+    list_display = ('company_config', 'serie', 'first_number', 'last_number', 'used', 'reserved_at', 'released_at')
+    list_filter = ('serie',)
+    search_fields = ('company_config__razao_social', 'company_config__cnpj')
+    readonly_fields = ('reserved_at',)
+
+
+@admin.register(InvoiceDocument)
+class InvoiceDocumentAdmin(admin.ModelAdmin):
+    list_display = ('invoice', 'kind', 'size', 'invoice_status', 'created_at')
+    list_filter = ('kind',)
+    search_fields = ('invoice__external_id', 'sha256')
+    readonly_fields = ('created_at',)
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('invoice', 'recipient_email', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('recipient_email', 'invoice__external_id')
+    readonly_fields = ('created_at', 'locked_at', 'last_attempt_at', 'sent_at')
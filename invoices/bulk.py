@@ -0,0 +1,270 @@
+"""
+Emissão de notas fiscais em lote.
+
+create_invoice_job roda na requisição e é rápido, com um número fixo de
+consultas:
+- uma consulta para achar as vendas que já têm nota;
+- um único UPDATE ... RETURNING que reserva um bloco contíguo de números de
+  RPS na configuração da empresa (invoices/rps.py);
+- um bulk_create com todas as notas, já numeradas.
+
+O envio à NFE.io fica para o comando process_invoice_jobs, que pega os lotes
+na fila com select_for_update(skip_locked=True). As notas são enviadas por um
+pool limitado de threads (INVOICE_BULK_WORKERS), com no máximo
+INVOICE_BULK_RATE requisições por segundo. Os contadores do lote são
+atualizados a cada nota e expostos pelo endpoint de status do lote.
+
+Cada nota é reservada (pending -> processing) antes do envio, então uma nota
+nunca é enviada por dois workers. Lotes em andamento há mais de
+INVOICE_JOB_STALE_AFTER (worker interrompido) voltam para a fila; na nova
+execução só as notas ainda pendentes são enviadas, com os mesmos números de
+RPS. As notas reservadas há mais que isso sem resposta da NFE.io ficam com
+erro, para serem conferidas na NFE.io antes de um novo envio.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import CompanyConfig, Invoice, InvoiceBatchJob
+from .rps import reserve_block
+
+logger = logging.getLogger(__name__)
+
+# Lotes em andamento há mais tempo que isso (worker interrompido) voltam para a fila
+INVOICE_JOB_STALE_AFTER = timedelta(minutes=30)
+
+INTERRUPTED_MESSAGE = (
+    'Envio interrompido (o worker parou durante o envio). Confira na NFE.io se a nota '
+    'foi criada antes de emitir de novo.'
+)
+
+
+class InvoiceJobError(Exception):
+    """O lote não pode ser criado (configuração fiscal incompleta, por exemplo)."""
+
+
+class RateLimiter:
+    """Limita as chamadas feitas por todas as threads a rate por segundo."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def create_invoice_job(professor, sales):
+    """
+    Cria o lote e as notas pendentes das vendas que ainda não têm nota.
+    Levanta InvoiceJobError se o professor não puder emitir notas.
+    """
+    try:
+        company_config = professor.company_config
+    except CompanyConfig.DoesNotExist:
+        raise InvoiceJobError('Configure suas informações fiscais antes de emitir notas fiscais.')
+    if not company_config.enabled:
+        raise InvoiceJobError('A emissão de notas fiscais não está habilitada. Verifique suas configurações fiscais.')
+    if not company_config.is_complete():
+        raise InvoiceJobError('Configure todas as informações fiscais antes de emitir notas fiscais.')
+
+    sales = list(sales)
+    invoiced = set(
+        Invoice.objects.filter(singlesale__in=sales).values_list('singlesale_id', flat=True)
+    )
+    pending = [sale for sale in sales if sale.id not in invoiced]
+
+    with transaction.atomic():
+        job = InvoiceBatchJob.objects.create(
+            professor=professor,
+            total=len(pending),
+            skipped=len(sales) - len(pending),
+        )
+        if pending:
+            # Bloco contíguo de RPS para o lote, já registrado como usado
+            block = reserve_block(company_config, len(pending), used=len(pending))
+            Invoice.objects.bulk_create([
+                Invoice(
+                    singlesale=sale,
+                    batch_job=job,
+                    amount=sale.amount,
+                    customer_name=sale.customer_name,
+                    customer_email=sale.customer_email,
+                    customer_tax_id=sale.customer_cpf,
+                    description=sale.description,
+                    type=sale.invoice_type or 'rps',
+                    status='pending',
+                    rps_serie=block.serie,
+                    rps_numero=block.first_number + offset,
+                    rps_lote=block.lote,
+                )
+                for offset, sale in enumerate(pending)
+            ])
+        else:
+            job.status = 'done'
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'finished_at'])
+
+    if pending and getattr(settings, 'INVOICE_JOBS_INLINE_PROCESSING', False):
+        # Sem worker (desenvolvimento): envia em segundo plano após o commit
+        transaction.on_commit(
+            lambda: threading.Thread(target=_run_inline, args=(job.pk,), daemon=True).start()
+        )
+    return job
+
+
+def _count(job, field):
+    InvoiceBatchJob.objects.filter(pk=job.pk).update(**{field: F(field) + 1})
+
+
+def _emit(service, limiter, job, invoice_id):
+    """Envia uma nota do lote (executado nas threads do pool)."""
+    close_old_connections()
+    try:
+        # Reserva a nota antes do envio: outro worker (lote devolvido à fila) a pula
+        now = timezone.now()
+        claimed = Invoice.objects.filter(pk=invoice_id, status='pending').update(
+            status='processing', emitted_at=now, updated_at=now
+        )
+        if not claimed:
+            return
+        invoice = Invoice.objects.select_related('singlesale__seller__company_config').get(pk=invoice_id)
+        limiter.wait()
+        result = service.emit_invoice(invoice, wait_for_status=False)
+        if result.get('error'):
+            if invoice.status != 'error':
+                invoice.status = 'error'
+                invoice.error_message = result.get('message', 'Erro desconhecido ao enviar para emissão.')
+                invoice.save(update_fields=['status', 'error_message', 'updated_at'])
+            _count(job, 'failed')
+            return
+        _count(job, 'succeeded')
+    except Exception as e:
+        logger.exception(f"Erro ao emitir a nota {invoice_id} do lote {job.pk}")
+        Invoice.objects.filter(pk=invoice_id).update(status='error', error_message=str(e), updated_at=timezone.now())
+        _count(job, 'failed')
+    finally:
+        connection.close()
+
+
+def run_invoice_job(job):
+    """
+    Envia à NFE.io as notas pendentes do lote (já marcado como em andamento)
+    e registra o resultado.
+    """
+    from .services import NFEioService
+
+    try:
+        company_config = CompanyConfig.objects.get(user_id=job.professor_id)
+        service = NFEioService(company_config)
+        if not service.check_connectivity():
+            raise InvoiceJobError('Não foi possível conectar ao serviço NFE.io')
+
+        invoice_ids = list(job.invoices.filter(status='pending').values_list('pk', flat=True))
+        limiter = RateLimiter(getattr(settings, 'INVOICE_BULK_RATE', 5))
+        with ThreadPoolExecutor(max_workers=getattr(settings, 'INVOICE_BULK_WORKERS', 4)) as pool:
+            for invoice_id in invoice_ids:
+                pool.submit(_emit, service, limiter, job, invoice_id)
+    except Exception as e:
+        logger.exception(f"Erro no lote de notas {job.pk}")
+        InvoiceBatchJob.objects.filter(pk=job.pk).update(
+            status='failed', error_message=str(e), finished_at=timezone.now()
+        )
+        return 'failed'
+
+    InvoiceBatchJob.objects.filter(pk=job.pk).update(status='done', finished_at=timezone.now())
+    return 'done'
+
+
+def _run_inline(job_id):
+    try:
+        claimed = InvoiceBatchJob.objects.filter(pk=job_id, status='queued').update(
+            status='running', started_at=timezone.now()
+        )
+        if claimed:
+            run_invoice_job(InvoiceBatchJob.objects.get(pk=job_id))
+    finally:
+        connection.close()
+
+
+def _fail_interrupted(stale_jobs, cutoff):
+    """
+    Notas dos lotes parados reservadas antes de cutoff e ainda sem ID na
+    NFE.io: o envio foi interrompido e pode ter chegado à NFE.io, então não
+    são reenviadas automaticamente.
+    """
+    interrupted = Invoice.objects.filter(
+        Q(external_id__isnull=True) | Q(external_id=''),
+        batch_job__in=stale_jobs, status='processing', emitted_at__lt=cutoff,
+    )
+    for invoice_id, job_id in list(interrupted.values_list('pk', 'batch_job_id')):
+        failed = interrupted.filter(pk=invoice_id).update(
+            status='error', error_message=INTERRUPTED_MESSAGE, updated_at=timezone.now()
+        )
+        if failed:
+            InvoiceBatchJob.objects.filter(pk=job_id).update(failed=F('failed') + 1)
+            logger.warning(f"Envio da nota {invoice_id} do lote {job_id} foi interrompido")
+
+
+def claim_next_job():
+    """
+    Marca como em andamento o próximo lote da fila e o retorna (ou None).
+    Workers em paralelo pulam os lotes já travados.
+    """
+    cutoff = timezone.now() - INVOICE_JOB_STALE_AFTER
+    stale_jobs = InvoiceBatchJob.objects.filter(status='running', started_at__lt=cutoff)
+    _fail_interrupted(stale_jobs, cutoff)
+    requeued = stale_jobs.update(status='queued')
+    if requeued:
+        logger.warning(f"{requeued} lote(s) de notas parados em andamento voltaram para a fila")
+
+    with transaction.atomic():
+        job = (
+            InvoiceBatchJob.objects.select_for_update(skip_locked=True)
+            .filter(status='queued')
+            .order_by('created_at', 'pk')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = 'running'
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+    return job
+
+
+def job_status(job):
+    """Andamento do lote para o endpoint de status."""
+    errors = list(
+        job.invoices.filter(status='error').values('id', 'singlesale_id', 'error_message')[:50]
+    )
+    return {
+        'job_id': job.pk,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'total': job.total,
+        'processed': job.processed,
+        'succeeded': job.succeeded,
+        'failed': job.failed,
+        'skipped': job.skipped,
+        'progress': round(100 * job.processed / job.total) if job.total else 100,
+        'error_message': job.error_message,
+        'errors': errors,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -0,0 +1,242 @@
+"""
+Cache local dos PDFs e XMLs das notas fiscais.
+
+Um documento fiscal emitido não muda; ainda assim a tela de download e o
+envio por email baixavam o PDF da NFE.io a cada acesso. Agora o primeiro
+download é gravado no storage padrão (disco em MEDIA_ROOT ou o MediaStorage
+no S3 quando USE_S3) com nome derivado do conteúdo,
+invoices/<external_id>/<tipo>-<sha256>.<tipo>, e registrado em
+InvoiceDocument. Os acessos seguintes leem do storage.
+
+O documento guarda o status da nota no momento do download: se a nota mudar
+de status (cancelamento, por exemplo, em que a NFE.io gera outro PDF), o
+documento é baixado de novo na próxima leitura.
+
+document_response serve o arquivo com FileResponse, ETag (o próprio hash) e
+suporte a Range, para o navegador retomar ou paginar o PDF sem baixar tudo.
+"""
+import hashlib
+import logging
+import re
+
+import requests
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+
+from .models import InvoiceDocument
+from .status_sync import company_config_for
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'xml': 'application/xml',
+}
+
+# Bytes lidos por vez ao servir um intervalo (Range) do arquivo
+DOCUMENT_CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def is_valid_document(kind, content):
+    """Confere se o conteúdo baixado é mesmo do tipo esperado."""
+    if not content:
+        return False
+    if kind == 'pdf':
+        return content.startswith(b'%PDF')
+    return content.lstrip().startswith(b'<')
+
+
+def document_name(invoice, kind, digest):
+    return f"invoices/{invoice.external_id or invoice.pk}/{kind}-{digest}.{kind}"
+
+
+def store_document(invoice, kind, content):
+    """
+    Grava o conteúdo no storage (se ainda não existir um arquivo com o mesmo
+    hash) e registra o documento da nota. Retorna o InvoiceDocument.
+    """
+    digest = hashlib.sha256(content).hexdigest()
+    name = document_name(invoice, kind, digest)
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(content))
+
+    document, _ = InvoiceDocument.objects.update_or_create(
+        invoice=invoice,
+        kind=kind,
+        defaults={
+            'file': name,
+            'sha256': digest,
+            'size': len(content),
+            'invoice_status': invoice.status,
+        }
+    )
+    return document
+
+
+def fetch_document(invoice, kind, service=None):
+    """Baixa o documento da NFE.io pela API da empresa dona da nota (ou None)."""
+    from .services import NFEioService
+
+    if not invoice.external_id:
+        return None
+    service = service or NFEioService(company_config_for(invoice))
+    try:
+        response = service.http.get(
+            f"v1/companies/{service.company_id}/serviceinvoices/{invoice.external_id}/{kind}"
+        )
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Falha ao baixar o {kind} da nota {invoice.external_id}: {e}")
+        return None
+    if response.status_code != 200:
+        logger.warning(f"NFE.io respondeu {response.status_code} ao baixar o {kind} da nota {invoice.external_id}")
+        return None
+    if not is_valid_document(kind, response.content):
+        logger.warning(f"Conteúdo inválido ao baixar o {kind} da nota {invoice.external_id}")
+        return None
+    return response.content
+
+
+def cached_document(invoice, kind='pdf'):
+    """
+    Documento registrado e ainda válido para o status atual da nota (ou
+    None). Confia no registro, sem consultar o storage; quem abre o arquivo
+    trata a falta dele.
+    """
+    # all() aproveita os documentos já carregados com prefetch_related
+    document = next((d for d in invoice.documents.all() if d.kind == kind), None)
+    if document is None or document.invoice_status != invoice.status:
+        return None
+    return document
+
+
+def get_document(invoice, kind='pdf', service=None):
+    """
+    Documento da nota: do cache ou, na primeira vez (ou se o arquivo sumiu do
+    storage), baixado da NFE.io e guardado. Retorna None se não foi possível
+    obtê-lo.
+    """
+    document = cached_document(invoice, kind)
+    if document is not None:
+        if default_storage.exists(document.file.name):
+            return document
+        logger.warning(f"Arquivo {document.file.name} não encontrado no storage; baixando de novo")
+    content = fetch_document(invoice, kind, service)
+    if content is None:
+        return None
+    return store_document(invoice, kind, content)
+
+
+def read_document(invoice, kind='pdf', fetch=True, service=None):
+    """
+    Conteúdo do documento em bytes (ou None), sem levantar exceções. O
+    arquivo registrado é aberto direto; se ele não estiver no storage, o
+    documento é baixado de novo (com fetch).
+    """
+    try:
+        document = cached_document(invoice, kind)
+        if document is not None:
+            try:
+                with document.file.open('rb') as f:
+                    return f.read()
+            except Exception as e:
+                logger.warning(f"Arquivo {document.file.name} não pôde ser lido do storage: {e}")
+        if not fetch:
+            return None
+        content = fetch_document(invoice, kind, service)
+        if content is None:
+            return None
+        store_document(invoice, kind, content)
+        return content
+    except Exception as e:
+        logger.error(f"Erro ao ler o {kind} da nota {invoice.pk}: {e}")
+        return None
+
+
+def remember_document(invoice, kind, content):
+    """Guarda um documento baixado por outro caminho, sem levantar exceções."""
+    if not is_valid_document(kind, content):
+        return
+    try:
+        store_document(invoice, kind, content)
+    except Exception as e:
+        logger.error(f"Erro ao guardar o {kind} da nota {invoice.pk}: {e}")
+
+
+def _parse_range(header, size):
+    """(início, fim) inclusivos de um Range de intervalo único, ou None."""
+    match = RANGE_RE.match(header.strip())
+    if not match or size == 0:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-N: os últimos N bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def _iter_range(f, start, length):
+    try:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(DOCUMENT_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def document_response(request, document, filename, as_attachment=False):
+    """
+    Resposta HTTP com o arquivo do documento, com ETag e suporte a Range
+    (206 para um intervalo válido, 416 para um intervalo fora do arquivo).
+    """
+    etag = f'"{document.sha256}"'
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        return HttpResponseNotModified()
+
+    content_type = DOCUMENT_CONTENT_TYPES[document.kind]
+    size = document.size
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if range_header and (not if_range or if_range == etag):
+        byte_range = _parse_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _iter_range(document.file.open('rb'), start, end - start + 1),
+            status=206,
+            content_type=content_type
+        )
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        disposition = 'attachment' if as_attachment else 'inline'
+        response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+    else:
+        response = FileResponse(
+            document.file.open('rb'),
+            as_attachment=as_attachment,
+            filename=filename,
+            content_type=content_type
+        )
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
@@ -0,0 +1,172 @@
+"""
+Exportação das notas fiscais de um professor para a contabilidade.
+
+iter_export_zip gera um ZIP com o PDF e o XML de cada nota emitida no
+período e um manifesto.csv com os dados das notas. O arquivo é produzido aos
+pedaços por um gerador (o zipfile escreve em um buffer que é esvaziado a cada
+nota), então nunca fica inteiro na memória e pode ser enviado direto na
+resposta (StreamingHttpResponse) ou gravado em disco pelo comando
+export_invoices.
+
+Os documentos vêm do cache de documentos (invoices/documents.py) e, na
+falta dele, da NFE.io; os baixados entram no cache. Os downloads são feitos
+por um pool limitado de threads (INVOICE_EXPORT_WORKERS), com no máximo o
+dobro disso em andamento, e as notas entram no ZIP na ordem de emissão.
+"""
+import csv
+import io
+import logging
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .documents import fetch_document, read_document, remember_document
+from .models import Invoice
+from .status_sync import COMPANY_CONFIG_RELATIONS, company_config_for
+
+logger = logging.getLogger(__name__)
+
+# Notas com documento fiscal (as canceladas também vão para a contabilidade)
+EXPORT_STATUSES = ('approved', 'cancelled')
+
+EXPORT_KINDS = ('pdf', 'xml')
+
+MANIFEST_HEADER = [
+    'id', 'external_id', 'status', 'emitida_em', 'rps_serie', 'rps_numero', 'rps_lote',
+    'valor', 'cliente', 'cpf_cnpj', 'email', 'descricao', 'arquivo_pdf', 'arquivo_xml',
+]
+
+
+class _ZipBuffer(io.RawIOBase):
+    """Destino não posicionável do zipfile; pop devolve o que foi escrito."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def export_queryset(professor, start, end):
+    """Notas do professor emitidas entre start e end (datas, inclusive)."""
+    return (
+        Invoice.objects.filter(
+            Q(transaction__enrollment__course__professor=professor) | Q(singlesale__seller=professor),
+            status__in=EXPORT_STATUSES,
+            emitted_at__date__gte=start,
+            emitted_at__date__lte=end,
+        )
+        .select_related(*COMPANY_CONFIG_RELATIONS)
+        .prefetch_related('documents')
+        .order_by('emitted_at', 'pk')
+    )
+
+
+def _fetch(invoice, kinds, service):
+    """Baixa da NFE.io os documentos que faltam (executado nas threads do pool)."""
+    return {kind: fetch_document(invoice, kind, service) for kind in kinds}
+
+
+def _resolve(invoice, documents, future):
+    """Completa os documentos com os baixados e guarda esses no cache."""
+    if future is not None:
+        for kind, content in future.result().items():
+            if content is not None:
+                remember_document(invoice, kind, content)
+                documents[kind] = content
+    return invoice, documents
+
+
+def iter_documents(invoices, kinds=EXPORT_KINDS, workers=None):
+    """
+    Gera (nota, {tipo: conteúdo ou None}) na ordem das notas. O cache é lido
+    e gravado nesta thread; só os downloads da NFE.io vão para o pool.
+    """
+    from .services import NFEioService
+
+    workers = workers or getattr(settings, 'INVOICE_EXPORT_WORKERS', 4)
+    services = {}
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for invoice in invoices:
+            documents = {kind: read_document(invoice, kind, fetch=False) for kind in kinds}
+            missing = [kind for kind in kinds if documents[kind] is None]
+            future = None
+            if missing and invoice.external_id:
+                config = company_config_for(invoice)
+                key = config.pk if config else None
+                if key not in services:
+                    services[key] = NFEioService(config)
+                future = pool.submit(_fetch, invoice, missing, services[key])
+            pending.append((invoice, documents, future))
+            if len(pending) >= workers * 2:
+                yield _resolve(*pending.popleft())
+        while pending:
+            yield _resolve(*pending.popleft())
+
+
+def document_path(invoice, kind):
+    number = invoice.rps_numero or invoice.pk
+    return f"{kind}/nota_{number}_{invoice.external_id or invoice.pk}.{kind}"
+
+
+def _manifest_row(invoice, paths):
+    emitted_at = timezone.localtime(invoice.emitted_at) if invoice.emitted_at else None
+    return [
+        invoice.pk,
+        invoice.external_id or '',
+        invoice.get_status_display(),
+        emitted_at.strftime('%d/%m/%Y %H:%M') if emitted_at else '',
+        invoice.rps_serie or '',
+        invoice.rps_numero or '',
+        invoice.rps_lote or '',
+        f"{invoice.amount:.2f}".replace('.', ','),
+        invoice.customer_name or '',
+        invoice.customer_tax_id or '',
+        invoice.customer_email or '',
+        invoice.description or '',
+        paths.get('pdf', ''),
+        paths.get('xml', ''),
+    ]
+
+
+def iter_export_zip(invoices, kinds=EXPORT_KINDS, workers=None):
+    """Gera os bytes do ZIP com os documentos das notas e o manifesto.csv."""
+    buffer = _ZipBuffer()
+    manifest = io.StringIO()
+    writer = csv.writer(manifest, delimiter=';')
+    writer.writerow(MANIFEST_HEADER)
+
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for invoice, documents in iter_documents(invoices, kinds, workers):
+            paths = {}
+            for kind in kinds:
+                content = documents.get(kind)
+                if content is None:
+                    logger.warning(f"{kind} da nota {invoice.pk} não encontrado; fica fora da exportação")
+                    continue
+                paths[kind] = document_path(invoice, kind)
+                archive.writestr(paths[kind], content)
+            writer.writerow(_manifest_row(invoice, paths))
+            yield buffer.pop()
+
+        # utf-8 com BOM para o Excel reconhecer a acentuação
+        archive.writestr('manifesto.csv', manifest.getvalue().encode('utf-8-sig'))
+    yield buffer.pop()
+
+
+def export_filename(start, end):
+    return f"notas_fiscais_{start:%Y%m%d}_{end:%Y%m%d}.zip"
@@ -1,6 +1,7 @@
 from django import forms
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import RegexValidator
+from django.db.models import F
 from django.forms import inlineformset_factory
 from .models import CompanyConfig, MunicipalServiceCode
 
@@ -65,7 +66,7 @@ class CompanyConfigForm(forms.ModelForm):
             'regime_tributario', 'endereco', 'numero', 'complemento', 'bairro',
             'municipio', 'uf', 'cep', 'telefone', 'email', 'city_service_code',
             'nfeio_company_id',
-            'rps_serie', 'rps_numero_atual', 'rps_lote'
+            'rps_serie', 'rps_lote'
         ]
         widgets = {
             'enabled': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
@@ -89,7 +90,6 @@ class CompanyConfigForm(forms.ModelForm):
                 'autocomplete': 'off'
             }),
             'rps_serie': forms.TextInput(attrs={'class': 'form-control', 'placeholder': '1'}),
-            'rps_numero_atual': forms.NumberInput(attrs={'class': 'form-control', 'min': '1'}),
             'rps_lote': forms.NumberInput(attrs={'class': 'form-control', 'min': '1'}),
         }
     
@@ -163,6 +163,29 @@ class CompanyConfigForm(forms.ModelForm):
                     
         return cleaned_data
 
+    def save(self, commit=True):
+        """
+        Salva a configuração sem regravar rps_numero_atual, que só o alocador
+        de RPS (invoices/rps.py) altera: uma cópia antiga do contador faria a
+        numeração voltar. Mudar a série ou o lote incrementa rps_version, o que
+        descarta os blocos de RPS já reservados.
+        """
+        instance = super().save(commit=False)
+        if not commit:
+            return instance
+
+        if instance.pk is None:
+            instance.save()
+        else:
+            instance.save(update_fields=[
+                field.name for field in instance._meta.concrete_fields
+                if not field.primary_key and field.name not in ('rps_numero_atual', 'rps_version')
+            ])
+            if {'rps_serie', 'rps_lote'} & set(self.changed_data):
+                CompanyConfig.objects.filter(pk=instance.pk).update(rps_version=F('rps_version') + 1)
+        self.save_m2m()
+        return instance
+
 class SendEmailForm(forms.Form):
     """Formulário para envio de nota fiscal por email"""
     
@@ -0,0 +1,57 @@
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from core.http import close_sessions
+from invoices.export import export_filename, export_queryset, iter_export_zip
+
+
+class Command(BaseCommand):
+    help = 'Exporta em um ZIP os PDFs, XMLs e o manifesto das notas fiscais de um professor no período'
+
+    def add_arguments(self, parser):
+        parser.add_argument('professor', help='Email ou ID do professor')
+        parser.add_argument(
+            '--start',
+            type=date.fromisoformat,
+            help='Data inicial (AAAA-MM-DD); padrão: início do mês anterior'
+        )
+        parser.add_argument(
+            '--end',
+            type=date.fromisoformat,
+            help='Data final (AAAA-MM-DD); padrão: fim do mês anterior'
+        )
+        parser.add_argument(
+            '--output',
+            help='Arquivo ZIP de saída; padrão: notas_fiscais_<início>_<fim>.zip'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Downloads simultâneos da NFE.io (padrão: INVOICE_EXPORT_WORKERS)'
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        lookup = {'pk': options['professor']} if options['professor'].isdigit() else {'email': options['professor']}
+        try:
+            professor = User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError(f"Professor {options['professor']} não encontrado")
+
+        last_month_end = timezone.localdate().replace(day=1) - timedelta(days=1)
+        start = options['start'] or last_month_end.replace(day=1)
+        end = options['end'] or last_month_end
+        output = options['output'] or export_filename(start, end)
+
+        invoices = export_queryset(professor, start, end)
+        total = invoices.count()
+        try:
+            with open(output, 'wb') as f:
+                for chunk in iter_export_zip(invoices.iterator(chunk_size=100), workers=options['workers']):
+                    f.write(chunk)
+        finally:
+            close_sessions()
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} nota(s) exportada(s) para {output}.'))
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core.http import close_sessions
+from invoices.email_service import EmailService
+from invoices.outbox import OUTBOX_BATCH_SIZE, outbox_stats, process_outbox
+
+
+class Command(BaseCommand):
+    help = 'Envia os emails de notas fiscais da fila (EmailOutbox), com novas tentativas em caso de falha'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=OUTBOX_BATCH_SIZE,
+            help='Mensagens reservadas por rodada'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Envia as mensagens devidas e termina (uso em cron)'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2.0,
+            help='Segundos de espera quando não há mensagens devidas'
+        )
+
+    def handle(self, *args, **options):
+        service = EmailService()
+        # Uma conexão SMTP para todas as rodadas; reconecta sozinha se cair
+        connection = service.get_connection()
+        total_sent = total_failed = 0
+        try:
+            while True:
+                claimed, sent, failed = process_outbox(service, connection, options['batch_size'])
+                if claimed:
+                    total_sent += sent
+                    total_failed += failed
+                    stats = outbox_stats()
+                    self.stdout.write(
+                        f"{sent} enviado(s), {failed} com falha; "
+                        f"na fila: {stats['by_status']['queued']}, "
+                        f"enviados na última hora: {stats['sent_last_hour']}, "
+                        f"erros na última hora: {stats['errors_last_hour']}"
+                    )
+                    continue
+                if options['once']:
+                    break
+                # Fila vazia: libera a conexão em vez de deixá-la ociosa
+                connection.close()
+                time.sleep(options['sleep'])
+        finally:
+            connection.close()
+            close_sessions()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Fila de emails processada: {total_sent} enviado(s), {total_failed} com falha.')
+        )
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core.http import close_sessions
+from invoices.bulk import claim_next_job, run_invoice_job
+from invoices.rps import rps_allocator
+
+
+class Command(BaseCommand):
+    help = 'Envia à NFE.io as notas fiscais dos lotes de emissão na fila (InvoiceBatchJob)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Processa os lotes na fila e termina (uso em cron)'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=5.0,
+            help='Segundos de espera quando não há lotes na fila'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        try:
+            while True:
+                job = claim_next_job()
+                if job is not None:
+                    status = run_invoice_job(job)
+                    total += 1
+                    self.stdout.write(f'Lote #{job.pk}: {status}')
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        finally:
+            # Registra os números de RPS reservados e não usados
+            rps_allocator.release()
+            close_sessions()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Emissão em lote concluída: {total} lote(s).')
+        )
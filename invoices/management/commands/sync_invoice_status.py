@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core.http import close_sessions
+from invoices.status_sync import STATUS_SYNC_BATCH_SIZE, sync_due_invoices
+
+
+class Command(BaseCommand):
+    help = 'Sincroniza com a NFE.io o status das notas fiscais em processamento'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=STATUS_SYNC_BATCH_SIZE,
+            help='Notas consultadas por rodada'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Consulta as notas devidas e termina (uso em cron)'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=10.0,
+            help='Segundos de espera quando não há notas a consultar'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        try:
+            while True:
+                checked, changed = sync_due_invoices(options['batch_size'])
+                total += checked
+                if checked:
+                    self.stdout.write(f'{checked} nota(s) consultada(s), {changed} com status alterado')
+                    if checked == options['batch_size']:
+                        continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        finally:
+            close_sessions()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Status sincronizado: {total} nota(s) consultada(s).')
+        )
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.10 on 2026-10-18 18:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('invoices', '0012_remove_nfeio_api_key_field'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceBatchJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Na fila'), ('running', 'Em andamento'), ('done', 'Concluído'), ('failed', 'Falhou')], default='queued', max_length=10, verbose_name='status')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='notas no lote')),
+                ('succeeded', models.PositiveIntegerField(default=0, verbose_name='enviadas')),
+                ('failed', models.PositiveIntegerField(default=0, verbose_name='com erro')),
+                ('skipped', models.PositiveIntegerField(default=0, help_text='Vendas que já possuíam nota fiscal', verbose_name='ignoradas')),
+                ('error_message', models.TextField(blank=True, default='', verbose_name='mensagem de erro')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='criado em')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='iniciado em')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='concluído em')),
+                ('professor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='invoice_jobs', to=settings.AUTH_USER_MODEL, verbose_name='professor')),
+            ],
+            options={
+                'verbose_name': 'emissão em lote',
+                'verbose_name_plural': 'emissões em lote',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='batch_job',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoices', to='invoices.invoicebatchjob', verbose_name='emissão em lote'),
+        ),
+        migrations.AddIndex(
+            model_name='invoicebatchjob',
+            index=models.Index(fields=['status', 'created_at'], name='invoices_job_queue_idx'),
+        ),
+    ]
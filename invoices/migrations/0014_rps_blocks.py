@@ -0,0 +1,33 @@
+# Generated by Django 4.2.10 on 2026-10-18 18:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0013_invoice_batch_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RpsBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('serie', models.CharField(max_length=5, verbose_name='série RPS')),
+                ('lote', models.PositiveIntegerField(verbose_name='lote RPS')),
+                ('first_number', models.PositiveIntegerField(verbose_name='primeiro número')),
+                ('last_number', models.PositiveIntegerField(verbose_name='último número')),
+                ('used', models.PositiveIntegerField(blank=True, null=True, verbose_name='números usados')),
+                ('reserved_at', models.DateTimeField(auto_now_add=True, verbose_name='reservado em')),
+                ('released_at', models.DateTimeField(blank=True, null=True, verbose_name='liberado em')),
+                ('company_config', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rps_blocks', to='invoices.companyconfig', verbose_name='configuração da empresa')),
+            ],
+            options={
+                'verbose_name': 'bloco de RPS',
+                'verbose_name_plural': 'blocos de RPS',
+                'ordering': ['company_config', 'first_number'],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.10 on 2026-10-18 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0014_rps_blocks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='last_checked',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='status consultado em'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='next_check_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='próxima consulta de status'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['status', 'next_check_at'], name='invoices_status_sync_idx'),
+        ),
+    ]
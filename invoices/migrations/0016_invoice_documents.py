@@ -0,0 +1,35 @@
+# Generated by Django 4.2.10 on 2026-10-18 18:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0015_invoice_status_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('pdf', 'PDF'), ('xml', 'XML')], max_length=3, verbose_name='tipo')),
+                ('file', models.FileField(max_length=255, upload_to='', verbose_name='arquivo')),
+                ('sha256', models.CharField(max_length=64, verbose_name='hash SHA-256')),
+                ('size', models.PositiveIntegerField(verbose_name='tamanho')),
+                ('invoice_status', models.CharField(help_text='Status da nota quando o documento foi baixado', max_length=20, verbose_name='status da nota')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='baixado em')),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='invoices.invoice', verbose_name='nota fiscal')),
+            ],
+            options={
+                'verbose_name': 'documento da nota fiscal',
+                'verbose_name_plural': 'documentos das notas fiscais',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='invoicedocument',
+            constraint=models.UniqueConstraint(fields=('invoice', 'kind'), name='invoices_document_unique'),
+        ),
+    ]
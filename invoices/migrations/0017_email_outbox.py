@@ -0,0 +1,46 @@
+# Generated by Django 4.2.10 on 2026-10-18 19:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0016_invoice_documents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient_email', models.EmailField(max_length=254, verbose_name='destinatário')),
+                ('subject', models.CharField(max_length=255, verbose_name='assunto')),
+                ('text_body', models.TextField(verbose_name='texto')),
+                ('html_body', models.TextField(verbose_name='HTML')),
+                ('attach_pdf', models.BooleanField(default=True, verbose_name='anexar PDF')),
+                ('dedupe_key', models.CharField(help_text='Nota e destinatário; evita enviar o mesmo email duas vezes', max_length=255, verbose_name='chave de deduplicação')),
+                ('status', models.CharField(choices=[('queued', 'Na fila'), ('sending', 'Enviando'), ('sent', 'Enviado'), ('failed', 'Falhou')], default='queued', max_length=10, verbose_name='status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='tentativas')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='próxima tentativa')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='último erro')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='criado em')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='enviando desde')),
+                ('last_attempt_at', models.DateTimeField(blank=True, null=True, verbose_name='última tentativa')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='enviado em')),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='emails', to='invoices.invoice', verbose_name='nota fiscal')),
+            ],
+            options={
+                'verbose_name': 'email na fila',
+                'verbose_name_plural': 'fila de emails',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='invoices_outbox_queue_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='emailoutbox',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'sending'])), fields=('dedupe_key',), name='invoices_outbox_pending_unique'),
+        ),
+    ]
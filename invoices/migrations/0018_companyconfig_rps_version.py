@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-18 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0017_email_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='companyconfig',
+            name='rps_version',
+            field=models.PositiveIntegerField(default=1, help_text='Incrementada quando a série ou o lote mudam; os blocos de RPS reservados antes são descartados', verbose_name='versão da numeração de RPS'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-18 19:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0018_companyconfig_rps_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='last_send_attempt_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='último reenvio (WaitingSend)'),
+        ),
+    ]
@@ -176,6 +176,11 @@ class CompanyConfig(models.Model):
         verbose_name=_('lote de RPS'),
         help_text=_('Número do lote de RPS para envio em lote')
     )
+    rps_version = models.PositiveIntegerField(
+        default=1,
+        verbose_name=_('versão da numeração de RPS'),
+        help_text=_('Incrementada quando a série ou o lote mudam; os blocos de RPS reservados antes são descartados')
+    )
     
     created_at = models.DateTimeField(
         auto_now_add=True,
@@ -406,6 +411,16 @@ class Invoice(models.Model):
         verbose_name=_('lote RPS')
     )
     
+    # Emissão em lote que criou a nota (quando houver)
+    batch_job = models.ForeignKey(
+        'InvoiceBatchJob',
+        on_delete=models.SET_NULL,
+        related_name='invoices',
+        verbose_name=_('emissão em lote'),
+        null=True,
+        blank=True
+    )
+    
     # Campos de resposta e controle
     response_data = models.JSONField(
         blank=True, 
@@ -432,10 +447,235 @@ class Invoice(models.Model):
         verbose_name=_('emitido em')
     )
     
+    # Sincronização do status com a NFE.io (ver invoices/status_sync.py)
+    last_checked = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name=_('status consultado em')
+    )
+    next_check_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name=_('próxima consulta de status')
+    )
+    last_send_attempt_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name=_('último reenvio (WaitingSend)')
+    )
+    
     class Meta:
         verbose_name = _('nota fiscal')
         verbose_name_plural = _('notas fiscais')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_check_at'], name='invoices_status_sync_idx'),
+        ]
     
     def __str__(self):
         return f"NFe #{self.id} - {self.transaction.id if self.transaction else self.singlesale.id} - {self.get_status_display()}"
+
+
+class RpsBlock(models.Model):
+    """
+    Bloco de números de RPS reservado de uma vez na configuração da empresa
+    (ver invoices/rps.py). Todo número entregue pertence a um bloco, então a
+    numeração fiscal pode ser auditada: used registra quantos números do
+    bloco foram usados quando ele foi liberado, e os demais ficam como
+    lacuna. Blocos sem released_at ainda estão em uso (ou o processo que os
+    reservou terminou sem liberá-los).
+    """
+    company_config = models.ForeignKey(
+        CompanyConfig,
+        on_delete=models.CASCADE,
+        related_name='rps_blocks',
+        verbose_name=_('configuração da empresa')
+    )
+    serie = models.CharField(max_length=5, verbose_name=_('série RPS'))
+    lote = models.PositiveIntegerField(verbose_name=_('lote RPS'))
+    first_number = models.PositiveIntegerField(verbose_name=_('primeiro número'))
+    last_number = models.PositiveIntegerField(verbose_name=_('último número'))
+    used = models.PositiveIntegerField(null=True, blank=True, verbose_name=_('números usados'))
+    reserved_at = models.DateTimeField(auto_now_add=True, verbose_name=_('reservado em'))
+    released_at = models.DateTimeField(null=True, blank=True, verbose_name=_('liberado em'))
+
+    class Meta:
+        verbose_name = _('bloco de RPS')
+        verbose_name_plural = _('blocos de RPS')
+        ordering = ['company_config', 'first_number']
+
+    def __str__(self):
+        return f"RPS {self.serie} {self.first_number}-{self.last_number}"
+
+    @property
+    def size(self):
+        return self.last_number - self.first_number + 1
+
+    @property
+    def unused_range(self):
+        """Números reservados e não usados (lacuna), ou None."""
+        if self.used is None or self.used >= self.size:
+            return None
+        return (self.first_number + self.used, self.last_number)
+
+
+class InvoiceBatchJob(models.Model):
+    """
+    Emissão de notas fiscais em lote (vendas avulsas selecionadas pelo
+    professor). As notas são criadas já com os números de RPS reservados e
+    enviadas à NFE.io pelo comando process_invoice_jobs; os contadores
+    registram o andamento.
+    """
+    STATUS_CHOICES = [
+        ('queued', _('Na fila')),
+        ('running', _('Em andamento')),
+        ('done', _('Concluído')),
+        ('failed', _('Falhou')),
+    ]
+
+    professor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='invoice_jobs',
+        verbose_name=_('professor')
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='queued',
+        verbose_name=_('status')
+    )
+    total = models.PositiveIntegerField(default=0, verbose_name=_('notas no lote'))
+    succeeded = models.PositiveIntegerField(default=0, verbose_name=_('enviadas'))
+    failed = models.PositiveIntegerField(default=0, verbose_name=_('com erro'))
+    skipped = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('ignoradas'),
+        help_text=_('Vendas que já possuíam nota fiscal')
+    )
+    error_message = models.TextField(blank=True, default='', verbose_name=_('mensagem de erro'))
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('criado em'))
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name=_('iniciado em'))
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name=_('concluído em'))
+
+    class Meta:
+        verbose_name = _('emissão em lote')
+        verbose_name_plural = _('emissões em lote')
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='invoices_job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"Lote #{self.pk} - {self.professor_id} - {self.get_status_display()}"
+
+    @property
+    def processed(self):
+        return self.succeeded + self.failed
+
+
+class InvoiceDocument(models.Model):
+    """
+    PDF ou XML da nota fiscal guardado no storage padrão (disco local ou o
+    MediaStorage no S3) depois do primeiro download da NFE.io. O nome do
+    arquivo é derivado do external_id e do hash SHA-256 do conteúdo (ver
+    invoices/documents.py).
+    """
+    KIND_CHOICES = [
+        ('pdf', 'PDF'),
+        ('xml', 'XML'),
+    ]
+
+    invoice = models.ForeignKey(
+        Invoice,
+        on_delete=models.CASCADE,
+        related_name='documents',
+        verbose_name=_('nota fiscal')
+    )
+    kind = models.CharField(max_length=3, choices=KIND_CHOICES, verbose_name=_('tipo'))
+    file = models.FileField(max_length=255, verbose_name=_('arquivo'))
+    sha256 = models.CharField(max_length=64, verbose_name=_('hash SHA-256'))
+    size = models.PositiveIntegerField(verbose_name=_('tamanho'))
+    invoice_status = models.CharField(
+        max_length=20,
+        verbose_name=_('status da nota'),
+        help_text=_('Status da nota quando o documento foi baixado')
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('baixado em'))
+
+    class Meta:
+        verbose_name = _('documento da nota fiscal')
+        verbose_name_plural = _('documentos das notas fiscais')
+        constraints = [
+            models.UniqueConstraint(fields=['invoice', 'kind'], name='invoices_document_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} da nota {self.invoice_id}"
+
+
+class EmailOutbox(models.Model):
+    """
+    Email de nota fiscal na fila de envio. A mensagem é gravada já
+    renderizada; o PDF é referenciado pela nota e lido do cache de documentos
+    no envio. O comando process_email_outbox envia as mensagens da fila,
+    com novas tentativas e espera crescente em caso de falha (ver
+    invoices/outbox.py).
+    """
+    STATUS_CHOICES = [
+        ('queued', _('Na fila')),
+        ('sending', _('Enviando')),
+        ('sent', _('Enviado')),
+        ('failed', _('Falhou')),
+    ]
+
+    invoice = models.ForeignKey(
+        Invoice,
+        on_delete=models.CASCADE,
+        related_name='emails',
+        verbose_name=_('nota fiscal')
+    )
+    recipient_email = models.EmailField(verbose_name=_('destinatário'))
+    subject = models.CharField(max_length=255, verbose_name=_('assunto'))
+    text_body = models.TextField(verbose_name=_('texto'))
+    html_body = models.TextField(verbose_name=_('HTML'))
+    attach_pdf = models.BooleanField(default=True, verbose_name=_('anexar PDF'))
+    dedupe_key = models.CharField(
+        max_length=255,
+        verbose_name=_('chave de deduplicação'),
+        help_text=_('Nota e destinatário; evita enviar o mesmo email duas vezes')
+    )
+
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='queued',
+        verbose_name=_('status')
+    )
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_('tentativas'))
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name=_('próxima tentativa'))
+    last_error = models.TextField(blank=True, default='', verbose_name=_('último erro'))
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('criado em'))
+    locked_at = models.DateTimeField(null=True, blank=True, verbose_name=_('enviando desde'))
+    last_attempt_at = models.DateTimeField(null=True, blank=True, verbose_name=_('última tentativa'))
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name=_('enviado em'))
+
+    class Meta:
+        verbose_name = _('email na fila')
+        verbose_name_plural = _('fila de emails')
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='invoices_outbox_queue_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedupe_key'],
+                condition=models.Q(status__in=['queued', 'sending']),
+                name='invoices_outbox_pending_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Nota {self.invoice_id} para {self.recipient_email} ({self.get_status_display()})"
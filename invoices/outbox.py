@@ -0,0 +1,282 @@
+"""
+Fila de envio dos emails de notas fiscais.
+
+As views não enviam mais o email durante a requisição: enqueue_invoice_email
+renderiza a mensagem, grava em EmailOutbox e responde em seguida, então o
+tempo de resposta não depende do servidor SMTP nem do download do PDF.
+
+O comando process_email_outbox pega as mensagens devidas com
+select_for_update(skip_locked=True) e envia pelo mesmo
+EmailService.send_invoice_emails do envio direto, por uma conexão SMTP
+mantida aberta entre as rodadas (SMTPConnection). O PDF de cada nota é lido
+uma vez por rodada do cache de documentos. A reserva (locked_at) de cada
+mensagem é renovada logo antes do envio dela, então uma rodada lenta não
+deixa as últimas mensagens do lote parecerem abandonadas; uma mensagem
+abandonada (worker interrompido) volta para a fila contando como tentativa.
+Em caso de falha a mensagem volta para a fila com espera crescente
+(EMAIL_OUTBOX_RETRY_DELAY segundos, dobrando a cada tentativa) até
+EMAIL_OUTBOX_MAX_ATTEMPTS; recusas definitivas do servidor (códigos 5xx) não
+são repetidas.
+
+A mesma nota para o mesmo destinatário não entra duas vezes na fila enquanto
+a primeira não foi enviada (restrição única no banco), nem é reenviada
+dentro de EMAIL_OUTBOX_DEDUP_WINDOW segundos após o envio.
+
+outbox_stats resume a fila (mensagens por status, vazão e erros na última
+hora, tempo até o envio) para o endpoint de métricas e o comando.
+"""
+import logging
+import smtplib
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection as db_connection, transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Min, Q
+from django.utils import timezone
+
+from .email_service import EmailService
+from .models import EmailOutbox
+from .status_sync import COMPANY_CONFIG_RELATIONS
+
+logger = logging.getLogger(__name__)
+
+# Mensagens reservadas por rodada
+OUTBOX_BATCH_SIZE = 50
+
+# Mensagens reservadas há mais tempo que isso sem envio (worker interrompido) voltam para a fila
+OUTBOX_STALE_AFTER = timedelta(minutes=10)
+
+# Espera máxima entre tentativas
+OUTBOX_MAX_RETRY_DELAY = timedelta(hours=1)
+
+PENDING_STATUSES = ('queued', 'sending')
+
+
+def dedupe_key(invoice, recipient_email):
+    return f"invoice:{invoice.pk}:{recipient_email.strip().lower()}"
+
+
+def enqueue_invoice_email(invoice, recipient_email, custom_message="", service=None):
+    """
+    Põe o email da nota na fila. Retorna (mensagem, criada); se o mesmo
+    email já estiver na fila ou tiver sido enviado há pouco, retorna a
+    mensagem existente e False.
+    """
+    key = dedupe_key(invoice, recipient_email)
+    window = timedelta(seconds=getattr(settings, 'EMAIL_OUTBOX_DEDUP_WINDOW', 600))
+    existing = (
+        EmailOutbox.objects.filter(dedupe_key=key)
+        .filter(Q(status__in=PENDING_STATUSES) | Q(status='sent', sent_at__gte=timezone.now() - window))
+        .order_by('-created_at')
+        .first()
+    )
+    if existing is not None:
+        return existing, False
+
+    service = service or EmailService()
+    content = service.render_invoice_email(invoice, recipient_email, custom_message)
+    try:
+        with transaction.atomic():
+            message = EmailOutbox.objects.create(
+                invoice=invoice,
+                recipient_email=recipient_email,
+                subject=content['subject'],
+                text_body=content['text_content'],
+                html_body=content['html_content'],
+                dedupe_key=key,
+            )
+    except IntegrityError:
+        # Outra requisição pôs o mesmo email na fila ao mesmo tempo
+        existing = EmailOutbox.objects.filter(dedupe_key=key, status__in=PENDING_STATUSES).first()
+        if existing is None:
+            raise
+        return existing, False
+
+    if getattr(settings, 'EMAIL_OUTBOX_INLINE_PROCESSING', False):
+        # Sem worker (desenvolvimento): envia em segundo plano após o commit
+        transaction.on_commit(lambda: threading.Thread(target=_process_inline, daemon=True).start())
+    return message, True
+
+
+def enqueue_result(message, created):
+    """Resposta das views para um email posto na fila."""
+    if created:
+        text = f'Email para {message.recipient_email} na fila de envio.'
+    elif message.status == 'sent':
+        text = f'Este email já foi enviado para {message.recipient_email} há poucos minutos.'
+    else:
+        text = f'Este email já está na fila de envio para {message.recipient_email}.'
+    return {
+        'success': True,
+        'message': text,
+        'outbox_id': message.pk,
+        'status': message.status,
+    }
+
+
+def requeue_stale(now):
+    """
+    Devolve à fila as mensagens abandonadas em envio, contando a tentativa
+    interrompida; as que chegaram ao limite de tentativas falham de vez.
+    """
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    stale = EmailOutbox.objects.filter(status='sending', locked_at__lt=now - OUTBOX_STALE_AFTER)
+    error = 'Envio interrompido (worker parou antes de concluir)'
+    failed = stale.filter(attempts__gte=max_attempts - 1).update(
+        status='failed', attempts=F('attempts') + 1, last_attempt_at=F('locked_at'), last_error=error
+    )
+    requeued = stale.update(
+        status='queued', attempts=F('attempts') + 1, last_attempt_at=F('locked_at'), last_error=error,
+        next_attempt_at=now
+    )
+    if failed or requeued:
+        logger.warning(f"Emails abandonados em envio: {requeued} de volta na fila, {failed} falharam de vez")
+
+
+def claim_batch(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Marca como em envio as próximas mensagens devidas e as retorna.
+    Workers em paralelo pulam as mensagens já travadas.
+    """
+    now = timezone.now()
+    requeue_stale(now)
+
+    with transaction.atomic():
+        messages = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('invoice', *(f'invoice__{relation}' for relation in COMPANY_CONFIG_RELATIONS))
+            .filter(status='queued', next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'pk')[:batch_size]
+        )
+        EmailOutbox.objects.filter(pk__in=[message.pk for message in messages]).update(
+            status='sending', locked_at=now
+        )
+    for message in messages:
+        message.status = 'sending'
+        message.locked_at = now
+    return messages
+
+
+def renew_lease(message):
+    """
+    Renova a reserva da mensagem logo antes de enviá-la. Retorna False se
+    ela não é mais deste worker (foi dada como abandonada e devolvida à fila).
+    """
+    now = timezone.now()
+    renewed = EmailOutbox.objects.filter(
+        pk=message.pk, status='sending', locked_at=message.locked_at
+    ).update(locked_at=now)
+    if not renewed:
+        logger.warning(f"Email {message.pk} não está mais reservado por este worker; envio pulado")
+        return False
+    message.locked_at = now
+    return True
+
+
+def retry_delay(attempts):
+    """Espera antes da próxima tentativa, dobrando a cada falha."""
+    base = getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', 30)
+    return min(timedelta(seconds=base * 2 ** (attempts - 1)), OUTBOX_MAX_RETRY_DELAY)
+
+
+def is_permanent_error(error):
+    """Recusas definitivas do servidor SMTP (códigos 5xx)."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, (smtplib.SMTPSenderRefused, smtplib.SMTPDataError)):
+        return error.smtp_code >= 500
+    return False
+
+
+def _record_failure(message, error, now):
+    message.attempts += 1
+    message.last_attempt_at = now
+    message.last_error = str(error)[:1000]
+    if is_permanent_error(error) or message.attempts >= getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5):
+        message.status = 'failed'
+        logger.error(f"Email {message.pk} para {message.recipient_email} falhou de vez: {error}")
+    else:
+        message.status = 'queued'
+        message.next_attempt_at = now + retry_delay(message.attempts)
+        logger.warning(f"Email {message.pk} para {message.recipient_email} falhou ({error}); nova tentativa às {timezone.localtime(message.next_attempt_at):%H:%M:%S}")
+    message.save(update_fields=['status', 'attempts', 'last_attempt_at', 'last_error', 'next_attempt_at'])
+
+
+def send_messages(messages, service, connection):
+    """
+    Envia as mensagens reservadas pela conexão informada, renovando a
+    reserva de cada uma antes do envio. Retorna (enviadas, falhas).
+    """
+    results = service.send_invoice_emails(messages, connection=connection, before_send=renew_lease)
+    sent = failed = 0
+    for message, result in zip(messages, results):
+        if result.get('skipped'):
+            continue
+        now = message.locked_at
+        if result['error'] is not None:
+            failed += 1
+            _record_failure(message, result['error'], now)
+            continue
+
+        sent += 1
+        message.status = 'sent'
+        message.attempts += 1
+        message.last_attempt_at = now
+        message.sent_at = timezone.now()
+        message.last_error = ''
+        message.save(update_fields=['status', 'attempts', 'last_attempt_at', 'sent_at', 'last_error'])
+    return sent, failed
+
+
+def process_outbox(service, connection, batch_size=OUTBOX_BATCH_SIZE):
+    """Uma rodada de envio. Retorna (reservadas, enviadas, falhas)."""
+    messages = claim_batch(batch_size)
+    if not messages:
+        return 0, 0, 0
+    sent, failed = send_messages(messages, service, connection)
+    return len(messages), sent, failed
+
+
+def _process_inline():
+    service = EmailService()
+    connection = service.get_connection()
+    try:
+        while process_outbox(service, connection)[0]:
+            pass
+    except Exception:
+        logger.exception("Erro ao enviar os emails da fila")
+    finally:
+        connection.close()
+        db_connection.close()
+
+
+def outbox_stats(now=None):
+    """Métricas da fila: mensagens por status, vazão e erros na última hora."""
+    now = now or timezone.now()
+    hour_ago = now - timedelta(hours=1)
+    by_status = dict(
+        EmailOutbox.objects.order_by().values_list('status').annotate(total=Count('pk'))
+    )
+    totals = EmailOutbox.objects.aggregate(
+        sent_last_hour=Count('pk', filter=Q(status='sent', sent_at__gte=hour_ago)),
+        errors_last_hour=Count('pk', filter=Q(last_attempt_at__gte=hour_ago) & ~Q(last_error='')),
+        failed_last_hour=Count('pk', filter=Q(status='failed', last_attempt_at__gte=hour_ago)),
+        retrying=Count('pk', filter=Q(status='queued', attempts__gt=0)),
+        oldest_queued=Min('created_at', filter=Q(status='queued')),
+        avg_delivery=Avg(
+            ExpressionWrapper(F('sent_at') - F('created_at'), output_field=DurationField()),
+            filter=Q(status='sent', sent_at__gte=hour_ago)
+        ),
+    )
+    oldest_queued = totals['oldest_queued']
+    avg_delivery = totals['avg_delivery']
+    return {
+        'by_status': {status: by_status.get(status, 0) for status, _ in EmailOutbox.STATUS_CHOICES},
+        'sent_last_hour': totals['sent_last_hour'],
+        'errors_last_hour': totals['errors_last_hour'],
+        'failed_last_hour': totals['failed_last_hour'],
+        'retrying': totals['retrying'],
+        'oldest_queued_seconds': round((now - oldest_queued).total_seconds()) if oldest_queued else None,
+        'avg_delivery_seconds': round(avg_delivery.total_seconds(), 1) if avg_delivery else None,
+    }
@@ -0,0 +1,140 @@
+"""
+Reserva de números de RPS (Recibo Provisório de Serviço).
+
+Em vez de travar a configuração da empresa a cada nota, cada processo
+reserva um bloco de RPS_BLOCK_SIZE números com um único
+UPDATE ... RETURNING em invoices_companyconfig, que termina em seguida, e
+entrega os números do bloco a partir da memória. O registro da empresa só é
+tocado uma vez por bloco.
+
+Cada bloco é gravado em RpsBlock. Ao ser esgotado ou liberado (fim do
+processo ou do comando de emissão), o bloco registra quantos números foram
+usados; os demais ficam como lacuna auditável na numeração.
+
+Dentro de uma transação já aberta (emissão feita dentro de atomic), o número
+é reservado na própria transação e não fica em memória: se a transação for
+desfeita, a reserva também é.
+
+Cada bloco guarda a rps_version da empresa no momento da reserva. Mudar a
+série ou o lote incrementa a versão, e o alocador confere a versão a cada
+número entregue: um bloco de versão anterior é liberado e outro é reservado
+com os valores novos.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CompanyConfig, RpsBlock
+
+logger = logging.getLogger(__name__)
+
+
+def _increment(company_config_id, count, using):
+    """
+    Soma count ao próximo número de RPS e retorna (novo valor, série, lote,
+    versão), em um único comando quando o banco suporta RETURNING.
+    """
+    connection = connections[using]
+    if connection.vendor in ('postgresql', 'sqlite'):
+        table = connection.ops.quote_name(CompanyConfig._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET rps_numero_atual = rps_numero_atual + %s WHERE id = %s '
+                'RETURNING rps_numero_atual, rps_serie, rps_lote, rps_version',
+                [count, company_config_id]
+            )
+            row = cursor.fetchone()
+        if row is None:
+            raise CompanyConfig.DoesNotExist(f'Configuração {company_config_id} não encontrada')
+        return row
+
+    queryset = CompanyConfig.objects.using(using).filter(pk=company_config_id)
+    queryset.update(rps_numero_atual=F('rps_numero_atual') + count)
+    return queryset.values_list('rps_numero_atual', 'rps_serie', 'rps_lote', 'rps_version').get()
+
+
+def reserve_block(company_config, count, used=None):
+    """
+    Reserva count números consecutivos e grava o bloco. Com used=None o
+    bloco fica aberto (em uso pelo alocador); senão já é registrado como
+    liberado com used números usados. O bloco retornado leva em rps_version
+    a versão da numeração da empresa.
+    """
+    using = router.db_for_write(CompanyConfig)
+    with transaction.atomic(using=using):
+        next_number, serie, lote, version = _increment(company_config.pk, count, using)
+        block = RpsBlock.objects.using(using).create(
+            company_config_id=company_config.pk,
+            serie=serie,
+            lote=lote,
+            first_number=next_number - count,
+            last_number=next_number - 1,
+            used=used,
+            released_at=timezone.now() if used is not None else None,
+        )
+    block.rps_version = version
+    return block
+
+
+class RpsAllocator:
+    """
+    Entrega números de RPS a partir de blocos reservados em memória, um
+    bloco aberto por empresa. Seguro para várias threads do mesmo processo.
+    """
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._blocks = {}
+
+    def _size(self):
+        return self.block_size or getattr(settings, 'RPS_BLOCK_SIZE', 20)
+
+    def allocate(self, company_config):
+        """Retorna (série, lote, número) do próximo RPS da empresa."""
+        using = router.db_for_write(CompanyConfig)
+        if connections[using].in_atomic_block:
+            block = reserve_block(company_config, 1, used=1)
+            return block.serie, block.lote, block.first_number
+
+        # Série ou lote alterados desde a reserva invalidam o bloco em memória
+        version = (
+            CompanyConfig.objects.using(using).filter(pk=company_config.pk)
+            .values_list('rps_version', flat=True).first()
+        )
+        with self._lock:
+            current = self._blocks.get(company_config.pk)
+            if (current is None or current[1] > current[0].last_number
+                    or (version is not None and current[0].rps_version < version)):
+                if current is not None:
+                    self._close(*current)
+                block = reserve_block(company_config, self._size())
+                current = self._blocks[company_config.pk] = [block, block.first_number]
+            block, number = current
+            current[1] += 1
+        return block.serie, block.lote, number
+
+    def _close(self, block, next_number):
+        RpsBlock.objects.filter(pk=block.pk).update(
+            used=next_number - block.first_number, released_at=timezone.now()
+        )
+
+    def release(self):
+        """Libera os blocos abertos, registrando os números não usados."""
+        with self._lock:
+            blocks, self._blocks = list(self._blocks.values()), {}
+            for block, next_number in blocks:
+                try:
+                    self._close(block, next_number)
+                except Exception as e:
+                    logger.error(f"Erro ao liberar o bloco de RPS {block.pk}: {e}")
+
+
+# Alocador do processo (web, worker ou comando)
+rps_allocator = RpsAllocator()
+atexit.register(rps_allocator.release)
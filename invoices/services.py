@@ -11,8 +11,10 @@ from .models import Invoice, CompanyConfig
 from datetime import datetime
 import uuid
 import time
-from django.db.models import F
-from django.db import transaction
+
+from core.http import GatewayClient, IDEMPOTENT_METHODS
+from .rps import rps_allocator
+from .status_sync import apply_remote_status
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +31,7 @@ class NFEioService:
     Cada instância é específica para uma configuração de empresa/professor
     """
     
-    def __init__(self, company_config=None):
+    def __init__(self, company_config=None, http=None):
         # API Key é sempre global (do sistema)
         self.api_key = settings.NFEIO_API_KEY
         
@@ -60,6 +62,9 @@ class NFEioService:
             'Content-Type': 'application/json'
         }
         
+        # Cliente HTTP com conexões reaproveitadas, timeout e retry (ver core/http.py)
+        self.http = http or GatewayClient(self.base_url, headers=self.headers)
+        
         logger.info(f"NFEioService inicializado: company_id={self.company_id}, ambiente={self.environment}, base_url={self.base_url}, offline_mode={self.offline_mode}")
 
     def validate_company_config(self, company_config):
@@ -143,7 +148,7 @@ class NFEioService:
                 print(json.dumps(data, indent=2, ensure_ascii=False))
             
             print(f"\nDEBUG - Enviando requisição {method} para {url}")
-            response = requests.request(method, url, headers=self.headers, json=data)
+            response = self.http.request(method, url, json=data)
             
             # Log da resposta
             print(f"\nDEBUG - Resposta da API:")
@@ -158,8 +163,8 @@ class NFEioService:
                 print(f"Erro ao decodificar JSON: {str(e)}")
                 print(f"Resposta bruta: {response.text}")
             
-            # Se houver erro 5xx, tentar novamente
-            if response.status_code >= 500 and retry_count < self.max_retries:
+            # Se houver erro 5xx, tentar novamente (GET/PUT/DELETE já são repetidos pelo cliente HTTP)
+            if response.status_code >= 500 and retry_count < self.max_retries and method.upper() not in IDEMPOTENT_METHODS:
                 print(f"DEBUG - Erro {response.status_code} na requisição. Tentativa {retry_count + 1} de {self.max_retries}")
                 time.sleep(self.retry_delay)
                 return self._make_request(method, endpoint, data, retry_count + 1)
@@ -190,9 +195,11 @@ class NFEioService:
             print(f"DEBUG - {error_msg}")
             return {"error": True, "message": error_msg}
 
-    def emit_invoice(self, invoice):
+    def emit_invoice(self, invoice, wait_for_status=True):
         """
-        Emite uma nota fiscal de serviço usando a API NFE.io
+        Emite uma nota fiscal de serviço usando a API NFE.io.
+        Com wait_for_status=False (emissão em lote) a nota não espera a
+        verificação do status inicial; o status é sincronizado depois.
         """
         print(f"\nDEBUG - Iniciando emissão de nota fiscal ID: {invoice.id}")
         
@@ -336,6 +343,9 @@ class NFEioService:
         print("DEBUG - Atualizando nota com resposta...")
         self._update_invoice_with_response(invoice, response)
         
+        if not wait_for_status:
+            return response
+        
         # 8. Verificar status inicial
         print("DEBUG - Verificando status inicial...")
         time.sleep(5)
@@ -586,9 +596,11 @@ class NFEioService:
         # Usar código da cidade do estado ou São Paulo como fallback
         return city_codes.get(state.upper(), '3550308')
 
-    def _update_invoice_with_response(self, invoice, response):
+    def _update_invoice_with_response(self, invoice, response, resend=False):
         """
-        Atualiza o objeto Invoice com os dados da resposta da API
+        Atualiza o objeto Invoice com os dados da resposta da API. No reenvio
+        (resend) a data de emissão é mantida: ela conta a idade da nota para a
+        sincronização de status e filtra a exportação.
         """
         print(f"\nDEBUG - Atualizando invoice {invoice.id} com resposta:")
         print(json.dumps(response, indent=2, ensure_ascii=False))
@@ -651,7 +663,8 @@ class NFEioService:
             invoice.focus_xml_url = response['xml'].get('url')
             print(f"DEBUG - URL do XML: {invoice.focus_xml_url}")
             
-        invoice.emitted_at = timezone.now()
+        if not resend or not invoice.emitted_at:
+            invoice.emitted_at = timezone.now()
         invoice.save()
         
         print(f"DEBUG - Invoice atualizada:")
@@ -721,14 +734,6 @@ class NFEioService:
             }
         
         try:
-            # Verificar conectividade antes de fazer a requisição
-            if not self.check_connectivity():
-                return {
-                    'success': False,
-                    'status': 'error',
-                    'message': 'Não foi possível conectar ao serviço NFE.io. Verifique sua conexão com a internet.'
-                }
-            
             # Se não tiver ID externo, não há como verificar
             if not invoice.external_id:
                 return {
@@ -740,8 +745,16 @@ class NFEioService:
             # Montar URL para consulta
             url = f"{self.base_url}/v1/companies/{self.company_id}/serviceinvoices/{invoice.external_id}"
             
-            # Fazer requisição para a API
-            response = requests.get(url, headers=self.headers)
+            # Fazer requisição para a API (falhas de conexão não alteram a nota)
+            try:
+                response = self.http.get(url)
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Falha de conexão ao consultar a nota {invoice.id}: {str(e)}")
+                return {
+                    'success': False,
+                    'status': 'error',
+                    'message': 'Não foi possível conectar ao serviço NFE.io. Verifique sua conexão com a internet.'
+                }
             
             # Log da resposta
             logger.info(f"Resposta da API NFE.io para nota {invoice.id}:")
@@ -755,34 +768,11 @@ class NFEioService:
             if response.status_code == 200:
                 data = response.json()
                 
-                # Mapear status da API para status interno
-                status_mapping = {
-                    'Issued': 'approved',
-                    'Authorized': 'approved',
-                    'Cancelled': 'cancelled',
-                    'Processing': 'processing',
-                    'Pending': 'processing',
-                    'Error': 'error',
-                    'Draft': 'pending'
-                }
-                
-                api_status = data.get('status', 'Unknown')
-                internal_status = status_mapping.get(api_status, 'error')
-                
-                # Atualizar o status da nota
-                invoice.status = internal_status
-                invoice.external_status = api_status
-                invoice.external_message = data.get('flowStatus', '')  # flowStatus é uma string
-                invoice.last_checked = timezone.now()
+                # Mapear status, URLs e próxima consulta, gravando uma única vez
+                apply_remote_status(invoice, data)
                 invoice.save()
-                
-                # Se a nota foi aprovada, atualizar URLs do PDF e XML
-                if internal_status == 'approved':
-                    if 'pdf' in data and data['pdf'] is not None:
-                        invoice.focus_pdf_url = data['pdf'].get('url')
-                    if 'xml' in data and data['xml'] is not None:
-                        invoice.focus_xml_url = data['xml'].get('url')
-                    invoice.save()
+                internal_status = invoice.status
+                api_status = data.get('status', 'Unknown')
                 
                 return {
                     'success': True,
@@ -804,6 +794,7 @@ class NFEioService:
                 invoice.status = 'error'
                 invoice.error_message = error_message
                 invoice.last_checked = timezone.now()
+                invoice.next_check_at = None
                 invoice.save()
                 
                 return {
@@ -840,36 +831,16 @@ class NFEioService:
             return
         
         try:
-            # Obter configuração do professor
-            company_config = professor.company_config
-            
-            # Definir série RPS
-            rps_serie = company_config.rps_serie
-            
-            # Gerar próximo número RPS
-            with transaction.atomic():
-                # Recarregar com lock de tabela para evitar condição de corrida
-                company_config = CompanyConfig.objects.select_for_update().get(id=company_config.id)
-                
-                # Obter próximo número
-                rps_numero = company_config.rps_numero_atual
-                
-                # Incrementar número para próxima nota
-                company_config.rps_numero_atual = F('rps_numero_atual') + 1
-                company_config.save()
-                
-                # Recarregar para confirmar novos valores
-                company_config.refresh_from_db()
-                
-                print(f"DEBUG - Número RPS atualizado: {rps_numero} -> {company_config.rps_numero_atual}")
+            # Próximo número do bloco de RPS do processo (ver invoices/rps.py)
+            rps_serie, rps_lote, rps_numero = rps_allocator.allocate(professor.company_config)
             
             # Atualizar invoice com RPS
             invoice.rps_serie = rps_serie
             invoice.rps_numero = rps_numero
-            invoice.rps_lote = company_config.rps_lote
+            invoice.rps_lote = rps_lote
             invoice.save()
             
-            print(f"DEBUG - RPS gerado com sucesso: Série {rps_serie}, Número {rps_numero}, Lote {company_config.rps_lote}")
+            print(f"DEBUG - RPS gerado com sucesso: Série {rps_serie}, Número {rps_numero}, Lote {rps_lote}")
             
         except Exception as e:
             print(f"DEBUG - Erro ao gerar RPS: {str(e)}")
@@ -1035,13 +1006,14 @@ class NFEioService:
         endpoint = f"v1/companies/{self.company_id}/serviceinvoices/{invoice.external_id}/send"
         
         # Fazer requisição POST sem payload
+        invoice.last_send_attempt_at = timezone.now()
         response = self._make_request('POST', endpoint)
         
         # Processar resposta
         if not response.get('error'):
             print(f"DEBUG - Nota fiscal enviada com sucesso. Resposta: {response}")
             # Atualizar nota com resposta
-            self._update_invoice_with_response(invoice, response)
+            self._update_invoice_with_response(invoice, response, resend=True)
             return response
         else:
             error_msg = response.get('message', 'Erro desconhecido ao enviar nota fiscal')
@@ -1072,8 +1044,13 @@ class NFEioService:
                 'invoices': []
             }
             
+            # Limita o ritmo das requisições para não sobrecarregar a API
+            from .bulk import RateLimiter
+            limiter = RateLimiter(getattr(settings, 'INVOICE_BULK_RATE', 5))
+            
             for invoice in waiting_invoices:
                 logger.info(f"Tentando enviar nota fiscal {invoice.id} (external_id: {invoice.external_id})")
+                limiter.wait()
                 
                 # Tentar enviar a nota
                 response = self.send_invoice(invoice)
@@ -1095,8 +1072,6 @@ class NFEioService:
                         'error_message': response.get('message')
                     })
                 
-                # Aguardar um pouco entre as requisições para não sobrecarregar a API
-                time.sleep(1)
             
             logger.info(f"Resultados do reenvio de notas: {results['success']} sucessos, {results['error']} erros")
             return results
@@ -0,0 +1,314 @@
+"""
+Sincronização do status das notas fiscais com a NFE.io.
+
+O comando sync_invoice_status roda continuamente e consulta só as notas em
+processamento cuja próxima consulta (next_check_at) já venceu. O intervalo
+entre consultas cresce com a idade da nota (STATUS_SYNC_SCHEDULE): notas
+recém-emitidas são consultadas a cada 30 segundos, notas paradas há horas
+bem menos.
+
+As notas devidas são agrupadas por empresa. Com muitas notas da mesma
+empresa, a listagem de notas da NFE.io (paginada) traz várias de uma vez; as
+que não aparecem na listagem são consultadas uma a uma, pela mesma sessão
+HTTP (core.http). Só as notas com status novo são gravadas, cada uma com um
+update condicionado ao status lido antes da consulta, para não desfazer um
+cancelamento ou envio feito enquanto ela durava; as demais só têm a próxima
+consulta reagendada, com um update por horário.
+
+Notas paradas em WaitingSend são reenviadas no máximo uma vez por intervalo
+de consulta (last_send_attempt_at), sem mudar a data de emissão.
+
+As telas leem o status do banco e só disparam uma consulta quando a
+próxima consulta da nota já venceu (ver sync_if_due).
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Invoice
+
+logger = logging.getLogger(__name__)
+
+# Notas devidas consultadas por rodada
+STATUS_SYNC_BATCH_SIZE = 200
+
+# A partir de quantas notas devidas da mesma empresa vale usar a listagem
+STATUS_SYNC_LIST_THRESHOLD = 5
+
+# Notas por página e páginas lidas da listagem da NFE.io
+STATUS_SYNC_PAGE_SIZE = 100
+STATUS_SYNC_MAX_PAGES = 5
+
+# (idade máxima da nota, intervalo entre consultas)
+STATUS_SYNC_SCHEDULE = (
+    (timedelta(minutes=5), timedelta(seconds=30)),
+    (timedelta(hours=1), timedelta(minutes=2)),
+    (timedelta(days=1), timedelta(minutes=15)),
+)
+STATUS_SYNC_MAX_INTERVAL = timedelta(hours=2)
+
+# Status da NFE.io (status ou flowStatus) para o status interno
+STATUS_MAPPING = {
+    'Issued': 'approved',
+    'Authorized': 'approved',
+    'Processing': 'processing',
+    'Pending': 'processing',
+    'Error': 'error',
+    'Draft': 'pending',
+    'Cancelled': 'cancelled',
+    'WaitingCalculateTaxes': 'processing',
+    'WaitingSend': 'processing',
+    'WaitingAuthorize': 'processing',
+    'WaitingCancel': 'processing',
+    'Rejected': 'error',
+}
+
+SYNC_FIELDS = [
+    'status', 'focus_status', 'focus_pdf_url', 'focus_xml_url', 'error_message',
+    'emitted_at', 'last_checked', 'next_check_at', 'updated_at',
+]
+
+COMPANY_CONFIG_RELATIONS = (
+    'transaction__enrollment__course__professor__company_config',
+    'singlesale__seller__company_config',
+)
+
+
+def check_interval(invoice, now):
+    """Intervalo até a próxima consulta, crescente com a idade da nota."""
+    age = now - (invoice.emitted_at or invoice.created_at or now)
+    for max_age, interval in STATUS_SYNC_SCHEDULE:
+        if age < max_age:
+            return interval
+    return STATUS_SYNC_MAX_INTERVAL
+
+
+def apply_remote_status(invoice, data, now=None):
+    """
+    Aplica à nota (sem salvar) os dados retornados pela NFE.io e agenda a
+    próxima consulta. Retorna True se o status mudou.
+    """
+    now = now or timezone.now()
+    api_status = data.get('status') or ''
+    flow_status = data.get('flowStatus') or ''
+    status = STATUS_MAPPING.get(api_status) or STATUS_MAPPING.get(flow_status) or 'error'
+
+    changed = status != invoice.status or flow_status != (invoice.focus_status or '')
+    invoice.status = status
+    invoice.focus_status = flow_status
+    if status == 'approved':
+        if data.get('pdf'):
+            invoice.focus_pdf_url = data['pdf'].get('url')
+        if data.get('xml'):
+            invoice.focus_xml_url = data['xml'].get('url')
+        if not invoice.emitted_at:
+            invoice.emitted_at = now
+    elif status == 'error' and changed:
+        invoice.error_message = data.get('flowMessage') or f"Status na NFE.io: {api_status or flow_status}"
+
+    invoice.last_checked = now
+    invoice.next_check_at = now + check_interval(invoice, now) if status == 'processing' else None
+    if changed:
+        invoice.updated_at = now
+    return changed
+
+
+def company_config_for(invoice):
+    """Configuração fiscal do professor dono da nota (ou None)."""
+    try:
+        if invoice.transaction_id:
+            return invoice.transaction.enrollment.course.professor.company_config
+        if invoice.singlesale_id:
+            return invoice.singlesale.seller.company_config
+    except Exception:
+        pass
+    return None
+
+
+def _list_remote(service, wanted):
+    """Notas da empresa encontradas na listagem paginada da NFE.io."""
+    found = {}
+    for page in range(1, STATUS_SYNC_MAX_PAGES + 1):
+        response = service.http.get(
+            f"v1/companies/{service.company_id}/serviceinvoices",
+            params={'pageCount': STATUS_SYNC_PAGE_SIZE, 'pageIndex': page}
+        )
+        if response.status_code != 200:
+            break
+        items = response.json().get('serviceInvoices') or []
+        for item in items:
+            if item.get('id') in wanted:
+                found[item['id']] = item
+        if len(found) == len(wanted) or len(items) < STATUS_SYNC_PAGE_SIZE:
+            break
+    return found
+
+
+def fetch_remote(service, invoices):
+    """
+    Dados da NFE.io por external_id. Notas não encontradas (404) vêm como
+    erro; falhas temporárias ficam de fora e a nota é consultada depois.
+    """
+    wanted = {invoice.external_id for invoice in invoices}
+    found = _list_remote(service, wanted) if len(wanted) >= STATUS_SYNC_LIST_THRESHOLD else {}
+
+    for external_id in wanted - set(found):
+        response = service.http.get(f"v1/companies/{service.company_id}/serviceinvoices/{external_id}")
+        if response.status_code == 200:
+            found[external_id] = response.json()
+        elif response.status_code == 404:
+            found[external_id] = {'status': 'Error', 'flowMessage': 'Nota fiscal não encontrada na NFE.io'}
+        else:
+            logger.warning(f"NFE.io respondeu {response.status_code} para a nota {external_id}")
+    return found
+
+
+def _save_synced(changed, unchanged, loaded, now):
+    """
+    Grava as notas com status novo (update condicionado ao status e
+    focus_status lidos antes da consulta) e reagenda as demais que seguem em
+    processamento. Retorna as notas alteradas efetivamente gravadas.
+    """
+    saved = []
+    for invoice in changed:
+        status, focus_status = loaded[invoice.pk]
+        updated = Invoice.objects.filter(pk=invoice.pk, status=status, focus_status=focus_status).update(
+            **{field: getattr(invoice, field) for field in SYNC_FIELDS}
+        )
+        if updated:
+            saved.append(invoice)
+        else:
+            logger.info(f"Nota {invoice.pk} alterada durante a consulta; resultado descartado")
+
+    schedule = defaultdict(list)
+    for invoice in unchanged:
+        if invoice.status == 'processing':
+            schedule[invoice.next_check_at].append(invoice.pk)
+    for next_check_at, pks in schedule.items():
+        Invoice.objects.filter(pk__in=pks, status='processing').update(
+            last_checked=now, next_check_at=next_check_at
+        )
+    return saved
+
+
+def resend_due(invoice, now):
+    """Nota em WaitingSend sem reenvio dentro do intervalo de consulta atual."""
+    last = invoice.last_send_attempt_at
+    return last is None or now - last >= check_interval(invoice, now)
+
+
+def sync_company_invoices(company_config, invoices, now=None):
+    """
+    Atualiza as notas de uma empresa, sem sobrescrever alterações feitas
+    durante a consulta. Retorna a quantidade de notas com status alterado.
+    """
+    from .bulk import RateLimiter
+    from .services import NFEioService
+
+    now = now or timezone.now()
+    service = NFEioService(company_config)
+    loaded = {invoice.pk: (invoice.status, invoice.focus_status) for invoice in invoices}
+
+    if service.offline_mode:
+        # Modo offline: o serviço simula e grava o status de cada nota
+        for invoice in invoices:
+            service.check_invoice_status(invoice)
+        data = {}
+    else:
+        try:
+            data = fetch_remote(service, invoices)
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Falha ao consultar as notas da empresa {service.company_id}: {e}")
+            data = {}
+
+    changed = []
+    unchanged = []
+    for invoice in invoices:
+        remote = data.get(invoice.external_id)
+        if remote is None:
+            # Sem resposta: mantém o status e consulta de novo mais tarde
+            invoice.last_checked = now
+            invoice.next_check_at = now + check_interval(invoice, now) if invoice.status == 'processing' else None
+            unchanged.append(invoice)
+        elif apply_remote_status(invoice, remote, now):
+            changed.append(invoice)
+        else:
+            unchanged.append(invoice)
+    saved = _save_synced(changed, unchanged, loaded, now)
+
+    # Notas paradas em WaitingSend precisam ser enviadas explicitamente
+    waiting_send = [
+        invoice for invoice in saved + [i for i in unchanged if i.external_id in data]
+        if invoice.focus_status == 'WaitingSend' and resend_due(invoice, now)
+    ]
+    limiter = RateLimiter(getattr(settings, 'INVOICE_BULK_RATE', 5))
+    for invoice in waiting_send:
+        # Reserva o reenvio: outro processo que reenviou a nota no meio tempo ganha
+        claimed = Invoice.objects.filter(
+            pk=invoice.pk, status='processing', focus_status='WaitingSend',
+            last_send_attempt_at=invoice.last_send_attempt_at
+        ).update(last_send_attempt_at=now)
+        if not claimed:
+            continue
+        limiter.wait()
+        service.send_invoice(invoice)
+    return len(saved)
+
+
+def sync_invoices(invoices, now=None):
+    """Sincroniza as notas informadas, agrupadas por empresa."""
+    now = now or timezone.now()
+    groups = defaultdict(list)
+    configs = {}
+    for invoice in invoices:
+        if not invoice.external_id:
+            continue
+        config = company_config_for(invoice)
+        key = config.pk if config else None
+        configs[key] = config
+        groups[key].append(invoice)
+
+    changed = 0
+    for key, group in groups.items():
+        changed += sync_company_invoices(configs[key], group, now)
+    return changed
+
+
+def due_invoices(now=None):
+    """Notas em processamento cuja próxima consulta já venceu."""
+    now = now or timezone.now()
+    return (
+        Invoice.objects.filter(status='processing')
+        .exclude(external_id__isnull=True).exclude(external_id='')
+        .filter(Q(next_check_at__isnull=True) | Q(next_check_at__lte=now))
+    )
+
+
+def sync_due_invoices(batch_size=STATUS_SYNC_BATCH_SIZE):
+    """Uma rodada de sincronização. Retorna (consultadas, alteradas)."""
+    now = timezone.now()
+    invoices = list(
+        due_invoices(now).select_related(*COMPANY_CONFIG_RELATIONS)
+        .order_by('next_check_at', 'pk')[:batch_size]
+    )
+    if not invoices:
+        return 0, 0
+    return len(invoices), sync_invoices(invoices, now)
+
+
+def sync_if_due(invoice):
+    """
+    Consulta a NFE.io para a nota só se a próxima consulta já venceu; caso
+    contrário mantém o status gravado. Retorna True se consultou.
+    """
+    if invoice.status != 'processing' or not invoice.external_id:
+        return False
+    if invoice.next_check_at and invoice.next_check_at > timezone.now():
+        return False
+    sync_invoices([invoice])
+    return True
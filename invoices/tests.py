@@ -1,3 +1,126 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .models import CompanyConfig, EmailOutbox, Invoice, RpsBlock
+from .outbox import claim_batch, requeue_stale
+from .rps import RpsAllocator
+
+
+def create_company_config(email='professor@example.com'):
+    user = get_user_model().objects.create_user(email=email, password='x', user_type='PROFESSOR')
+    return CompanyConfig.objects.create(user=user, rps_serie='1', rps_lote=1, rps_numero_atual=1)
+
+
+class RpsAllocatorTests(TransactionTestCase):
+    """
+    Numeração de RPS em blocos (invoices/rps.py). Fora de TestCase: dentro
+    de uma transação o alocador reserva número a número, sem blocos.
+    """
+
+    def setUp(self):
+        self.config = create_company_config()
+
+    def test_two_allocators_never_hand_out_the_same_number(self):
+        first, second = RpsAllocator(block_size=5), RpsAllocator(block_size=5)
+
+        numbers = {first: [], second: []}
+        for _ in range(12):
+            for allocator in (first, second):
+                numbers[allocator].append(allocator.allocate(self.config)[2])
+
+        handed_out = numbers[first] + numbers[second]
+        self.assertEqual(len(handed_out), len(set(handed_out)))
+        for sequence in numbers.values():
+            self.assertEqual(sequence, sorted(sequence))
+
+        self.config.refresh_from_db()
+        self.assertGreater(self.config.rps_numero_atual, max(handed_out))
+
+    def test_release_records_usage_and_numbering_does_not_rewind(self):
+        allocator = RpsAllocator(block_size=10)
+        used = [allocator.allocate(self.config)[2] for _ in range(3)]
+        allocator.release()
+
+        block = RpsBlock.objects.get()
+        self.assertEqual(block.used, 3)
+        self.assertIsNotNone(block.released_at)
+
+        # Os números não usados do bloco ficam como lacuna, nunca são reaproveitados
+        next_number = RpsAllocator(block_size=10).allocate(self.config)[2]
+        self.assertGreater(next_number, block.last_number)
+        self.assertGreater(next_number, max(used))
+
+    def test_series_change_discards_the_open_block(self):
+        allocator = RpsAllocator(block_size=10)
+        serie, lote, number = allocator.allocate(self.config)
+        self.assertEqual((serie, lote), ('1', 1))
+
+        CompanyConfig.objects.filter(pk=self.config.pk).update(
+            rps_serie='2', rps_lote=7, rps_version=F('rps_version') + 1
+        )
+        serie, lote, next_number = allocator.allocate(self.config)
+
+        self.assertEqual((serie, lote), ('2', 7))
+        old_block, new_block = RpsBlock.objects.order_by('pk')
+        self.assertEqual(old_block.used, 1)
+        self.assertIsNotNone(old_block.released_at)
+        self.assertEqual(next_number, new_block.first_number)
+        self.assertGreater(next_number, old_block.last_number)
+
+
+class RpsAllocatorTransactionTests(TestCase):
+    def test_reservation_inside_a_transaction_is_not_kept_in_memory(self):
+        config = create_company_config()
+        allocator = RpsAllocator(block_size=10)
+
+        numbers = [allocator.allocate(config)[2] for _ in range(2)]
+
+        self.assertEqual(numbers, [1, 2])
+        self.assertEqual(allocator._blocks, {})
+        self.assertEqual(list(RpsBlock.objects.values_list('used', flat=True)), [1, 1])
+
+
+@override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=3)
+class EmailOutboxStaleTests(TestCase):
+    """Mensagens abandonadas em envio (invoices/outbox.py)."""
+
+    def create_message(self, key, **kwargs):
+        invoice = Invoice.objects.create(amount=10, status='approved', external_id=key)
+        return EmailOutbox.objects.create(
+            invoice=invoice, recipient_email=f'{key}@example.com', subject='Nota fiscal',
+            text_body='texto', html_body='<p>html</p>', dedupe_key=key, **kwargs
+        )
+
+    def test_stale_message_is_requeued_and_counted_as_an_attempt(self):
+        message = self.create_message(
+            'a', status='sending', attempts=0, locked_at=timezone.now() - timedelta(hours=1)
+        )
+
+        requeue_stale(timezone.now())
+
+        message.refresh_from_db()
+        self.assertEqual(message.status, 'queued')
+        self.assertEqual(message.attempts, 1)
+        self.assertTrue(message.last_error)
+
+    def test_stale_message_at_the_attempt_limit_fails(self):
+        message = self.create_message(
+            'a', status='sending', attempts=2, locked_at=timezone.now() - timedelta(hours=1)
+        )
+
+        requeue_stale(timezone.now())
+
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('failed', 3))
+
+    def test_recent_message_in_progress_is_not_requeued(self):
+        message = self.create_message('a', status='sending', locked_at=timezone.now())
+
+        self.assertEqual(claim_batch(), [])
+
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('sending', 0))
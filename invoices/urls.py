@@ -19,6 +19,8 @@ urlpatterns = [
     path('sync/<int:invoice_id>/', views.sync_invoice_status, name='sync_status'),
     path('retry-waiting/', views.retry_waiting_invoices, name='retry_waiting'),
     path('test-mode/', views.test_mode, name='test_mode'),
+    path('jobs/<int:job_id>/', views.invoice_job_status, name='job_status'),
+    path('export/', views.export_invoices, name='export'),
     
     # URLs para visualização de notas fiscais
     path('detail/<int:invoice_id>/', views.invoice_detail, name='invoice_detail'),
@@ -29,6 +31,7 @@ urlpatterns = [
     # URLs para envio de email
     path('send-email/<int:invoice_id>/', views.send_invoice_email, name='send_email'),
     path('send-email-ajax/<int:invoice_id>/', views.send_invoice_email_ajax, name='send_email_ajax'),
+    path('emails/outbox/stats/', views.email_outbox_stats, name='email_outbox_stats'),
     
     # URLs para teste e debug
     path('test-pdf-attachment/<int:invoice_id>/', views.test_pdf_attachment_view, name='test_pdf_attachment'),
@@ -1,7 +1,7 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponseRedirect, Http404
+from django.http import JsonResponse, HttpResponseRedirect, Http404, StreamingHttpResponse
 from django.conf import settings
 from django.utils import timezone
 from django.urls import reverse
@@ -10,13 +10,19 @@ from django.utils.translation import gettext_lazy as _
 import logging
 import traceback
 import json
+from datetime import date, timedelta
 
 from payments.models import PaymentTransaction, SingleSale
 from users.decorators import professor_required, admin_required
 
-from .models import CompanyConfig, Invoice, MunicipalServiceCode
+from .bulk import job_status
+from .documents import document_response, get_document
+from .export import export_filename, export_queryset, iter_export_zip
+from .outbox import enqueue_invoice_email, enqueue_result, outbox_stats
+from .models import CompanyConfig, Invoice, InvoiceBatchJob, MunicipalServiceCode
 from .forms import CompanyConfigForm, MunicipalServiceCodeFormSet
 from .services import NFEioService
+from .status_sync import sync_if_due
 
 # Configuração do logger
 logger = logging.getLogger('invoices')
@@ -48,7 +54,7 @@ def company_settings(request):
                 selected_code = form.cleaned_data.get('city_service_code')
                 if selected_code:
                     company_config.city_service_code = selected_code
-                    company_config.save()
+                    company_config.save(update_fields=['city_service_code', 'updated_at'])
                 
             messages.success(request, _('Configurações fiscais atualizadas com sucesso!'))
             return redirect('invoices:company_settings')
@@ -238,34 +244,19 @@ def check_invoice_status(request, invoice_id, format=None):
             messages.error(request, _('Você não tem permissão para verificar esta nota fiscal.'))
             return redirect('payments:transactions')
         
-        # Verificar status atual na API NFE.io
-        # Obter configuração da empresa baseada no tipo de invoice
-        if invoice.transaction:
-            company_config = invoice.transaction.enrollment.course.professor.company_config
-        elif invoice.singlesale:
-            company_config = invoice.singlesale.seller.company_config
-        else:
-            company_config = None
-            
-        nfe_service = NFEioService(company_config)
-        status_result = nfe_service.check_invoice_status(invoice)
-        
-        # Atualizar o status da nota fiscal no banco de dados
-        if status_result['success']:
-            invoice.status = status_result['status']
-            invoice.external_status = status_result.get('external_status', '')
-            invoice.external_message = status_result.get('message', '')
-            invoice.last_checked = timezone.now()
-            invoice.save()
+        # O status é mantido pelo comando sync_invoice_status; a NFE.io só é
+        # consultada aqui se a próxima consulta agendada da nota já venceu
+        sync_if_due(invoice)
         
         # Retornar resposta baseada no formato solicitado
         if format == 'json':
             return JsonResponse({
                 'status': invoice.status,
-                'external_status': invoice.external_status,
-                'message': invoice.external_message,
+                'external_status': invoice.focus_status,
+                'message': invoice.error_message if invoice.status == 'error' else (invoice.focus_status or ''),
                 'last_checked': invoice.last_checked.isoformat() if invoice.last_checked else None,
-                'success': status_result['success']
+                'next_check_at': invoice.next_check_at.isoformat() if invoice.next_check_at else None,
+                'success': True
             })
         
         # Redirecionar para a página de detalhes da nota fiscal
@@ -286,6 +277,37 @@ def check_invoice_status(request, invoice_id, format=None):
         messages.error(request, _('Erro ao verificar status da nota fiscal.'))
         return redirect('payments:transactions')
 
+@login_required
+@professor_required
+def invoice_job_status(request, job_id):
+    """
+    Andamento de uma emissão em lote (notas enviadas, com erro e ignoradas).
+    """
+    job = get_object_or_404(InvoiceBatchJob, id=job_id, professor=request.user)
+    return JsonResponse(job_status(job))
+
+@login_required
+@professor_required
+def export_invoices(request):
+    """
+    ZIP com os PDFs, XMLs e o manifesto.csv das notas emitidas no período
+    (?start=AAAA-MM-DD&end=AAAA-MM-DD; por padrão, o mês anterior), gerado
+    aos pedaços durante o envio.
+    """
+    default_end = timezone.localdate().replace(day=1) - timedelta(days=1)
+    try:
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else default_end.replace(day=1)
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else default_end
+    except ValueError:
+        return JsonResponse({'error': 'Datas inválidas. Use o formato AAAA-MM-DD.'}, status=400)
+    if start > end:
+        return JsonResponse({'error': 'A data inicial é posterior à data final.'}, status=400)
+
+    invoices = export_queryset(request.user, start, end)
+    response = StreamingHttpResponse(iter_export_zip(invoices.iterator(chunk_size=100)), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(start, end)}"'
+    return response
+
 @login_required
 @professor_required
 def cancel_invoice(request, invoice_id):
@@ -586,8 +608,9 @@ def view_pdf(request, invoice_id):
 @login_required
 def download_pdf(request, invoice_id):
     """
-    Faz download do PDF da nota fiscal diretamente da API NFE.io
-    usando as credenciais adequadas e retorna o conteúdo para o usuário.
+    Retorna o PDF da nota fiscal. O PDF é baixado da API NFE.io (com as
+    credenciais da empresa) só no primeiro acesso e depois servido do
+    storage, com suporte a Range.
     """
     try:
         # Verificar se o usuário está autenticado
@@ -619,35 +642,13 @@ def download_pdf(request, invoice_id):
             messages.error(request, _('Nota fiscal inválida.'))
             return redirect('payments:singlesale_list')
         
-        # Obter configuração da empresa baseada no tipo de invoice
-        if invoice.transaction:
-            company_config = invoice.transaction.enrollment.course.professor.company_config
-        elif invoice.singlesale:
-            company_config = invoice.singlesale.seller.company_config
-        else:
-            company_config = None
-            
-        # Inicializar o serviço
-        service = NFEioService(company_config)
-        
-        # Construir a URL da API
-        api_url = f"{service.base_url}/v1/companies/{service.company_id}/serviceinvoices/{invoice_id}/pdf"
-        
-        # Fazer a requisição autenticada para a API
-        import requests
-        response = requests.get(api_url, headers=service.headers)
-        
-        # Verificar se a requisição foi bem-sucedida
-        if response.status_code != 200:
-            logger.error(f"Erro ao obter PDF da API: {response.status_code} {response.text}")
-            messages.error(request, _('Erro ao obter o PDF da nota fiscal. Código de erro: {}').format(response.status_code))
+        # PDF guardado no storage; só é baixado da NFE.io no primeiro acesso
+        document = get_document(invoice, 'pdf')
+        if document is None:
+            messages.error(request, _('Erro ao obter o PDF da nota fiscal.'))
             return redirect('payments:singlesale_list')
         
-        # Retornar o conteúdo do PDF com os cabeçalhos adequados
-        from django.http import HttpResponse
-        pdf_response = HttpResponse(response.content, content_type='application/pdf')
-        pdf_response['Content-Disposition'] = f'inline; filename="nota_fiscal_{invoice.id}.pdf"'
-        return pdf_response
+        return document_response(request, document, f"nota_fiscal_{invoice.id}.pdf")
         
     except Exception as e:
         logger.error(f"Erro ao fazer download do PDF: {str(e)}")
@@ -1040,17 +1041,11 @@ def send_invoice_email(request, invoice_id):
                 recipient_email = form.cleaned_data['recipient_email']
                 custom_message = form.cleaned_data.get('custom_message', '')
                 
-                # Enviar o email usando o serviço
-                from .email_service import EmailService
-                email_service = EmailService()
-                result = email_service.send_invoice_email(invoice, recipient_email, custom_message)
-                
-                if result['success']:
-                    messages.success(request, result['message'])
-                    # Permanecer na página para permitir novos envios
-                    return redirect('invoices:send_email', invoice_id=invoice_id)
-                else:
-                    messages.error(request, result['message'])
+                # O envio fica com o comando process_email_outbox
+                result = enqueue_result(*enqueue_invoice_email(invoice, recipient_email, custom_message))
+                messages.success(request, result['message'])
+                # Permanecer na página para permitir novos envios
+                return redirect('invoices:send_email', invoice_id=invoice_id)
         else:
             from .forms import SendEmailForm
             # Pré-preencher com email do cliente se disponível
@@ -1137,12 +1132,8 @@ def send_invoice_email_ajax(request, invoice_id):
                 'message': 'Email do cliente não disponível. Use a página de envio personalizado.'
             })
         
-        # Enviar o email
-        from .email_service import EmailService
-        email_service = EmailService()
-        result = email_service.send_invoice_email(invoice, recipient_email)
-        
-        return JsonResponse(result)
+        # Pôr o email na fila (enviado pelo comando process_email_outbox)
+        return JsonResponse(enqueue_result(*enqueue_invoice_email(invoice, recipient_email)))
         
     except Exception as e:
         logger.error(f"Erro ao enviar email via AJAX para nota fiscal {invoice_id}: {str(e)}")
@@ -1151,6 +1142,15 @@ def send_invoice_email_ajax(request, invoice_id):
             'message': f'Erro ao enviar email: {str(e)}'
         })
 
+@login_required
+@admin_required
+def email_outbox_stats(request):
+    """
+    Métricas da fila de emails: mensagens por status, vazão e erros na
+    última hora.
+    """
+    return JsonResponse(outbox_stats())
+
 @login_required
 def test_pdf_attachment_view(request, invoice_id):
     """
@@ -1191,8 +1191,8 @@ def test_pdf_attachment_view(request, invoice_id):
         from .email_service import EmailService
         email_service = EmailService()
         
-        # Executar teste de debug
-        success = email_service.debug_pdf_attachment(invoice)
+        # Mesmo caminho do envio real: cache de documentos, API da NFE.io e focus_pdf_url
+        success = bool(email_service.resolve_pdf(invoice))
         
         if success:
             messages.success(request, f'✅ PDF da nota fiscal #{invoice.id} pode ser anexado com sucesso!')
@@ -1208,8 +1208,8 @@ def test_pdf_attachment_view(request, invoice_id):
         if invoice.status != 'approved':
             info_messages.append(f'📋 Status da nota fiscal: {invoice.get_status_display()}')
         
-        if not email_service.nfeio_api_key:
-            info_messages.append('🔑 Credenciais NFE.io não configuradas.')
+        if not invoice.external_id:
+            info_messages.append('🔑 Esta nota fiscal não possui ID na NFE.io.')
             
         for msg in info_messages:
             messages.info(request, msg)
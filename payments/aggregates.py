@@ -0,0 +1,396 @@
+"""
+Agregações financeiras usadas pelos dashboards e pelo assistente.
+
+Cada métrica é calculada com agregações condicionais (Count/Sum com filter=Q)
+e agrupamentos por curso, de modo que o número de consultas não depende da
+quantidade de cursos, alunos ou notas fiscais. Os valores por status vêm
+do rollup diário (DailyRevenue), que tem uma linha por dia em vez de uma por
+transação. O resumo completo de um professor (ou da plataforma) fica em cache
+por um curto período.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum, Q, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from courses.models import Course, Enrollment
+from .models import PaymentTransaction, SingleSale, DailyRevenue, ProfessorFinancialSummary
+
+# Tempo que um resumo financeiro permanece no cache (segundos)
+FINANCIAL_SUMMARY_CACHE_TIMEOUT = 60
+
+# Janela usada para contar os alunos recentes (dias)
+RECENT_STUDENTS_DAYS = 30
+
+INVOICE_STATUSES = ('approved', 'pending', 'processing', 'error')
+
+
+def _summary_key(professor_id=None):
+    return f"financial_summary_{professor_id or 'platform'}"
+
+
+def _empty_totals():
+    totals = {'total_amount': 0, 'total_count': 0}
+    for status in PaymentTransaction.Status.values:
+        totals[f'{status.lower()}_amount'] = 0
+        totals[f'{status.lower()}_count'] = 0
+    return totals
+
+
+def transaction_totals(transactions=None):
+    """
+    Totais de um queryset de transações (ou de vendas avulsas) em uma única
+    consulta. Retorna valores e quantidades por status e no total.
+    """
+    if transactions is None:
+        transactions = PaymentTransaction.objects.all()
+
+    aggregates = {'total_amount': Sum('amount'), 'total_count': Count('id')}
+    for status in PaymentTransaction.Status.values:
+        key = status.lower()
+        aggregates[f'{key}_amount'] = Sum('amount', filter=Q(status=status))
+        aggregates[f'{key}_count'] = Count('id', filter=Q(status=status))
+
+    totals = transactions.order_by().aggregate(**aggregates)
+    return {key: value or 0 for key, value in totals.items()}
+
+
+def _rollup_totals(rows):
+    """Soma linhas do rollup (com status, amount e count) no formato de transaction_totals."""
+    totals = _empty_totals()
+    for row in rows:
+        key = row['status'].lower()
+        amount = row['amount'] or 0
+        count = row['count'] or 0
+        totals[f'{key}_amount'] = totals.get(f'{key}_amount', 0) + amount
+        totals[f'{key}_count'] = totals.get(f'{key}_count', 0) + count
+        totals['total_amount'] += amount
+        totals['total_count'] += count
+    return totals
+
+
+def daily_revenue(professor=None, source=DailyRevenue.Source.ENROLLMENT, start=None, end=None, status=None):
+    """
+    Linhas do rollup diário filtradas por professor, origem, período
+    (datas de criação, inclusive) e status.
+    """
+    rows = DailyRevenue.objects.filter(source=source)
+    if professor is not None:
+        rows = rows.filter(professor=professor)
+    if start:
+        rows = rows.filter(date__gte=start)
+    if end:
+        rows = rows.filter(date__lte=end)
+    if status:
+        rows = rows.filter(status=status)
+    return rows
+
+
+def revenue_totals(professor=None, source=DailyRevenue.Source.ENROLLMENT, start=None, end=None, status=None):
+    """
+    Mesmo resultado de transaction_totals, lido do rollup diário: uma consulta
+    agrupada por status sobre O(dias) linhas.
+    """
+    rows = daily_revenue(professor, source, start, end, status).order_by().values('status').annotate(
+        amount=Sum('amount_sum'),
+        count=Sum('count'),
+    )
+    return _rollup_totals(rows)
+
+
+def course_stats(professor=None):
+    """
+    Cursos anotados com o número de matrículas, em uma única consulta
+    agrupada por curso. Os valores por curso vêm de course_revenue().
+    """
+    courses = Course.objects.all()
+    if professor is not None:
+        courses = courses.filter(professor=professor)
+
+    return courses.annotate(enrollments_count=Count('enrollments', distinct=True))
+
+
+def course_revenue(professor=None):
+    """
+    Valores e quantidades por curso e status, lidos do rollup diário.
+    Retorna um dicionário {curso: linhas agrupadas por status}.
+    """
+    rows = daily_revenue(professor).order_by().values('course_id', 'status').annotate(
+        amount=Sum('amount_sum'),
+        count=Sum('count'),
+    )
+    revenue = {}
+    for row in rows:
+        revenue.setdefault(row['course_id'], []).append(row)
+    return revenue
+
+
+def student_counts(professor=None, since=None):
+    """
+    Quantidade de alunos distintos com matrícula ativa e de alunos
+    matriculados desde a data informada, em uma única consulta.
+    """
+    if since is None:
+        since = timezone.now() - timedelta(days=RECENT_STUDENTS_DAYS)
+
+    enrollments = Enrollment.objects.filter(student__user_type='STUDENT')
+    if professor is not None:
+        enrollments = enrollments.filter(course__professor=professor)
+
+    return enrollments.order_by().aggregate(
+        active_students_count=Count(
+            'student', distinct=True, filter=Q(status=Enrollment.Status.ACTIVE)
+        ),
+        recent_students_count=Count(
+            'student', distinct=True, filter=Q(enrolled_at__gte=since)
+        ),
+    )
+
+
+def invoice_counts(professor=None):
+    """
+    Quantidade de notas fiscais no total e por status, em uma única consulta.
+    Retorna zeros quando o app de notas fiscais não está disponível.
+    """
+    counts = {'invoices_count': 0}
+    counts.update({f'invoices_{status}': 0 for status in INVOICE_STATUSES})
+
+    try:
+        from invoices.models import Invoice
+    except ImportError:
+        return counts
+
+    invoices = Invoice.objects.all()
+    if professor is not None:
+        invoices = invoices.filter(transaction__enrollment__course__professor=professor)
+
+    aggregates = {'invoices_count': Count('id')}
+    for status in INVOICE_STATUSES:
+        aggregates[f'invoices_{status}'] = Count('id', filter=Q(status=status))
+
+    counts.update(invoices.order_by().aggregate(**aggregates))
+    return counts
+
+
+def build_financial_summary(professor=None):
+    """
+    Monta o resumo financeiro de um professor ou, quando professor é None,
+    da plataforma inteira.
+    """
+    stats = list(course_stats(professor))
+    revenue = course_revenue(professor)
+    course_totals = {course_id: _rollup_totals(rows) for course_id, rows in revenue.items()}
+    totals = _rollup_totals(row for rows in revenue.values() for row in rows)
+    empty = _empty_totals()
+
+    summary = {
+        'courses_count': len(stats),
+        'enrollments_count': sum(course.enrollments_count for course in stats),
+        'total_received': totals['paid_amount'],
+        'total_pending': totals['pending_amount'],
+        'total_refunded': totals['refunded_amount'],
+        'total_transactions': totals['total_count'],
+        'transactions': totals,
+        'course_stats': [
+            {
+                'course': course,
+                'enrollments': course.enrollments_count,
+                'total_paid': course_totals.get(course.id, empty)['paid_amount'],
+                'total_pending': course_totals.get(course.id, empty)['pending_amount'],
+            }
+            for course in stats
+        ],
+    }
+    summary.update(student_counts(professor))
+    summary.update(invoice_counts(professor))
+    return summary
+
+
+def get_financial_summary(professor=None):
+    """
+    Retorna o resumo financeiro do professor (ou da plataforma), usando o
+    cache por até FINANCIAL_SUMMARY_CACHE_TIMEOUT segundos.
+    """
+    key = _summary_key(professor.id if professor is not None else None)
+    summary = cache.get(key)
+    if summary is None:
+        summary = build_financial_summary(professor)
+        cache.set(key, summary, FINANCIAL_SUMMARY_CACHE_TIMEOUT)
+    return summary
+
+
+def invalidate_financial_summary(professor_id=None):
+    """Descarta o resumo em cache de um professor e o da plataforma."""
+    keys = [_summary_key(None)]
+    if professor_id is not None:
+        keys.append(_summary_key(professor_id))
+    cache.delete_many(keys)
+
+
+def _grouped(queryset, group_by, aggregate):
+    return dict(
+        queryset.order_by().values(group_by).annotate(total=aggregate).values_list(group_by, 'total')
+    )
+
+
+def rebuild_professor_summaries(professor_ids=None):
+    """
+    Recalcula o resumo materializado dos professores informados (ou de todos)
+    com três consultas agrupadas por professor e grava tudo em lote.
+    Retorna o número de resumos gravados.
+    """
+    User = get_user_model()
+    courses = Course.objects.all()
+    enrollments = Enrollment.objects.all()
+    payments = PaymentTransaction.objects.filter(status=PaymentTransaction.Status.PAID)
+
+    if professor_ids is None:
+        professor_ids = list(
+            User.objects.filter(Q(user_type='PROFESSOR') | Q(courses__isnull=False))
+            .order_by().values_list('id', flat=True).distinct()
+        )
+    else:
+        professor_ids = list(User.objects.filter(id__in=professor_ids).values_list('id', flat=True))
+        courses = courses.filter(professor_id__in=professor_ids)
+        enrollments = enrollments.filter(course__professor_id__in=professor_ids)
+        payments = payments.filter(enrollment__course__professor_id__in=professor_ids)
+
+    courses_count = _grouped(courses, 'professor_id', Count('id'))
+    enrollments_count = _grouped(enrollments, 'course__professor_id', Count('id'))
+    revenue = _grouped(payments, 'enrollment__course__professor_id', Sum('amount'))
+
+    summaries = [
+        ProfessorFinancialSummary(
+            professor_id=professor_id,
+            courses_count=courses_count.get(professor_id, 0),
+            enrollments_count=enrollments_count.get(professor_id, 0),
+            revenue=revenue.get(professor_id) or 0,
+        )
+        for professor_id in professor_ids
+    ]
+    ProfessorFinancialSummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=['professor'],
+        update_fields=['courses_count', 'enrollments_count', 'revenue', 'updated_at'],
+    )
+    return len(summaries)
+
+
+def adjust_professor_summary(professor_id, **deltas):
+    """
+    Aplica incrementos (por exemplo revenue=Decimal('10'), enrollments_count=-1)
+    ao resumo do professor com um único UPDATE. Se o resumo ainda não existir,
+    ele é recalculado por completo depois do commit (quando o professor está
+    sendo excluído, nada é recriado).
+    """
+    if not professor_id:
+        return
+    updated = ProfessorFinancialSummary.objects.filter(professor_id=professor_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+    if not updated:
+        transaction.on_commit(lambda: rebuild_professor_summaries([professor_id]))
+    invalidate_financial_summary(professor_id)
+
+
+def professor_leaderboard(limit=10):
+    """Professores com maior receita, lidos do resumo materializado."""
+    return ProfessorFinancialSummary.objects.filter(
+        professor__user_type='PROFESSOR'
+    ).select_related('professor').order_by('-revenue', 'professor_id')[:limit]
+
+
+def revenue_date(created_at):
+    """Dia (no fuso local) em que uma transação criada em created_at é contabilizada."""
+    return timezone.localdate(created_at) if created_at else timezone.localdate()
+
+
+def record_revenue(bucket, amount, count=1):
+    """
+    Soma amount e count à linha do rollup identificada por bucket, uma tupla
+    (professor_id, course_id, source, date, status). A linha é criada quando
+    ainda não existe; count negativo desfaz uma contabilização anterior.
+    """
+    professor_id, course_id, source, date, status = bucket
+    if not professor_id:
+        return
+
+    rows = DailyRevenue.objects.filter(
+        professor_id=professor_id, course_id=course_id, source=source, date=date, status=status
+    )
+    changes = {'amount_sum': F('amount_sum') + amount, 'count': F('count') + count}
+    if rows.update(**changes) or count < 0:
+        # Não há o que desfazer em uma linha inexistente (por exemplo, quando
+        # o curso está sendo excluído em cascata junto com o rollup)
+        return
+
+    try:
+        with transaction.atomic():
+            DailyRevenue.objects.create(
+                professor_id=professor_id, course_id=course_id, source=source, date=date,
+                status=status, amount_sum=amount, count=count
+            )
+    except IntegrityError:
+        # Outra requisição criou a linha ao mesmo tempo
+        rows.update(**changes)
+
+
+def move_revenue(previous, current):
+    """
+    Move uma transação de um bucket do rollup para outro. previous e current
+    são tuplas (bucket, valor) ou None quando a transação não existia antes
+    ou deixou de existir.
+    """
+    if previous == current:
+        return
+    if previous is not None:
+        record_revenue(previous[0], -previous[1], -1)
+    if current is not None:
+        record_revenue(current[0], current[1], 1)
+
+
+def rebuild_daily_revenue():
+    """
+    Recalcula todo o rollup diário a partir das transações e vendas avulsas,
+    com uma consulta agrupada para cada origem. Retorna o número de linhas.
+    """
+    enrollment_rows = PaymentTransaction.objects.order_by().annotate(day=TruncDate('created_at')).values(
+        'enrollment__course__professor_id', 'enrollment__course_id', 'day', 'status'
+    ).annotate(amount=Sum('amount'), total=Count('id'))
+
+    sale_rows = SingleSale.objects.order_by().annotate(day=TruncDate('created_at')).values(
+        'seller_id', 'day', 'status'
+    ).annotate(amount=Sum('amount'), total=Count('id'))
+
+    rows = [
+        DailyRevenue(
+            professor_id=row['enrollment__course__professor_id'],
+            course_id=row['enrollment__course_id'],
+            source=DailyRevenue.Source.ENROLLMENT,
+            date=row['day'],
+            status=row['status'],
+            amount_sum=row['amount'] or 0,
+            count=row['total'],
+        )
+        for row in enrollment_rows
+    ] + [
+        DailyRevenue(
+            professor_id=row['seller_id'],
+            source=DailyRevenue.Source.SINGLE_SALE,
+            date=row['day'],
+            status=row['status'],
+            amount_sum=row['amount'] or 0,
+            count=row['total'],
+        )
+        for row in sale_rows
+    ]
+
+    with transaction.atomic():
+        DailyRevenue.objects.all().delete()
+        DailyRevenue.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
@@ -6,3 +6,7 @@ class PaymentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'payments'
     verbose_name = _('Pagamentos')
+
+    def ready(self):
+        # Importar sinais quando o aplicativo estiver pronto
+        import payments.signals
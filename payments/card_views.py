@@ -14,7 +14,8 @@ import hashlib
 import base64
 
 from .pagarme_service import PagarmeService
-from .models import PaymentTransaction
+from .models import PaymentTransaction, WebhookEvent
+from .webhooks import enqueue_webhook
 from courses.models import Course, Enrollment
 from core.models import User
 
@@ -201,6 +202,7 @@ def card_payment_detail(request, payment_id):
 def card_webhook(request):
     """
     Webhook para receber notificações de pagamento da Pagar.me.
+    Grava o payload na caixa de entrada (WebhookEvent) e responde imediatamente.
     
     Args:
         request: Objeto HttpRequest
@@ -236,55 +238,14 @@ def card_webhook(request):
                 'message': 'Payload inválido'
             }, status=400)
         
-        # Buscar pagamento pelo ID
-        try:
-            payment = PaymentTransaction.objects.get(correlation_id=transaction_id)
-        except PaymentTransaction.DoesNotExist:
-            logger.error(f"Pagamento não encontrado: {transaction_id}")
-            return JsonResponse({
-                'success': False,
-                'message': 'Pagamento não encontrado'
-            }, status=404)
-        
-        # Mapear status da Pagar.me para status do sistema
-        status_map = {
-            'paid': 'paid',
-            'authorized': 'processing',
-            'refunded': 'refunded',
-            'waiting_payment': 'pending',
-            'pending_refund': 'processing',
-            'refused': 'failed',
-            'chargedback': 'canceled',
-            'analyzing': 'processing',
-            'pending_review': 'processing'
-        }
-        
-        new_status = status_map.get(current_status, payment.status)
-        
-        # Atualizar status do pagamento
-        old_status = payment.status
-        payment.status = new_status
-        
-        # Se o pagamento foi aprovado, atualizar data de pagamento e status da matrícula
-        if new_status == 'paid' and old_status != 'paid':
-            payment.paid_at = timezone.now()
-            
-            # Atualizar status da matrícula
-            enrollment = payment.enrollment
-            enrollment.status = 'active'
-            enrollment.save()
-            
-            logger.info(f"Matrícula {enrollment.id} ativada pelo webhook")
-        
-        # Salvar detalhes da notificação
-        payment.details = json.dumps(payload)
-        payment.save()
-        
-        logger.info(f"Status do pagamento {payment.id} atualizado: {old_status} -> {new_status}")
+        # Gravar o evento na caixa de entrada; o processamento é feito pelo comando process_webhooks
+        event, created = enqueue_webhook(WebhookEvent.Provider.PAGARME, payload, current_status)
+        if not created:
+            logger.info(f"Webhook repetido ignorado: {event.event_key}")
         
         return JsonResponse({
             'success': True,
-            'message': 'Notificação processada com sucesso'
+            'message': 'Notificação recebida'
         })
         
     except json.JSONDecodeError:
@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.http import close_sessions
+from payments.openpix_service import OpenPixService
+from payments.pix_status import PIX_POLL_BATCH_SIZE, poll_pending_charges
+
+
+class Command(BaseCommand):
+    help = 'Consulta na OpenPix o status das cobranças PIX pendentes e confirma as pagas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=PIX_POLL_BATCH_SIZE,
+            help='Cobranças lidas do banco por lote'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Faz uma única rodada de consultas e termina (uso em cron)'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=getattr(settings, 'PIX_POLL_INTERVAL', 15),
+            help='Segundos de espera entre as rodadas'
+        )
+
+    def handle(self, *args, **options):
+        # Um único serviço: todas as consultas reaproveitam a mesma conexão
+        service = OpenPixService()
+        try:
+            while True:
+                checked, confirmed = poll_pending_charges(service, options['batch_size'])
+                if checked:
+                    self.stdout.write(f'{checked} cobrança(s) consultada(s), {confirmed} confirmada(s)')
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        finally:
+            close_sessions()
+
+        self.stdout.write(self.style.SUCCESS('✅ Consulta das cobranças PIX concluída.'))
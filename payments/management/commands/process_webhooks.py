@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from payments.webhooks import WEBHOOK_BATCH_SIZE, drain_inbox
+
+
+class Command(BaseCommand):
+    help = 'Processa os webhooks de pagamento pendentes na caixa de entrada (WebhookEvent)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=WEBHOOK_BATCH_SIZE,
+            help='Eventos processados por lote'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Esvazia a caixa de entrada e termina (uso em cron)'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2.0,
+            help='Segundos de espera quando não há eventos pendentes'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = drain_inbox(options['batch_size'])
+            total += processed
+            if processed:
+                self.stdout.write(f'{processed} evento(s) processado(s)')
+                continue
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Caixa de entrada processada: {total} evento(s).')
+        )
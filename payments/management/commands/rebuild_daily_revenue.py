@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from payments.aggregates import rebuild_daily_revenue
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o rollup diário de receita (DailyRevenue) a partir das transações e vendas avulsas'
+
+    def handle(self, *args, **options):
+        rows = rebuild_daily_revenue()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Rollup diário recalculado: {rows} linhas gravadas.')
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from payments.references import rebuild_payment_references
+
+
+class Command(BaseCommand):
+    help = 'Recria o índice de referências externas de pagamento (correlation_id/transaction_id) usado pelos webhooks'
+
+    def handle(self, *args, **options):
+        total = rebuild_payment_references()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Índice de referências recriado: {total} referências gravadas.')
+        )
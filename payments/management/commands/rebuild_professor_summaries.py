@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from payments.aggregates import rebuild_professor_summaries
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o resumo financeiro materializado (cursos, matrículas e receita) dos professores'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--professor',
+            type=int,
+            action='append',
+            dest='professor_ids',
+            help='ID do professor a recalcular (pode ser repetido). Sem este parâmetro, todos os professores.'
+        )
+
+    def handle(self, *args, **options):
+        summaries = rebuild_professor_summaries(options['professor_ids'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ {summaries} resumos financeiros de professores recalculados.')
+        )
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.10 on 2026-10-18 18:26
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+import django.db.models.deletion
+
+
+def populate_summaries(apps, schema_editor):
+    """Cria o resumo de cada professor a partir dos dados existentes."""
+    User = apps.get_model('core', 'User')
+    Course = apps.get_model('courses', 'Course')
+    Enrollment = apps.get_model('courses', 'Enrollment')
+    PaymentTransaction = apps.get_model('payments', 'PaymentTransaction')
+    ProfessorFinancialSummary = apps.get_model('payments', 'ProfessorFinancialSummary')
+
+    def grouped(queryset, group_by, aggregate):
+        return dict(
+            queryset.order_by().values(group_by).annotate(total=aggregate).values_list(group_by, 'total')
+        )
+
+    courses_count = grouped(Course.objects.all(), 'professor_id', Count('id'))
+    enrollments_count = grouped(Enrollment.objects.all(), 'course__professor_id', Count('id'))
+    revenue = grouped(
+        PaymentTransaction.objects.filter(status='PAID'), 'enrollment__course__professor_id', Sum('amount')
+    )
+
+    professor_ids = User.objects.filter(
+        Q(user_type='PROFESSOR') | Q(courses__isnull=False)
+    ).order_by().values_list('id', flat=True).distinct()
+
+    ProfessorFinancialSummary.objects.bulk_create([
+        ProfessorFinancialSummary(
+            professor_id=professor_id,
+            courses_count=courses_count.get(professor_id, 0),
+            enrollments_count=enrollments_count.get(professor_id, 0),
+            revenue=revenue.get(professor_id) or 0,
+        )
+        for professor_id in professor_ids
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0012_progress_counters'),
+        ('payments', '0008_alter_singlesale_recurrence_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfessorFinancialSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('courses_count', models.PositiveIntegerField(default=0, verbose_name='cursos')),
+                ('enrollments_count', models.PositiveIntegerField(default=0, verbose_name='matrículas')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='receita')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='última atualização')),
+                ('professor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='financial_summary', to=settings.AUTH_USER_MODEL, verbose_name='professor')),
+            ],
+            options={
+                'verbose_name': 'resumo financeiro do professor',
+                'verbose_name_plural': 'resumos financeiros dos professores',
+                'ordering': ['-revenue'],
+                'indexes': [models.Index(fields=['-revenue'], name='payments_summary_revenue_idx')],
+            },
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
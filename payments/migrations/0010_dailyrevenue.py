@@ -0,0 +1,86 @@
+# Generated by Django 4.2.10 on 2026-10-18 18:28
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def populate_daily_revenue(apps, schema_editor):
+    """Preenche o rollup diário a partir das transações e vendas avulsas existentes."""
+    PaymentTransaction = apps.get_model('payments', 'PaymentTransaction')
+    SingleSale = apps.get_model('payments', 'SingleSale')
+    DailyRevenue = apps.get_model('payments', 'DailyRevenue')
+
+    enrollment_rows = PaymentTransaction.objects.order_by().annotate(day=TruncDate('created_at')).values(
+        'enrollment__course__professor_id', 'enrollment__course_id', 'day', 'status'
+    ).annotate(amount=Sum('amount'), total=Count('id'))
+
+    sale_rows = SingleSale.objects.order_by().annotate(day=TruncDate('created_at')).values(
+        'seller_id', 'day', 'status'
+    ).annotate(amount=Sum('amount'), total=Count('id'))
+
+    rows = [
+        DailyRevenue(
+            professor_id=row['enrollment__course__professor_id'],
+            course_id=row['enrollment__course_id'],
+            source='ENROLLMENT',
+            date=row['day'],
+            status=row['status'],
+            amount_sum=row['amount'] or 0,
+            count=row['total'],
+        )
+        for row in enrollment_rows
+    ] + [
+        DailyRevenue(
+            professor_id=row['seller_id'],
+            source='SINGLE_SALE',
+            date=row['day'],
+            status=row['status'],
+            amount_sum=row['amount'] or 0,
+            count=row['total'],
+        )
+        for row in sale_rows
+    ]
+    DailyRevenue.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_progress_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('payments', '0009_professorfinancialsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('ENROLLMENT', 'Matrícula'), ('SINGLE_SALE', 'Venda avulsa')], max_length=20, verbose_name='origem')),
+                ('date', models.DateField(verbose_name='data')),
+                ('status', models.CharField(max_length=20, verbose_name='status')),
+                ('amount_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='valor total')),
+                ('count', models.IntegerField(default=0, verbose_name='quantidade')),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='courses.course', verbose_name='curso')),
+                ('professor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to=settings.AUTH_USER_MODEL, verbose_name='professor')),
+            ],
+            options={
+                'verbose_name': 'receita diária',
+                'verbose_name_plural': 'receitas diárias',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['professor', 'date'], name='payments_dailyrev_prof_idx'), models.Index(fields=['date', 'status'], name='payments_dailyrev_date_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrevenue',
+            constraint=models.UniqueConstraint(condition=models.Q(('course__isnull', False)), fields=('professor', 'course', 'source', 'date', 'status'), name='payments_dailyrevenue_course_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrevenue',
+            constraint=models.UniqueConstraint(condition=models.Q(('course__isnull', True)), fields=('professor', 'source', 'date', 'status'), name='payments_dailyrevenue_no_course_unique'),
+        ),
+        migrations.RunPython(populate_daily_revenue, migrations.RunPython.noop),
+    ]
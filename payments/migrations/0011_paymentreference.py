@@ -0,0 +1,52 @@
+# Generated by Django 4.2.10 on 2026-10-18 18:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_payment_references(apps, schema_editor):
+    """Indexa os correlation_id/transaction_id das transações e vendas avulsas existentes."""
+    PaymentTransaction = apps.get_model('payments', 'PaymentTransaction')
+    SingleSale = apps.get_model('payments', 'SingleSale')
+    PaymentReference = apps.get_model('payments', 'PaymentReference')
+
+    entries = {}
+    for pk, correlation_id in SingleSale.objects.values_list('pk', 'correlation_id').iterator():
+        if correlation_id and correlation_id.strip():
+            entries[correlation_id.strip()] = PaymentReference(reference=correlation_id.strip(), sale_id=pk)
+    for pk, correlation_id, transaction_id in PaymentTransaction.objects.values_list(
+        'pk', 'correlation_id', 'transaction_id'
+    ).iterator():
+        for value in (correlation_id, transaction_id):
+            if value and value.strip():
+                entries[value.strip()] = PaymentReference(reference=value.strip(), transaction_id=pk)
+
+    PaymentReference.objects.bulk_create(entries.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0010_dailyrevenue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentReference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.CharField(max_length=255, unique=True, verbose_name='referência')),
+                ('sale', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='references', to='payments.singlesale', verbose_name='venda avulsa')),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='references', to='payments.paymenttransaction', verbose_name='transação')),
+            ],
+            options={
+                'verbose_name': 'referência de pagamento',
+                'verbose_name_plural': 'referências de pagamento',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='paymentreference',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('sale__isnull', True), ('transaction__isnull', False)), models.Q(('sale__isnull', False), ('transaction__isnull', True)), _connector='OR'), name='payments_reference_single_target'),
+        ),
+        migrations.RunPython(populate_payment_references, migrations.RunPython.noop),
+    ]
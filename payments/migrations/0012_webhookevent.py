@@ -0,0 +1,40 @@
+# Generated by Django 4.2.10 on 2026-10-18 18:42
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0011_paymentreference'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(choices=[('OPENPIX', 'OpenPix'), ('PAGARME', 'Pagar.me')], max_length=20, verbose_name='gateway')),
+                ('event_key', models.CharField(max_length=255, verbose_name='chave do evento')),
+                ('event_type', models.CharField(blank=True, max_length=100, verbose_name='tipo do evento')),
+                ('payload', models.JSONField(verbose_name='payload')),
+                ('status', models.CharField(choices=[('PENDING', 'Pendente'), ('PROCESSED', 'Processado'), ('IGNORED', 'Ignorado'), ('FAILED', 'Falhou')], default='PENDING', max_length=20, verbose_name='status')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='tentativas')),
+                ('last_error', models.TextField(blank=True, verbose_name='último erro')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='recebido em')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='próxima tentativa')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='processado em')),
+            ],
+            options={
+                'verbose_name': 'evento de webhook',
+                'verbose_name_plural': 'eventos de webhook',
+                'ordering': ['-received_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='payments_webhook_queue_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='webhookevent',
+            constraint=models.UniqueConstraint(fields=('provider', 'event_key'), name='payments_webhook_event_unique'),
+        ),
+    ]
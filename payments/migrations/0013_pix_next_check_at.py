@@ -0,0 +1,23 @@
+# Generated by Django 4.2.10 on 2026-10-18 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0012_webhookevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='pix_next_check_at',
+            field=models.DateTimeField(blank=True, help_text='Próxima consulta da cobrança na OpenPix pelo comando poll_pix_charges', null=True, verbose_name='próxima consulta do Pix'),
+        ),
+        migrations.AddField(
+            model_name='singlesale',
+            name='pix_next_check_at',
+            field=models.DateTimeField(blank=True, help_text='Próxima consulta da cobrança na OpenPix pelo comando poll_pix_charges', null=True, verbose_name='Próxima consulta do Pix'),
+        ),
+    ]
@@ -69,6 +69,12 @@ class PaymentTransaction(models.Model):
         null=True,
         help_text=_('URL da imagem do QR Code para pagamento Pix')
     )
+    pix_next_check_at = models.DateTimeField(
+        _('próxima consulta do Pix'),
+        null=True,
+        blank=True,
+        help_text=_('Próxima consulta da cobrança na OpenPix pelo comando poll_pix_charges')
+    )
     
     # Campos de controle
     created_at = models.DateTimeField(
@@ -99,6 +105,111 @@ class PaymentTransaction(models.Model):
         self.status = self.Status.REFUNDED
         self.save()
 
+
+class ProfessorFinancialSummary(models.Model):
+    """
+    Resumo materializado por professor (cursos, matrículas e receita paga).
+    Mantido pelos sinais em payments/signals.py e usado no ranking do
+    dashboard financeiro do administrador.
+    """
+    professor = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='financial_summary',
+        verbose_name=_('professor')
+    )
+    courses_count = models.PositiveIntegerField(_('cursos'), default=0)
+    enrollments_count = models.PositiveIntegerField(_('matrículas'), default=0)
+    revenue = models.DecimalField(
+        _('receita'),
+        max_digits=12,
+        decimal_places=2,
+        default=0
+    )
+    updated_at = models.DateTimeField(
+        _('última atualização'),
+        auto_now=True
+    )
+
+    class Meta:
+        verbose_name = _('resumo financeiro do professor')
+        verbose_name_plural = _('resumos financeiros dos professores')
+        ordering = ['-revenue']
+        indexes = [
+            models.Index(fields=['-revenue'], name='payments_summary_revenue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.professor.email} - R$ {self.revenue}"
+
+
+class DailyRevenue(models.Model):
+    """
+    Rollup diário de valores por professor, curso, origem e status.
+
+    Cada linha soma as transações (ou vendas avulsas) criadas naquele dia que
+    estão atualmente no status indicado. Mantido de forma incremental pelos
+    sinais em payments/signals.py; o comando rebuild_daily_revenue recalcula
+    a tabela a partir das transações.
+    """
+    class Source(models.TextChoices):
+        ENROLLMENT = 'ENROLLMENT', _('Matrícula')
+        SINGLE_SALE = 'SINGLE_SALE', _('Venda avulsa')
+
+    professor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='daily_revenue',
+        verbose_name=_('professor')
+    )
+    course = models.ForeignKey(
+        'courses.Course',
+        on_delete=models.CASCADE,
+        related_name='daily_revenue',
+        verbose_name=_('curso'),
+        null=True,
+        blank=True
+    )
+    source = models.CharField(
+        _('origem'),
+        max_length=20,
+        choices=Source.choices
+    )
+    date = models.DateField(_('data'))
+    status = models.CharField(_('status'), max_length=20)
+    amount_sum = models.DecimalField(
+        _('valor total'),
+        max_digits=14,
+        decimal_places=2,
+        default=0
+    )
+    count = models.IntegerField(_('quantidade'), default=0)
+
+    class Meta:
+        verbose_name = _('receita diária')
+        verbose_name_plural = _('receitas diárias')
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['professor', 'course', 'source', 'date', 'status'],
+                condition=models.Q(course__isnull=False),
+                name='payments_dailyrevenue_course_unique'
+            ),
+            models.UniqueConstraint(
+                fields=['professor', 'source', 'date', 'status'],
+                condition=models.Q(course__isnull=True),
+                name='payments_dailyrevenue_no_course_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['professor', 'date'], name='payments_dailyrev_prof_idx'),
+            models.Index(fields=['date', 'status'], name='payments_dailyrev_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.professor_id} - {self.status}: R$ {self.amount_sum} ({self.count})"
+
+
 class SingleSale(models.Model):
     """
     Representa uma venda avulsa de produtos ou serviços não vinculados a matrículas em cursos.
@@ -185,6 +296,10 @@ class SingleSale(models.Model):
     # Campos para Pix (semelhante ao PaymentTransaction)
     payment_method = models.CharField(_('Método de Pagamento'), max_length=20, default='pix')
     correlation_id = models.CharField(_('ID de Correlação'), max_length=255, blank=True, null=True)
+    pix_next_check_at = models.DateTimeField(
+        _('Próxima consulta do Pix'), null=True, blank=True,
+        help_text=_('Próxima consulta da cobrança na OpenPix pelo comando poll_pix_charges')
+    )
     brcode = models.TextField(_('BR Code'), blank=True, null=True)
     qrcode_image = models.TextField(_('QR Code (imagem)'), blank=True, null=True)
     
@@ -246,3 +361,100 @@ class SingleSale(models.Model):
         if not self.unit_value:
             self.unit_value = self.amount
         super().save(*args, **kwargs)
+
+
+class PaymentReference(models.Model):
+    """
+    Índice dos identificadores externos de pagamento (correlation_id da
+    OpenPix/Pagar.me e transaction_id) para a transação ou venda avulsa
+    correspondente. Permite que os webhooks encontrem o pagamento com uma
+    única consulta indexada. Mantido pelos sinais em payments/signals.py;
+    o comando rebuild_payment_references recria o índice.
+    """
+    reference = models.CharField(_('referência'), max_length=255, unique=True)
+    transaction = models.ForeignKey(
+        PaymentTransaction,
+        on_delete=models.CASCADE,
+        related_name='references',
+        verbose_name=_('transação'),
+        null=True,
+        blank=True
+    )
+    sale = models.ForeignKey(
+        SingleSale,
+        on_delete=models.CASCADE,
+        related_name='references',
+        verbose_name=_('venda avulsa'),
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        verbose_name = _('referência de pagamento')
+        verbose_name_plural = _('referências de pagamento')
+        constraints = [
+            models.CheckConstraint(
+                check=(
+                    models.Q(transaction__isnull=False, sale__isnull=True)
+                    | models.Q(transaction__isnull=True, sale__isnull=False)
+                ),
+                name='payments_reference_single_target'
+            ),
+        ]
+
+    def __str__(self):
+        return self.reference
+
+    @property
+    def payment(self):
+        """Transação ou venda avulsa referenciada."""
+        return self.transaction or self.sale
+
+
+class WebhookEvent(models.Model):
+    """
+    Caixa de entrada dos webhooks dos gateways de pagamento (OpenPix e
+    Pagar.me). O webhook só grava o payload e responde; o comando
+    process_webhooks processa os eventos pendentes em lotes. A chave
+    (provider, event_key) é única, então reenvios do mesmo evento pelo
+    gateway não geram processamento duplicado.
+    """
+    class Provider(models.TextChoices):
+        OPENPIX = 'OPENPIX', _('OpenPix')
+        PAGARME = 'PAGARME', _('Pagar.me')
+
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', _('Pendente')
+        PROCESSED = 'PROCESSED', _('Processado')
+        IGNORED = 'IGNORED', _('Ignorado')
+        FAILED = 'FAILED', _('Falhou')
+
+    provider = models.CharField(_('gateway'), max_length=20, choices=Provider.choices)
+    event_key = models.CharField(_('chave do evento'), max_length=255)
+    event_type = models.CharField(_('tipo do evento'), max_length=100, blank=True)
+    payload = models.JSONField(_('payload'))
+    status = models.CharField(
+        _('status'),
+        max_length=20,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+    attempts = models.PositiveIntegerField(_('tentativas'), default=0)
+    last_error = models.TextField(_('último erro'), blank=True)
+    received_at = models.DateTimeField(_('recebido em'), auto_now_add=True)
+    next_attempt_at = models.DateTimeField(_('próxima tentativa'), default=timezone.now)
+    processed_at = models.DateTimeField(_('processado em'), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('evento de webhook')
+        verbose_name_plural = _('eventos de webhook')
+        ordering = ['-received_at']
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'event_key'], name='payments_webhook_event_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='payments_webhook_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.event_key} ({self.status})"
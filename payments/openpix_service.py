@@ -1,10 +1,11 @@
-import requests
 import json
 import logging
 from django.conf import settings
 from django.utils import timezone
 from datetime import datetime, timedelta
 
+from core.http import GatewayClient
+
 class OpenPixService:
     """
     Serviço para integração com a API do OpenPix para pagamentos via Pix.
@@ -12,7 +13,7 @@ class OpenPixService:
     # URL para ambiente de produção: https://api.openpix.com.br/api/v1
     # URL para ambiente de sandbox: https://api.sandbox.openpix.com.br/api/v1
     
-    def __init__(self):
+    def __init__(self, http=None):
         # Determina qual ambiente usar com base nas configurações
         self.is_sandbox = settings.DEBUG or getattr(settings, 'DEBUG_PAYMENTS', False)
         
@@ -26,6 +27,8 @@ class OpenPixService:
             "Authorization": settings.OPENPIX_TOKEN,
             "Content-Type": "application/json"
         }
+        # Cliente HTTP com conexões reaproveitadas, timeout e retry (ver core/http.py)
+        self.http = http or GatewayClient(self.BASE_URL, headers=self.headers, verify=not self.is_sandbox)
         self.logger = logging.getLogger('payments')
         
         ambiente = "SANDBOX" if self.is_sandbox else "PRODUÇÃO"
@@ -135,7 +138,7 @@ class OpenPixService:
             # Em ambiente de desenvolvimento, desativar verificação SSL
             verify_ssl = not self.is_sandbox
             
-            response = requests.post(
+            response = self.http.post(
                 f"{self.BASE_URL}/charge",
                 headers=self.headers,
                 data=json.dumps(charge_data),
@@ -200,7 +203,7 @@ class OpenPixService:
             # Em ambiente de desenvolvimento, desativar verificação SSL
             verify_ssl = not self.is_sandbox
             
-            response = requests.get(
+            response = self.http.get(
                 f"{self.BASE_URL}/charge/{correlation_id}",
                 headers=self.headers,
                 verify=verify_ssl
@@ -290,7 +293,7 @@ class OpenPixService:
             verify_ssl = not self.is_sandbox
             
             # Para o sandbox, não precisamos de payload adicional
-            response = requests.post(
+            response = self.http.post(
                 url,
                 headers=self.headers,
                 verify=verify_ssl
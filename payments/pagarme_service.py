@@ -1,10 +1,11 @@
-import requests
 import json
 import logging
 from django.conf import settings
 from django.utils import timezone
 from datetime import datetime, timedelta
 
+from core.http import GatewayClient
+
 class PagarmeService:
     """
     Serviço para integração com a API do Pagar.me para pagamentos com cartão de crédito/débito.
@@ -12,7 +13,7 @@ class PagarmeService:
     # URL para ambiente de produção: https://api.pagar.me/1
     # URL para ambiente de sandbox: https://api.sandbox.pagar.me/1
     
-    def __init__(self):
+    def __init__(self, http=None):
         # Determina qual ambiente usar com base nas configurações
         self.is_sandbox = settings.DEBUG or getattr(settings, 'DEBUG_PAYMENTS', False)
         
@@ -30,6 +31,8 @@ class PagarmeService:
             "Content-Type": "application/json"
         }
         
+        # Cliente HTTP com conexões reaproveitadas, timeout e retry (ver core/http.py)
+        self.http = http or GatewayClient(self.BASE_URL, headers=self.headers, verify=not self.is_sandbox)
         self.logger = logging.getLogger('payments')
         
         ambiente = "SANDBOX" if self.is_sandbox else "PRODUÇÃO"
@@ -183,7 +186,7 @@ class PagarmeService:
             # Em ambiente de desenvolvimento, desativar verificação SSL
             verify_ssl = not self.is_sandbox
             
-            response = requests.post(
+            response = self.http.post(
                 f"{self.BASE_URL}/transactions",
                 headers=self.headers,
                 json=transaction_data,
@@ -254,7 +257,7 @@ class PagarmeService:
             # Em ambiente de desenvolvimento, desativar verificação SSL
             verify_ssl = not self.is_sandbox
             
-            response = requests.get(
+            response = self.http.get(
                 f"{self.BASE_URL}/transactions/{transaction_id}",
                 headers=self.headers,
                 params=query_params,
@@ -317,7 +320,7 @@ class PagarmeService:
             # Em ambiente de desenvolvimento, desativar verificação SSL
             verify_ssl = not self.is_sandbox
             
-            response = requests.post(
+            response = self.http.post(
                 f"{self.BASE_URL}/transactions/{transaction_id}/refund",
                 headers=self.headers,
                 json=refund_data,
@@ -0,0 +1,229 @@
+"""
+Acompanhamento do status das cobranças PIX.
+
+As páginas de pagamento não consultam mais a OpenPix: o comando
+poll_pix_charges consulta, em lotes e por uma única sessão HTTP mantida
+aberta (core.http), as cobranças pendentes cuja próxima consulta
+(pix_next_check_at) já venceu e grava as que foram concluídas. O webhook
+continua sendo o caminho principal; a consulta cobre webhooks perdidos ou
+atrasados.
+
+O intervalo entre consultas cresce com a idade da cobrança
+(PIX_POLL_SCHEDULE) e as consultas param quando ela expira
+(PIX_CHARGE_LIFETIME, com uma pequena tolerância). Com várias cobranças
+devidas no lote, uma única listagem das cobranças concluídas da OpenPix
+substitui as consultas uma a uma.
+
+Os endpoints de status lidos pelo navegador respondem na hora, só com uma
+leitura do banco pela chave primária; a página os consulta a cada 5 a 10
+segundos. Nenhuma requisição fica esperando o pagamento, então as páginas de
+pagamento abertas não ocupam as threads do servidor.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import PaymentTransaction, SingleSale
+from .openpix_service import OpenPixService
+from .webhooks import confirm_pix_payment
+
+logger = logging.getLogger('payments')
+
+# Cobranças consultadas por lote (cada lote é lido do banco de uma vez)
+PIX_POLL_BATCH_SIZE = 50
+
+# (idade máxima da cobrança, intervalo entre consultas)
+PIX_POLL_SCHEDULE = (
+    (timedelta(minutes=10), timedelta(seconds=15)),
+    (timedelta(hours=1), timedelta(minutes=1)),
+    (timedelta(hours=6), timedelta(minutes=5)),
+)
+PIX_POLL_MAX_INTERVAL = timedelta(minutes=15)
+
+# Validade das cobranças: as de matrícula são criadas com expiresIn de 1 hora
+# (OpenPixService.create_charge); as de venda avulsa usam o padrão da OpenPix
+PIX_CHARGE_LIFETIME = {
+    PaymentTransaction: timedelta(hours=1),
+    SingleSale: timedelta(days=1),
+}
+
+# Consultas ainda feitas após a expiração (pagamento no último instante)
+PIX_EXPIRY_GRACE = timedelta(minutes=5)
+
+# A partir de quantas cobranças devidas no lote vale usar a listagem da OpenPix
+PIX_POLL_LIST_THRESHOLD = 5
+
+# Cobranças por página e páginas lidas da listagem da OpenPix
+PIX_POLL_PAGE_SIZE = 100
+PIX_POLL_MAX_PAGES = 5
+
+
+def check_interval(payment, now):
+    """Intervalo até a próxima consulta, crescente com a idade da cobrança."""
+    age = now - payment.created_at
+    for max_age, interval in PIX_POLL_SCHEDULE:
+        if age < max_age:
+            return interval
+    return PIX_POLL_MAX_INTERVAL
+
+
+def charge_deadline(payment):
+    """Momento da última consulta da cobrança: a expiração mais a tolerância."""
+    return payment.created_at + PIX_CHARGE_LIFETIME[type(payment)] + PIX_EXPIRY_GRACE
+
+
+def pending_pix_charges(now=None):
+    """
+    Querysets das transações de curso e vendas avulsas com cobrança PIX
+    pendente, ainda dentro da validade, cuja próxima consulta já venceu
+    (cobranças expiradas ficam por conta do webhook).
+    """
+    now = now or timezone.now()
+    due = Q(pix_next_check_at__isnull=True) | Q(pix_next_check_at__lte=now)
+    transactions = PaymentTransaction.objects.filter(
+        due,
+        payment_method='PIX',
+        status=PaymentTransaction.Status.PENDING,
+        created_at__gte=now - PIX_CHARGE_LIFETIME[PaymentTransaction] - PIX_EXPIRY_GRACE,
+    ).exclude(correlation_id__isnull=True).exclude(correlation_id='')
+    sales = SingleSale.objects.filter(
+        due,
+        payment_method__iexact='pix',
+        status=SingleSale.Status.PENDING,
+        created_at__gte=now - PIX_CHARGE_LIFETIME[SingleSale] - PIX_EXPIRY_GRACE,
+    ).exclude(correlation_id__isnull=True).exclude(correlation_id='')
+    return transactions, sales
+
+
+def _charge_completed(data):
+    charge = data.get('charge') or data
+    return charge.get('status') == 'COMPLETED'
+
+
+def _create_sale_invoice(sale):
+    """Nota fiscal pendente da venda avulsa confirmada (processada depois por signals)."""
+    from invoices.models import Invoice
+
+    if Invoice.objects.filter(singlesale=sale).exists():
+        return
+    Invoice.objects.create(
+        type='rps',
+        transaction=None,
+        singlesale=sale,
+        amount=sale.amount,
+        customer_name=sale.customer_name,
+        customer_email=sale.customer_email,
+        customer_tax_id=sale.customer_cpf,
+        description=sale.description,
+        status='pending'
+    )
+
+
+def _confirm(payment):
+    with transaction.atomic():
+        # Relê travado: o webhook pode ter confirmado a cobrança nesse meio-tempo
+        payment = type(payment).objects.select_for_update().get(pk=payment.pk)
+        changed = confirm_pix_payment(payment, 'consulta periódica')
+        if changed and isinstance(payment, SingleSale):
+            try:
+                _create_sale_invoice(payment)
+            except Exception as e:
+                logger.error(f"Erro ao criar nota fiscal da venda {payment.id}: {e}")
+    return changed
+
+
+def _list_completed(service, start, end):
+    """
+    correlationIDs das cobranças concluídas criadas entre start e end, pela
+    listagem paginada da OpenPix. None se a listagem falhar ou não couber em
+    PIX_POLL_MAX_PAGES páginas.
+    """
+    found = set()
+    for page in range(PIX_POLL_MAX_PAGES):
+        response = service.http.get(
+            f"{service.BASE_URL}/charge",
+            params={
+                'status': 'COMPLETED',
+                'start': start.isoformat(),
+                'end': end.isoformat(),
+                'skip': page * PIX_POLL_PAGE_SIZE,
+                'limit': PIX_POLL_PAGE_SIZE,
+            }
+        )
+        if response.status_code != 200:
+            logger.warning(f"Listagem de cobranças da OpenPix respondeu {response.status_code}")
+            return None
+        data = response.json()
+        found.update(charge.get('correlationID') for charge in data.get('charges') or [])
+        if not (data.get('pageInfo') or {}).get('hasNextPage'):
+            return found
+    return None
+
+
+def completed_charges(service, payments, now):
+    """correlationIDs das cobranças do lote que já foram concluídas na OpenPix."""
+    wanted = {payment.correlation_id for payment in payments}
+    # Em sandbox o serviço simula as consultas localmente
+    if len(wanted) >= PIX_POLL_LIST_THRESHOLD and not service.is_sandbox:
+        start = min(payment.created_at for payment in payments) - timedelta(minutes=1)
+        try:
+            listed = _list_completed(service, start, now)
+        except Exception as e:
+            logger.warning(f"Falha na listagem de cobranças da OpenPix: {e}")
+            listed = None
+        if listed is not None:
+            return wanted & listed
+
+    completed = set()
+    for correlation_id in wanted:
+        try:
+            data = service.get_charge_status(correlation_id)
+        except Exception as e:
+            logger.warning(f"Falha ao consultar a cobrança {correlation_id}: {e}")
+            continue
+        if data and _charge_completed(data):
+            completed.add(correlation_id)
+    return completed
+
+
+def _schedule_next_checks(payments, now):
+    """Grava a próxima consulta de cada cobrança, um UPDATE por horário."""
+    schedule = defaultdict(list)
+    for payment in payments:
+        schedule[min(now + check_interval(payment, now), charge_deadline(payment))].append(payment.pk)
+    model = type(payments[0])
+    for next_check_at, pks in schedule.items():
+        model.objects.filter(pk__in=pks).update(pix_next_check_at=next_check_at)
+
+
+def poll_pending_charges(service=None, batch_size=PIX_POLL_BATCH_SIZE):
+    """
+    Consulta na OpenPix as cobranças PIX pendentes com consulta devida e
+    confirma as concluídas. Retorna (consultadas, confirmadas).
+    """
+    service = service or OpenPixService()
+    now = timezone.now()
+    checked = confirmed = 0
+    for queryset in pending_pix_charges(now):
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            checked += len(batch)
+            completed = completed_charges(service, batch, now)
+            _schedule_next_checks(batch, now)
+            for payment in batch:
+                if payment.correlation_id not in completed:
+                    continue
+                try:
+                    if _confirm(payment):
+                        confirmed += 1
+                except Exception as e:
+                    logger.warning(f"Falha ao confirmar a cobrança {payment.correlation_id}: {e}")
+    return checked, confirmed
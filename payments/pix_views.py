@@ -129,15 +129,14 @@ def pix_payment_detail(request, payment_id):
 def pix_webhook(request):
     """
     Webhook para receber notificações de pagamento da OpenPix.
+    Valida a assinatura, grava o payload na caixa de entrada (WebhookEvent)
+    e responde imediatamente.
     """
-    # A implementação completa do webhook será feita posteriormente
     import json
     import logging
     import hmac
     import hashlib
     from django.conf import settings
-    from .models import PaymentTransaction
-    from courses.models import Enrollment
     
     logger = logging.getLogger('payments')
     
@@ -165,65 +164,15 @@ def pix_webhook(request):
         payload = json.loads(request.body.decode('utf-8'))
         logger.info(f"Payload do webhook: {json.dumps(payload)[:200]}...") # Log truncado para não ser muito grande
         
-        # Verificar o tipo de evento
-        event = payload.get('event')
-        if event != 'CHARGE_COMPLETED':
-            logger.info(f"Evento ignorado: {event}")
-            return HttpResponse(status=200)  # Aceitar o webhook, mas ignorar eventos que não sejam de pagamento concluído
-        
-        # Obter dados da cobrança
-        charge = payload.get('charge', {})
-        correlation_id = charge.get('correlationID')
-        status = charge.get('status')
-        
-        if not correlation_id or status != 'COMPLETED':
-            logger.info(f"Ignorando webhook - correlation_id ausente ou status diferente de COMPLETED: {status}")
-            return HttpResponse(status=200)
-        
-        logger.info(f"Processando pagamento para correlation_id: {correlation_id}")
-        
-        # Buscar a transação correspondente
-        try:
-            # Primeiro, verificar pagamento de curso
-            transaction = PaymentTransaction.objects.get(correlation_id=correlation_id)
-            
-            # Se já estiver pago, apenas retorna sucesso
-            if transaction.status == PaymentTransaction.Status.PAID:
-                logger.info(f"Transação {transaction.id} já estava marcada como paga.")
-                return HttpResponse(status=200)
-            
-            # Marcar como pago
-            transaction.status = PaymentTransaction.Status.PAID
-            transaction.payment_date = timezone.now()
-            transaction.save()
-            
-            # Atualizar status da matrícula
-            enrollment = transaction.enrollment
-            enrollment.status = Enrollment.Status.ACTIVE
-            enrollment.save()
-            
-            logger.info(f"Pagamento confirmado para matrícula {enrollment.id} via webhook.")
-            return HttpResponse(status=200)
-            
-        except PaymentTransaction.DoesNotExist:
-            # Verificar se é uma venda avulsa
-            from .models import SingleSale
-            try:
-                sale = SingleSale.objects.get(correlation_id=correlation_id)
-                
-                # Se já estiver pago, apenas retorna sucesso
-                if sale.status == SingleSale.Status.PAID:
-                    logger.info(f"Venda avulsa {sale.id} já estava marcada como paga.")
-                    return HttpResponse(status=200)
-                
-                # Marcar como pago
-                sale.mark_as_paid()
-                logger.info(f"Pagamento confirmado para venda avulsa {sale.id} via webhook.")
-                return HttpResponse(status=200)
-                
-            except SingleSale.DoesNotExist:
-                logger.error(f"Nenhuma transação encontrada para correlation_id: {correlation_id}")
-                return HttpResponse(status=404)
+        # Gravar o evento na caixa de entrada; o processamento é feito pelo comando process_webhooks
+        from .webhooks import enqueue_webhook
+        from .models import WebhookEvent
+        event, created = enqueue_webhook(WebhookEvent.Provider.OPENPIX, payload, payload.get('event'))
+        if created:
+            logger.info(f"Webhook {event.id} gravado para processamento")
+        else:
+            logger.info(f"Webhook repetido ignorado: {event.event_key}")
+        return HttpResponse(status=200)
     
     except Exception as e:
         logger.exception(f"Erro ao processar webhook: {str(e)}")
@@ -233,36 +182,21 @@ def pix_webhook(request):
 
 def check_payment_status(request, payment_id):
     """
-    Endpoint AJAX para verificar o status de um pagamento.
+    Endpoint AJAX para verificar o status de um pagamento. Responde só com o
+    banco (a consulta à OpenPix é feita pelo comando poll_pix_charges).
     """
     payment = get_object_or_404(
-        PaymentTransaction, 
+        PaymentTransaction.objects.select_related('enrollment'),
         id=payment_id, 
         enrollment__student=request.user,
         payment_method='PIX'
     )
     
-    if payment.status == PaymentTransaction.Status.PENDING:
-        try:
-            openpix = OpenPixService()
-            status_data = openpix.get_charge_status(payment.correlation_id)
-            
-            if status_data.get('status') == 'COMPLETED':
-                payment.status = PaymentTransaction.Status.PAID
-                payment.payment_date = timezone.now()
-                payment.save()
-                
-                # Atualizar status da matrícula
-                enrollment = payment.enrollment
-                enrollment.status = Enrollment.Status.ACTIVE
-                enrollment.save()
-                
-                return JsonResponse({
-                    'status': 'PAID',
-                    'redirect_url': reverse('courses:student:course_learn', kwargs={'pk': enrollment.course.id})
-                })
-        except Exception as e:
-            return JsonResponse({'status': 'ERROR', 'message': str(e)}, status=500)
+    if payment.status == PaymentTransaction.Status.PAID:
+        return JsonResponse({
+            'status': 'PAID',
+            'redirect_url': reverse('courses:student:course_learn', kwargs={'pk': payment.enrollment.course_id})
+        })
     
     return JsonResponse({'status': payment.status})
 
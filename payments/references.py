@@ -0,0 +1,82 @@
+"""
+Índice de referências externas de pagamento (PaymentReference).
+
+Os webhooks da OpenPix e da Pagar.me identificam a cobrança pelo
+correlation_id (ou pelo ID da transação). Em vez de procurar esse valor nas
+tabelas de transações e de vendas avulsas, que não têm índice nessas
+colunas, a busca é feita neste índice, que aponta diretamente para o
+pagamento.
+"""
+from django.db import transaction
+
+from .models import PaymentReference, PaymentTransaction, SingleSale
+
+
+def payment_references(payment):
+    """Identificadores externos do pagamento que entram no índice."""
+    if isinstance(payment, PaymentTransaction):
+        values = (payment.correlation_id, payment.transaction_id)
+    else:
+        values = (payment.correlation_id,)
+    return {value.strip() for value in values if value and value.strip()}
+
+
+def _target(payment):
+    if isinstance(payment, PaymentTransaction):
+        return {'transaction': payment, 'sale': None}
+    return {'transaction': None, 'sale': payment}
+
+
+def index_payment(payment, previous=None):
+    """
+    Atualiza as referências do pagamento. previous são as referências antes
+    da alteração; quando forem iguais às atuais nada é gravado.
+    """
+    current = payment_references(payment)
+    if previous is not None and current == previous:
+        return
+
+    target = _target(payment)
+    filters = {'transaction': payment} if target['transaction'] else {'sale': payment}
+    PaymentReference.objects.filter(**filters).exclude(reference__in=current).delete()
+    if current:
+        PaymentReference.objects.bulk_create(
+            [PaymentReference(reference=reference, **target) for reference in current],
+            update_conflicts=True,
+            unique_fields=['reference'],
+            update_fields=['transaction', 'sale']
+        )
+
+
+def resolve_payment(reference):
+    """
+    Transação (com matrícula e curso) ou venda avulsa do identificador
+    externo, em uma única consulta. Retorna None se não houver.
+    """
+    if not reference:
+        return None
+    entry = (
+        PaymentReference.objects
+        .select_related('transaction__enrollment__course', 'sale')
+        .filter(reference=reference.strip())
+        .first()
+    )
+    return entry.payment if entry else None
+
+
+def rebuild_payment_references():
+    """Recria o índice a partir das transações e vendas avulsas. Retorna o total de referências."""
+    entries = {}
+    for model in (SingleSale, PaymentTransaction):
+        fields = ['pk', 'correlation_id'] + (['transaction_id'] if model is PaymentTransaction else [])
+        target = 'transaction_id' if model is PaymentTransaction else 'sale_id'
+        for pk, *values in model.objects.values_list(*fields).iterator():
+            for value in values:
+                if value and value.strip():
+                    # Em caso de repetição prevalece a transação, como no webhook original
+                    entries[value.strip()] = PaymentReference(reference=value.strip(), **{target: pk})
+
+    with transaction.atomic():
+        PaymentReference.objects.all().delete()
+        PaymentReference.objects.bulk_create(entries.values(), batch_size=1000)
+    return len(entries)
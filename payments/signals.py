@@ -0,0 +1,213 @@
+"""
+Sinais para o aplicativo de pagamentos.
+
+Mantêm o resumo materializado por professor (ProfessorFinancialSummary) e o
+rollup diário de receita (DailyRevenue) atualizados de forma incremental a
+partir das mudanças em transações, vendas avulsas, matrículas e cursos, além
+do índice de referências externas de pagamento (PaymentReference).
+"""
+from decimal import Decimal
+
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from courses.models import Course, Enrollment
+from .aggregates import adjust_professor_summary, rebuild_professor_summaries, move_revenue, revenue_date
+from .models import PaymentTransaction, SingleSale, DailyRevenue
+from .references import index_payment
+
+
+def _enrollment_owner(enrollment_id):
+    """Retorna a tupla (professor_id, course_id) da matrícula."""
+    owner = Enrollment.objects.filter(pk=enrollment_id).values_list('course__professor_id', 'course_id').first()
+    return owner or (None, None)
+
+
+def _entry(professor_id, course_id, source, status, amount, created_at):
+    """Bucket do rollup diário e valor de uma transação ou venda avulsa."""
+    bucket = (professor_id, course_id, source, revenue_date(created_at), status)
+    return bucket, Decimal(str(amount or 0))
+
+
+def _paid_amount(entry):
+    if entry is None or entry[0][4] != PaymentTransaction.Status.PAID:
+        return Decimal('0')
+    return entry[1]
+
+
+def _apply_paid_revenue(previous, current):
+    """Aplica ao resumo dos professores a variação da receita paga."""
+    previous_professor_id = previous[0][0] if previous else None
+    current_professor_id = current[0][0] if current else None
+    previous_paid, current_paid = _paid_amount(previous), _paid_amount(current)
+
+    if previous_professor_id == current_professor_id:
+        if current_paid != previous_paid:
+            adjust_professor_summary(current_professor_id, revenue=current_paid - previous_paid)
+        return
+
+    if previous_paid:
+        adjust_professor_summary(previous_professor_id, revenue=-previous_paid)
+    if current_paid:
+        adjust_professor_summary(current_professor_id, revenue=current_paid)
+
+
+@receiver(pre_save, sender=PaymentTransaction)
+def remember_transaction_state(sender, instance, **kwargs):
+    """
+    Guarda status, valor, matrícula e referências externas anteriores da
+    transação para calcular, no post_save, a variação do rollup diário e da
+    receita paga e saber se o índice de referências precisa mudar.
+    """
+    instance._previous_state = None
+    instance._previous_references = None
+    if instance.pk:
+        previous = PaymentTransaction.objects.filter(pk=instance.pk).values_list(
+            'status', 'amount', 'enrollment_id', 'correlation_id', 'transaction_id'
+        ).first()
+        if previous:
+            instance._previous_state = previous[:3]
+            instance._previous_references = {value.strip() for value in previous[3:] if value and value.strip()}
+
+
+@receiver(post_save, sender=PaymentTransaction)
+def transaction_saved(sender, instance, created, **kwargs):
+    """
+    Move a transação para o bucket correto do rollup diário, aplica ao
+    resumo do professor a diferença de receita paga e atualiza as referências
+    externas. Cobre mark_as_paid, refund e os webhooks, que sempre salvam a
+    transação.
+    """
+    professor_id, course_id = _enrollment_owner(instance.enrollment_id)
+    current = _entry(
+        professor_id, course_id, DailyRevenue.Source.ENROLLMENT,
+        instance.status, instance.amount, instance.created_at
+    )
+
+    previous = None
+    previous_state = getattr(instance, '_previous_state', None)
+    if not created and previous_state is not None:
+        previous_status, previous_amount, previous_enrollment_id = previous_state
+        if previous_enrollment_id == instance.enrollment_id:
+            previous_owner = (professor_id, course_id)
+        else:
+            previous_owner = _enrollment_owner(previous_enrollment_id)
+        previous = _entry(
+            *previous_owner, DailyRevenue.Source.ENROLLMENT,
+            previous_status, previous_amount, instance.created_at
+        )
+
+    move_revenue(previous, current)
+    _apply_paid_revenue(previous, current)
+    index_payment(instance, set() if created else getattr(instance, '_previous_references', None))
+
+
+@receiver(post_delete, sender=PaymentTransaction)
+def transaction_deleted(sender, instance, **kwargs):
+    """Remove a transação excluída do rollup diário e do resumo do professor."""
+    professor_id, course_id = _enrollment_owner(instance.enrollment_id)
+    previous = _entry(
+        professor_id, course_id, DailyRevenue.Source.ENROLLMENT,
+        instance.status, instance.amount, instance.created_at
+    )
+    move_revenue(previous, None)
+    _apply_paid_revenue(previous, None)
+
+
+@receiver(pre_save, sender=SingleSale)
+def remember_sale_state(sender, instance, **kwargs):
+    """Guarda status, valor, vendedor e referências anteriores da venda avulsa."""
+    instance._previous_state = None
+    instance._previous_references = None
+    if instance.pk:
+        previous = SingleSale.objects.filter(pk=instance.pk).values_list(
+            'status', 'amount', 'seller_id', 'correlation_id'
+        ).first()
+        if previous:
+            instance._previous_state = previous[:3]
+            instance._previous_references = {value.strip() for value in previous[3:] if value and value.strip()}
+
+
+@receiver(post_save, sender=SingleSale)
+def sale_saved(sender, instance, created, **kwargs):
+    """
+    Move a venda avulsa para o bucket correto do rollup diário
+    (mark_as_paid, mark_as_refunded, webhooks e edições) e atualiza suas
+    referências externas.
+    """
+    current = _entry(
+        instance.seller_id, None, DailyRevenue.Source.SINGLE_SALE,
+        instance.status, instance.amount, instance.created_at
+    )
+
+    previous = None
+    previous_state = getattr(instance, '_previous_state', None)
+    if not created and previous_state is not None:
+        previous_status, previous_amount, previous_seller_id = previous_state
+        previous = _entry(
+            previous_seller_id, None, DailyRevenue.Source.SINGLE_SALE,
+            previous_status, previous_amount, instance.created_at
+        )
+
+    move_revenue(previous, current)
+    index_payment(instance, set() if created else getattr(instance, '_previous_references', None))
+
+
+@receiver(post_delete, sender=SingleSale)
+def sale_deleted(sender, instance, **kwargs):
+    """Remove a venda avulsa excluída do rollup diário."""
+    move_revenue(
+        _entry(
+            instance.seller_id, None, DailyRevenue.Source.SINGLE_SALE,
+            instance.status, instance.amount, instance.created_at
+        ),
+        None
+    )
+
+
+@receiver(post_save, sender=Enrollment)
+def enrollment_created(sender, instance, created, **kwargs):
+    """Conta a nova matrícula no resumo do professor do curso."""
+    if created:
+        adjust_professor_summary(instance.course.professor_id, enrollments_count=1)
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, **kwargs):
+    """Desconta a matrícula excluída do resumo do professor do curso."""
+    professor_id = Course.objects.filter(pk=instance.course_id).values_list('professor_id', flat=True).first()
+    adjust_professor_summary(professor_id, enrollments_count=-1)
+
+
+@receiver(pre_save, sender=Course)
+def remember_course_professor(sender, instance, **kwargs):
+    """Guarda o professor anterior do curso para detectar transferências."""
+    instance._previous_professor_id = None
+    if instance.pk:
+        instance._previous_professor_id = Course.objects.filter(pk=instance.pk).values_list(
+            'professor_id', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=Course)
+def course_saved(sender, instance, created, **kwargs):
+    """
+    Conta o novo curso no resumo do professor ou, quando o curso muda de
+    professor, transfere o rollup diário do curso e recalcula os resumos dos
+    dois professores envolvidos.
+    """
+    previous_professor_id = getattr(instance, '_previous_professor_id', None)
+    if created or previous_professor_id is None:
+        adjust_professor_summary(instance.professor_id, courses_count=1)
+    elif previous_professor_id != instance.professor_id:
+        DailyRevenue.objects.filter(course=instance).update(professor_id=instance.professor_id)
+        rebuild_professor_summaries([previous_professor_id, instance.professor_id])
+
+
+@receiver(post_delete, sender=Course)
+def course_deleted(sender, instance, **kwargs):
+    """
+    Desconta o curso excluído do resumo do professor. As matrículas e
+    transações removidas em cascata são descontadas pelos próprios sinais.
+    """
+    adjust_professor_summary(instance.professor_id, courses_count=-1)
@@ -3,7 +3,7 @@ from django.urls import reverse_lazy, reverse
 from django.views.generic import TemplateView, ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Q
+from django.db.models import Sum, Count, Q
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.contrib import messages
@@ -16,7 +16,8 @@ from django.core.cache import cache
 
 from courses.views import ProfessorRequiredMixin, AdminRequiredMixin, StudentRequiredMixin
 from courses.models import Course, Enrollment
-from .models import PaymentTransaction, SingleSale
+from .models import PaymentTransaction, SingleSale, DailyRevenue
+from .aggregates import get_financial_summary, professor_leaderboard, revenue_totals, transaction_totals
 from .openpix_service import OpenPixService
 from payments.forms import SingleSaleForm
 
@@ -36,92 +37,37 @@ class ProfessorFinancialDashboardView(LoginRequiredMixin, ProfessorRequiredMixin
         context = super().get_context_data(**kwargs)
         professor = self.request.user
 
-        # Cursos do professor
-        courses = Course.objects.filter(professor=professor)
-        context['courses'] = courses
-        context['courses_count'] = courses.count()
-
-        # Matrículas nos cursos do professor
-        enrollments = Enrollment.objects.filter(course__professor=professor)
-        context['enrollments_count'] = enrollments.count()
-
-        # Estatísticas financeiras
-        transactions = PaymentTransaction.objects.filter(
-            enrollment__course__professor=professor)
-
-        # Total recebido (status PAID)
-        total_paid = transactions.filter(status=PaymentTransaction.Status.PAID).aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-        context['total_received'] = total_paid
-
-        # Total pendente (status PENDING)
-        total_pending = transactions.filter(status=PaymentTransaction.Status.PENDING).aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-        context['total_pending'] = total_pending
-
-        # Estatísticas de alunos
-        # Usar anotações para contar apenas os alunos com matrículas ativas
-        from django.db.models import Count, Q
-
-        # Alunos com matrículas ativas nos cursos do professor
-        active_students = User.objects.filter(
-            user_type=User.Types.STUDENT,
-            enrollments__course__professor=professor,
-            enrollments__status=Enrollment.Status.ACTIVE
-        ).distinct()
-        context['active_students_count'] = active_students.count()
-
-        # Alunos recentes (matriculados nos últimos 30 dias)
-        thirty_days_ago = timezone.now() - timedelta(days=30)
-        recent_students = User.objects.filter(
-            user_type=User.Types.STUDENT,
-            enrollments__course__professor=professor,
-            enrollments__enrolled_at__gte=thirty_days_ago
-        ).distinct()
-        context['recent_students_count'] = recent_students.count()
-
-        # Total por curso
-        course_stats = []
-        for course in courses:
-            course_enrollments = enrollments.filter(course=course).count()
-            course_paid = transactions.filter(
-                enrollment__course=course,
-                status=PaymentTransaction.Status.PAID
-            ).aggregate(total=Sum('amount'))['total'] or 0
-
-            course_stats.append({
-                'course': course,
-                'enrollments': course_enrollments,
-                'total_paid': course_paid
-            })
-
-        context['course_stats'] = course_stats
+        # Métricas agregadas (matrículas, valores, alunos e notas fiscais)
+        summary = get_financial_summary(professor)
+        context.update({
+            'courses': [stat['course'] for stat in summary['course_stats']],
+            'courses_count': summary['courses_count'],
+            'enrollments_count': summary['enrollments_count'],
+            'total_received': summary['total_received'],
+            'total_pending': summary['total_pending'],
+            'active_students_count': summary['active_students_count'],
+            'recent_students_count': summary['recent_students_count'],
+            'course_stats': summary['course_stats'],
+        })
 
         # Transações recentes
-        context['recent_transactions'] = transactions.order_by(
-            '-created_at')[:5]
+        context['recent_transactions'] = PaymentTransaction.objects.filter(
+            enrollment__course__professor=professor
+        ).order_by('-created_at')[:5]
 
         # Notas fiscais (nova seção)
         try:
             from invoices.models import Invoice
-            # Contagem de notas fiscais por status
-            invoices = Invoice.objects.filter(
-                transaction__enrollment__course__professor=professor)
-            context['invoices_count'] = invoices.count()
-
-            # Notas por status
-            context['invoices_approved'] = invoices.filter(
-                status='approved').count()
-            context['invoices_pending'] = invoices.filter(
-                status='pending').count()
-            context['invoices_processing'] = invoices.filter(
-                status='processing').count()
-            context['invoices_error'] = invoices.filter(status='error').count()
+            context['invoices_count'] = summary['invoices_count']
+            context['invoices_approved'] = summary['invoices_approved']
+            context['invoices_pending'] = summary['invoices_pending']
+            context['invoices_processing'] = summary['invoices_processing']
+            context['invoices_error'] = summary['invoices_error']
 
             # Notas fiscais recentes (últimas 5)
-            context['recent_invoices'] = invoices.order_by('-created_at')[:5]
+            context['recent_invoices'] = Invoice.objects.filter(
+                transaction__enrollment__course__professor=professor
+            ).order_by('-created_at')[:5]
 
             # Verificar se o professor possui configuração fiscal
             from invoices.models import CompanyConfig
@@ -387,89 +333,43 @@ class AdminFinancialDashboardView(LoginRequiredMixin, AdminRequiredMixin, Templa
 
         # Estatísticas gerais
         transactions = PaymentTransaction.objects.all()
-        enrollments = Enrollment.objects.all()
-        courses = Course.objects.all()
         professors = User.objects.filter(user_type='PROFESSOR')
 
-        context['total_courses'] = courses.count()
-        context['total_enrollments'] = enrollments.count()
+        # Totais da plataforma, transações por status e notas fiscais
+        summary = get_financial_summary()
+        context['total_courses'] = summary['courses_count']
+        context['total_enrollments'] = summary['enrollments_count']
         context['total_professors'] = professors.count()
 
-        # Transações por status
-        total_paid = transactions.filter(status=PaymentTransaction.Status.PAID).aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-
-        total_pending = transactions.filter(status=PaymentTransaction.Status.PENDING).aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-
-        total_refunded = transactions.filter(status=PaymentTransaction.Status.REFUNDED).aggregate(
-            total=Sum('amount')
-        )['total'] or 0
+        context['total_received'] = summary['total_received']
+        context['total_pending'] = summary['total_pending']
+        context['total_refunded'] = summary['total_refunded']
+        context['total_transactions'] = summary['total_transactions']
 
-        context['total_received'] = total_paid
-        context['total_pending'] = total_pending
-        context['total_refunded'] = total_refunded
-        context['total_transactions'] = transactions.count()
+        context['invoices_count'] = summary['invoices_count']
+        context['invoices_approved'] = summary['invoices_approved']
+        context['invoices_pending'] = summary['invoices_pending']
+        context['invoices_processing'] = summary['invoices_processing']
+        context['invoices_error'] = summary['invoices_error']
 
-        # Notas fiscais
+        # Notas fiscais recentes (últimas 5)
         try:
             from invoices.models import Invoice
-            # Contagem de notas fiscais por status
-            invoices = Invoice.objects.all()
-            context['invoices_count'] = invoices.count()
-
-            # Notas por status
-            context['invoices_approved'] = invoices.filter(
-                status='approved').count()
-            context['invoices_pending'] = invoices.filter(
-                status='pending').count()
-            context['invoices_processing'] = invoices.filter(
-                status='processing').count()
-            context['invoices_error'] = invoices.filter(status='error').count()
-
-            # Notas fiscais recentes (últimas 5)
-            context['recent_invoices'] = invoices.order_by('-created_at')[:5]
+            context['recent_invoices'] = Invoice.objects.order_by('-created_at')[:5]
         except ImportError:
             # App de notas fiscais não disponível
-            context['invoices_count'] = 0
-            context['invoices_approved'] = 0
-            context['invoices_pending'] = 0
-            context['invoices_processing'] = 0
-            context['invoices_error'] = 0
             context['recent_invoices'] = []
 
-        # Resumo por professor
-        professor_stats = []
-        for professor in professors:
-            prof_courses = courses.filter(professor=professor).count()
-            prof_enrollments = enrollments.filter(
-                course__professor=professor).count()
-            prof_revenue = transactions.filter(
-                enrollment__course__professor=professor,
-                status=PaymentTransaction.Status.PAID
-            ).aggregate(total=Sum('amount'))['total'] or 0
-
-            professor_stats.append({
-                'professor': professor,
-                'courses': prof_courses,
-                'enrollments': prof_enrollments,
-                'revenue': prof_revenue
-            })
-
-        # Ordenar por receita (do maior para o menor)
-        professor_stats.sort(key=lambda x: x['revenue'], reverse=True)
-        context['professor_stats'] = professor_stats[:10]  # Top 10 professores
+        # Top 10 professores por receita (resumo materializado)
+        context['professor_stats'] = professor_leaderboard(10)
 
-        # Top cursos por receita
+        # Top cursos por receita (rollup diário)
         top_courses = Course.objects.annotate(
             revenue=Sum(
-                'enrollments__payments__amount',
-                filter=Q(
-                    enrollments__payments__status=PaymentTransaction.Status.PAID)
+                'daily_revenue__amount_sum',
+                filter=Q(daily_revenue__status=PaymentTransaction.Status.PAID)
             )
-        ).filter(revenue__isnull=False).order_by('-revenue')[:10]
+        ).filter(revenue__isnull=False).select_related('professor').order_by('-revenue')[:10]
 
         context['top_courses'] = top_courses
 
@@ -815,6 +715,9 @@ class SingleSaleListView(ProfessorRequiredMixin, ListView):
     context_object_name = 'sales'
     paginate_by = 20
 
+    # Filtros que o rollup diário não consegue reproduzir
+    ROLLUP_UNSUPPORTED_FILTERS = ('search', 'due_start_date', 'due_end_date', 'type')
+
     def get_paginate_by(self, queryset):
         paginate_by = self.request.GET.get('paginate_by')
         if paginate_by == 'all':
@@ -890,24 +793,32 @@ class SingleSaleListView(ProfessorRequiredMixin, ListView):
         context['start_date'] = self.request.GET.get('start_date', '')
         context['end_date'] = self.request.GET.get('end_date', '')
 
-        # Totalizadores
-        total_amount = self.get_queryset().aggregate(
-            Sum('amount'))['amount__sum'] or 0
-        total_paid = self.get_queryset().filter(
-            status=SingleSale.Status.PAID).aggregate(Sum('amount'))['amount__sum'] or 0
-        total_pending = self.get_queryset().filter(
-            status=SingleSale.Status.PENDING).aggregate(Sum('amount'))['amount__sum'] or 0
+        # Totalizadores: sem busca ou filtros de vencimento/tipo, os valores
+        # vêm do rollup diário; caso contrário, de uma única consulta agregada
+        queryset = self.get_queryset()
+        if any(self.request.GET.get(name) for name in self.ROLLUP_UNSUPPORTED_FILTERS):
+            totals = transaction_totals(queryset)
+        else:
+            totals = revenue_totals(
+                self.request.user,
+                source=DailyRevenue.Source.SINGLE_SALE,
+                start=self.request.GET.get('start_date'),
+                end=self.request.GET.get('end_date'),
+                status=self.request.GET.get('status'),
+            )
 
-        context['total_amount'] = total_amount
-        context['total_paid'] = total_paid
-        context['total_pending'] = total_pending
+        context['total_amount'] = totals['total_amount']
+        context['total_paid'] = totals['paid_amount']
+        context['total_pending'] = totals['pending_amount']
 
         # Estatísticas de recorrência
-        total_recurring = self.get_queryset().filter(is_recurring=True).count()
-        total_with_recurrence = self.get_queryset().filter(recurrence_count__gt=0).count()
+        recurrence = queryset.order_by().aggregate(
+            total_recurring=Count('id', filter=Q(is_recurring=True)),
+            total_with_recurrence=Count('id', filter=Q(recurrence_count__gt=0)),
+        )
 
-        context['total_recurring'] = total_recurring
-        context['total_with_recurrence'] = total_with_recurrence
+        context['total_recurring'] = recurrence['total_recurring']
+        context['total_with_recurrence'] = recurrence['total_with_recurrence']
 
         return context
 
@@ -1168,7 +1079,8 @@ def singlesale_pix_detail(request, sale_id):
 @login_required
 def check_singlesale_payment_status(request, sale_id):
     """
-    Verifica o status do pagamento via API e atualiza o status da venda.
+    Retorna o status da venda avulsa a partir do banco. A confirmação na
+    OpenPix é feita pelo webhook e pelo comando poll_pix_charges.
     """
     sale = get_object_or_404(SingleSale, id=sale_id)
 
@@ -1176,56 +1088,11 @@ def check_singlesale_payment_status(request, sale_id):
     if request.user != sale.seller and not request.user.is_superuser:
         return JsonResponse({'error': 'Permissão negada'}, status=403)
 
-    # Se já está pago, apenas retorna o status
-    if sale.status == SingleSale.Status.PAID:
-        return JsonResponse({
-            'status': sale.status,
-            'status_display': sale.get_status_display(),
-            'paid_at': sale.paid_at.isoformat() if sale.paid_at else None
-        })
-
-    # Consulta a API da OpenPix para verificar o status
-    openpix_service = OpenPixService()
-
-    try:
-        payment_info = openpix_service.get_charge(sale.correlation_id)
-
-        if payment_info and payment_info.get('status') == 'COMPLETED':
-            # Atualiza o status para pago
-            sale.mark_as_paid()
-
-            # Tenta emitir nota fiscal, se disponível
-            try:
-                from invoices.models import Invoice
-                invoice = Invoice.objects.create(
-                    type='rps',
-                    transaction=None,  # Não é uma transação de matrícula
-                    singlesale=sale,  # Relaciona com a venda avulsa
-                    amount=sale.amount,
-                    customer_name=sale.customer_name,
-                    customer_email=sale.customer_email,
-                    customer_tax_id=sale.customer_cpf,
-                    description=sale.description,
-                    status='pending'
-                )
-                # O processamento posterior é feito por signals ou tarefas assíncronas
-            except (ImportError, Exception) as e:
-                print(f"Erro ao criar nota fiscal: {e}")
-
-            return JsonResponse({
-                'status': sale.status,
-                'status_display': sale.get_status_display(),
-                'paid_at': sale.paid_at.isoformat()
-            })
-
-        # Retorna o status atual
-        return JsonResponse({
-            'status': sale.status,
-            'status_display': sale.get_status_display()
-        })
-
-    except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
+    return JsonResponse({
+        'status': sale.status,
+        'status_display': sale.get_status_display(),
+        'paid_at': sale.paid_at.isoformat() if sale.paid_at else None
+    })
 
 
 class SingleSaleAdminListView(LoginRequiredMixin, AdminRequiredMixin, ListView):
@@ -1785,7 +1652,9 @@ def _create_monthly_recurring_sales(main_sale, data, recurrence_count, base_due_
 @login_required
 def bulk_generate_invoices(request):
     """
-    Gera notas fiscais em massa para vendas selecionadas.
+    Cria um lote de emissão de notas fiscais para as vendas selecionadas.
+    As notas são enviadas à NFE.io em segundo plano; o andamento é
+    consultado em status_url.
     """
     if request.method != 'POST':
         return JsonResponse({'error': 'Método não permitido'}, status=405)
@@ -1793,159 +1662,48 @@ def bulk_generate_invoices(request):
     if not request.user.is_professor:
         return JsonResponse({'error': 'Permissão negada'}, status=403)
 
+    from invoices.bulk import InvoiceJobError, create_invoice_job
+
     try:
         # Obter IDs das vendas selecionadas
-        selected_ids = request.POST.getlist('sale_ids[]')
+        selected_ids = set(request.POST.getlist('sale_ids[]'))
 
         if not selected_ids:
             return JsonResponse({'error': 'Nenhuma venda selecionada'}, status=400)
 
         # Validar que todas as vendas pertencem ao usuário
-        sales = SingleSale.objects.filter(
+        sales = list(SingleSale.objects.filter(
             id__in=selected_ids,
             seller=request.user
-        )
+        ))
 
-        if sales.count() != len(selected_ids):
+        if len(sales) != len(selected_ids):
             return JsonResponse({'error': 'Algumas vendas não foram encontradas'}, status=400)
 
-        # Contadores para o resultado
-        success_count = 0
-        error_count = 0
-        already_has_invoice = 0
-        errors = []
+        try:
+            job = create_invoice_job(request.user, sales)
+        except InvoiceJobError as e:
+            return JsonResponse({'error': str(e)}, status=400)
 
-        for sale in sales:
-            try:
-                # Verificar se já existe nota fiscal para esta venda
-                try:
-                    from invoices.models import Invoice
-                    existing_invoice = Invoice.objects.filter(
-                        singlesale=sale).first()
-                    if existing_invoice:
-                        already_has_invoice += 1
-                        continue
-                except ImportError:
-                    pass
-
-                # Tentar gerar a nota fiscal
-                result = _generate_invoice_for_sale(sale, request.user)
-
-                if result.get('success'):
-                    success_count += 1
-                else:
-                    error_count += 1
-                    errors.append(
-                        f"Venda #{sale.id}: {result.get('error', 'Erro desconhecido')}")
-
-            except Exception as e:
-                error_count += 1
-                errors.append(f"Venda #{sale.id}: {str(e)}")
-
-        # Preparar resposta
         message_parts = []
-        if success_count > 0:
-            message_parts.append(
-                f"{success_count} nota(s) gerada(s) com sucesso")
-        if already_has_invoice > 0:
-            message_parts.append(
-                f"{already_has_invoice} venda(s) já possuía(m) nota fiscal")
-        if error_count > 0:
-            message_parts.append(f"{error_count} erro(s) encontrado(s)")
-
-        response_data = {
-            'success': success_count > 0 or already_has_invoice > 0,
+        if job.total:
+            message_parts.append(f"{job.total} nota(s) enviada(s) para emissão")
+        if job.skipped:
+            message_parts.append(f"{job.skipped} venda(s) já possuía(m) nota fiscal")
+
+        return JsonResponse({
+            'success': True,
             'message': '; '.join(message_parts),
+            'job_id': job.id,
+            'status_url': reverse('invoices:job_status', kwargs={'job_id': job.id}),
             'details': {
-                'success_count': success_count,
-                'error_count': error_count,
-                'already_has_invoice': already_has_invoice,
-                'errors': errors
+                'total': job.total,
+                'already_has_invoice': job.skipped,
             }
-        }
-
-        return JsonResponse(response_data)
+        }, status=202)
 
     except Exception as e:
         import traceback
         print(f"Erro em bulk_generate_invoices: {str(e)}")
         print(traceback.format_exc())
         return JsonResponse({'error': f'Erro interno: {str(e)}'}, status=500)
-
-
-def _generate_invoice_for_sale(sale, user):
-    """
-    Função auxiliar para gerar nota fiscal para uma venda específica.
-    Usa exatamente o mesmo fluxo da emissão individual.
-    """
-    try:
-        # Importar o modelo de Invoice
-        from invoices.models import Invoice
-        from invoices.services import NFEioService
-
-        # Verificar se já existe uma nota fiscal para esta venda
-        existing_invoice = Invoice.objects.filter(singlesale=sale).first()
-        if existing_invoice:
-            return {'success': False, 'error': 'Nota fiscal já existe'}
-
-        # Verificar se o professor tem as configurações fiscais completas
-        try:
-            company_config = user.company_config
-            if not company_config.enabled:
-                return {'success': False, 'error': 'A emissão de notas fiscais não está habilitada. Verifique suas configurações fiscais.'}
-
-            if not company_config.is_complete():
-                return {'success': False, 'error': 'Configure todas as informações fiscais antes de emitir notas fiscais.'}
-        except Exception:
-            return {'success': False, 'error': 'Configure suas informações fiscais antes de emitir notas fiscais.'}
-
-        # Criar a invoice no banco de dados (mesmo fluxo da emissão individual)
-        invoice = Invoice.objects.create(
-            singlesale=sale,
-            amount=sale.amount,
-            customer_name=sale.customer_name,
-            customer_email=sale.customer_email,
-            customer_tax_id=sale.customer_cpf,
-            description=sale.description,
-            type=sale.invoice_type or 'rps',
-            status='pending'
-        )
-
-        # Iniciar o processo de emissão da nota fiscal (mesmo fluxo da emissão individual)
-        try:
-            # Inicializar o serviço NFE.io
-            service = NFEioService()
-
-            # Gerar número RPS
-            service._generate_rps_for_invoice(invoice, user)
-
-            # Emitir a nota fiscal
-            result = service.emit_invoice(invoice)
-
-            if not result.get('error', False):
-                # Atualizar o status da invoice
-                invoice.status = 'processing'
-                invoice.emitted_at = timezone.now()
-                invoice.save()
-
-                return {'success': True, 'invoice_id': invoice.id, 'message': 'Nota fiscal enviada para processamento'}
-            else:
-                # Em caso de erro, atualizar o status da invoice
-                invoice.status = 'error'
-                invoice.error_message = result.get(
-                    'message', 'Erro desconhecido ao enviar para emissão.')
-                invoice.save()
-
-                return {'success': False, 'error': result.get('message', 'Erro desconhecido ao enviar para emissão.')}
-        except Exception as e:
-            invoice.status = 'error'
-            invoice.error_message = str(e)
-            invoice.save()
-
-            return {'success': False, 'error': str(e)}
-
-    except ImportError:
-        return {'success': False, 'error': 'Módulo de notas fiscais não disponível'}
-    except Exception as e:
-        return {'success': False, 'error': str(e)}
-
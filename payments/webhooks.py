@@ -0,0 +1,202 @@
+"""
+Caixa de entrada e processamento dos webhooks de pagamento.
+
+Os webhooks (pix_webhook e card_webhook) apenas validam a requisição, gravam
+o payload em WebhookEvent e respondem 200, sem depender do tempo das
+atualizações no banco. Reenvios do gateway caem na mesma chave única e não
+são gravados de novo.
+
+O comando process_webhooks esvazia a caixa em lotes. Cada lote é
+selecionado com select_for_update(skip_locked=True), então vários workers
+podem rodar em paralelo sem pegar os mesmos eventos. O processamento é
+idempotente (pagamentos já pagos não são alterados) e estornos são
+definitivos: um reenvio atrasado de "pago" não reativa um pagamento estornado.
+Eventos com erro são tentados de novo com espera crescente até
+WEBHOOK_MAX_ATTEMPTS.
+"""
+import hashlib
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from courses.models import Enrollment
+from .models import PaymentTransaction, SingleSale, WebhookEvent
+from .references import resolve_payment
+
+logger = logging.getLogger('payments')
+
+# Eventos processados por lote (e por transação) no worker
+WEBHOOK_BATCH_SIZE = 50
+
+# Status da Pagar.me para os status da transação (os demais mantêm a transação pendente)
+PAGARME_STATUS_MAP = {
+    'paid': PaymentTransaction.Status.PAID,
+    'refunded': PaymentTransaction.Status.REFUNDED,
+    'chargedback': PaymentTransaction.Status.REFUNDED,
+    'refused': PaymentTransaction.Status.FAILED,
+}
+
+
+class WebhookPaymentNotFound(Exception):
+    """O pagamento do evento ainda não existe (pode ser gravado logo em seguida)."""
+
+
+def _event_key(*parts):
+    key = ':'.join(str(part or '') for part in parts)
+    # Chaves longas demais para a coluna são reduzidas a um hash
+    return key if len(key) <= 255 else hashlib.sha256(key.encode()).hexdigest()
+
+
+def openpix_event_key(payload):
+    charge = payload.get('charge') or {}
+    return _event_key(payload.get('event'), charge.get('correlationID'), charge.get('status'))
+
+
+def pagarme_event_key(payload):
+    return _event_key(payload.get('id'), payload.get('current_status'))
+
+
+EVENT_KEYS = {
+    WebhookEvent.Provider.OPENPIX: openpix_event_key,
+    WebhookEvent.Provider.PAGARME: pagarme_event_key,
+}
+
+
+def enqueue_webhook(provider, payload, event_type=''):
+    """
+    Grava o evento na caixa de entrada. Retorna (evento, criado); um reenvio
+    do mesmo evento devolve o registro existente com criado=False.
+    """
+    event, created = WebhookEvent.objects.get_or_create(
+        provider=provider,
+        event_key=EVENT_KEYS[provider](payload),
+        defaults={'payload': payload, 'event_type': event_type or ''}
+    )
+    if created and getattr(settings, 'WEBHOOK_INLINE_PROCESSING', False):
+        # Sem worker (desenvolvimento): processa logo após gravar
+        process_event(event)
+    return event, created
+
+
+def process_openpix(payload):
+    """Confirma a transação de curso ou a venda avulsa da cobrança concluída."""
+    charge = payload.get('charge') or {}
+    correlation_id = charge.get('correlationID')
+    if payload.get('event') != 'CHARGE_COMPLETED' or not correlation_id or charge.get('status') != 'COMPLETED':
+        return WebhookEvent.Status.IGNORED
+
+    payment = resolve_payment(correlation_id)
+    if payment is None:
+        raise WebhookPaymentNotFound(f'Nenhuma transação encontrada para correlation_id: {correlation_id}')
+
+    confirm_pix_payment(payment, 'webhook')
+    return WebhookEvent.Status.PROCESSED
+
+
+def confirm_pix_payment(payment, source):
+    """
+    Marca como paga a transação de curso (ativando a matrícula) ou a venda
+    avulsa da cobrança PIX concluída. Retorna False se já estava paga ou
+    estornada.
+    """
+    if isinstance(payment, SingleSale):
+        if payment.status in (SingleSale.Status.PAID, SingleSale.Status.REFUNDED):
+            return False
+        payment.mark_as_paid()
+        logger.info(f"Pagamento confirmado para venda avulsa {payment.id} via {source}.")
+        return True
+
+    if payment.status in (PaymentTransaction.Status.PAID, PaymentTransaction.Status.REFUNDED):
+        return False
+    payment.status = PaymentTransaction.Status.PAID
+    payment.payment_date = timezone.now()
+    payment.save()
+
+    enrollment = payment.enrollment
+    enrollment.status = Enrollment.Status.ACTIVE
+    enrollment.save()
+    logger.info(f"Pagamento confirmado para matrícula {enrollment.id} via {source}.")
+    return True
+
+
+def process_pagarme(payload):
+    """Atualiza a transação de cartão conforme o status informado pela Pagar.me."""
+    transaction_id = payload.get('id')
+    payment = resolve_payment(str(transaction_id))
+    if not isinstance(payment, PaymentTransaction):
+        raise WebhookPaymentNotFound(f'Pagamento não encontrado: {transaction_id}')
+
+    new_status = PAGARME_STATUS_MAP.get(payload.get('current_status'))
+    if new_status is None or payment.status == new_status:
+        return WebhookEvent.Status.IGNORED
+    if payment.status == PaymentTransaction.Status.REFUNDED:
+        # Estorno (ou chargeback) é definitivo: reenvios atrasados não reativam o pagamento
+        return WebhookEvent.Status.IGNORED
+    if payment.status == PaymentTransaction.Status.PAID and new_status == PaymentTransaction.Status.FAILED:
+        # Notificação atrasada de recusa não desfaz um pagamento confirmado
+        return WebhookEvent.Status.IGNORED
+
+    old_status = payment.status
+    payment.status = new_status
+    if new_status == PaymentTransaction.Status.PAID:
+        payment.payment_date = timezone.now()
+        enrollment = payment.enrollment
+        enrollment.status = Enrollment.Status.ACTIVE
+        enrollment.save()
+        logger.info(f"Matrícula {enrollment.id} ativada pelo webhook")
+    payment.save()
+
+    logger.info(f"Status do pagamento {payment.id} atualizado: {old_status} -> {new_status}")
+    return WebhookEvent.Status.PROCESSED
+
+
+PROCESSORS = {
+    WebhookEvent.Provider.OPENPIX: process_openpix,
+    WebhookEvent.Provider.PAGARME: process_pagarme,
+}
+
+
+def process_event(event):
+    """
+    Processa um evento da caixa de entrada e grava o resultado. Em caso de
+    erro, agenda uma nova tentativa (1, 2, 4, 8... minutos) ou, esgotadas as
+    tentativas, marca o evento como FAILED.
+    """
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            event.status = PROCESSORS[event.provider](event.payload)
+    except Exception as e:
+        event.attempts += 1
+        event.last_error = str(e)
+        if event.attempts >= getattr(settings, 'WEBHOOK_MAX_ATTEMPTS', 5):
+            event.status = WebhookEvent.Status.FAILED
+            logger.error(f"Webhook {event.pk} falhou definitivamente: {e}")
+        else:
+            event.next_attempt_at = now + timedelta(minutes=2 ** (event.attempts - 1))
+            logger.warning(f"Webhook {event.pk} falhou (tentativa {event.attempts}): {e}")
+    else:
+        event.processed_at = now
+        event.last_error = ''
+    event.save(update_fields=['status', 'attempts', 'last_error', 'next_attempt_at', 'processed_at'])
+    return event.status
+
+
+def drain_inbox(batch_size=WEBHOOK_BATCH_SIZE):
+    """
+    Processa um lote de eventos pendentes. Os eventos do lote ficam travados
+    até o fim da transação; outros workers pulam esses registros e pegam os
+    seguintes. Retorna a quantidade de eventos processados.
+    """
+    with transaction.atomic():
+        events = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=WebhookEvent.Status.PENDING, next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at', 'pk')[:batch_size]
+        )
+        for event in events:
+            process_event(event)
+    return len(events)
@@ -1,16 +1,18 @@
-import requests
 import json
 from django.conf import settings
 from datetime import datetime, timedelta
 
+from core.http import GatewayClient
+
 class OpenPixService:
     BASE_URL = "https://api.openpix.com.br/api/v1"
     
-    def __init__(self):
+    def __init__(self, http=None):
         self.headers = {
             "Authorization": settings.OPENPIX_TOKEN,
             "Content-Type": "application/json"
         }
+        self.http = http or GatewayClient(self.BASE_URL, headers=self.headers)
     
     def create_charge(self, course, user, correlation_id=None):
         """
@@ -37,7 +39,7 @@ class OpenPixService:
             ]
         }
         
-        response = requests.post(
+        response = self.http.post(
             f"{self.BASE_URL}/charge",
             headers=self.headers,
             data=json.dumps(payload)
@@ -49,7 +51,7 @@ class OpenPixService:
         """
         Verifica o status de uma cobrança
         """
-        response = requests.get(
+        response = self.http.get(
             f"{self.BASE_URL}/charge/{correlation_id}",
             headers=self.headers
         )
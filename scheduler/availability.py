@@ -0,0 +1,257 @@
+"""
+Motor de disponibilidade dos estúdios (EventLocation).
+
+Carrega, em uma única consulta, os eventos ativos de um ou mais estúdios em
+um período e responde às perguntas de agenda sobre esse período sem novas
+consultas: conflitos de um horário, intervalos ocupados/livres de cada dia
+e os slots de uma hora usados pelo calendário.
+
+As ocorrências virtuais dos eventos recorrentes (ver scheduler/recurrence.py)
+entram na agenda junto com os eventos gravados.
+
+Os eventos de cada estúdio ficam ordenados pelo início, junto com o maior
+término acumulado (prefix max). Assim, a busca por conflitos usa bisect para
+descartar os eventos que começam depois do horário pedido e para de voltar
+assim que nenhum evento anterior pode alcançar o início do horário.
+"""
+from bisect import bisect_left
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Event
+from .recurrence import expand_event
+
+# Status que ocupam o estúdio (eventos cancelados ou concluídos não bloqueiam)
+BOOKING_STATUSES = ('SCHEDULED', 'CONFIRMED')
+
+# Horário de funcionamento padrão dos estúdios (0 = segunda ... 6 = domingo)
+DEFAULT_OPERATING_HOURS = {
+    0: [],  # Segunda
+    1: [(time(8, 0), time(20, 0))],  # Terça
+    2: [(time(8, 0), time(20, 0))],  # Quarta
+    3: [(time(8, 0), time(20, 0))],  # Quinta
+    4: [(time(8, 0), time(20, 0))],  # Sexta
+    5: [(time(9, 0), time(16, 0))],  # Sábado
+    6: [],  # Domingo
+}
+
+# Duração padrão dos slots oferecidos no calendário
+SLOT_DURATION = timedelta(hours=1)
+
+
+def _aware(value):
+    """Interpreta datetimes sem fuso no fuso local, como o ORM faz."""
+    if timezone.is_naive(value):
+        return timezone.make_aware(value)
+    return value
+
+
+def get_operating_hours(location):
+    """
+    Horário de funcionamento do estúdio. Todos os estúdios usam o horário
+    padrão enquanto EventLocation não tiver esse cadastro.
+    """
+    return DEFAULT_OPERATING_HOURS
+
+
+def day_bounds(day):
+    """Início e fim (exclusivo) do dia no fuso local."""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def iter_days(start_day, end_day):
+    """Dias de start_day a end_day, inclusive."""
+    day = start_day
+    while day <= end_day:
+        yield day
+        day += timedelta(days=1)
+
+
+def merge_intervals(intervals):
+    """Une intervalos (início, fim) sobrepostos ou encostados; a entrada deve estar ordenada."""
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class LocationSchedule:
+    """Eventos ativos de um estúdio, ordenados pelo início."""
+
+    def __init__(self, location_id, events):
+        self.location_id = location_id
+        self.events = sorted(events, key=lambda event: (event.start_time, event.end_time))
+        self._starts = [event.start_time for event in self.events]
+        self._max_ends = []
+        max_end = None
+        for event in self.events:
+            max_end = event.end_time if max_end is None or event.end_time > max_end else max_end
+            self._max_ends.append(max_end)
+
+    def conflicts(self, start, end):
+        """Eventos que se sobrepõem a [start, end), na ordem de início."""
+        found = []
+        index = bisect_left(self._starts, end) - 1
+        while index >= 0 and self._max_ends[index] > start:
+            event = self.events[index]
+            if event.end_time > start:
+                found.append(event)
+            index -= 1
+        found.reverse()
+        return found
+
+    def busy_spans(self, start, end):
+        """Intervalos ocupados (unidos) dentro de [start, end)."""
+        return merge_intervals(
+            (max(event.start_time, start), min(event.end_time, end))
+            for event in self.conflicts(start, end)
+        )
+
+
+class Availability:
+    """
+    Disponibilidade de um ou mais estúdios no período [start, end).
+    Todos os eventos do período são carregados de uma vez na criação.
+    """
+
+    def __init__(self, locations, start, end, exclude_event_id=None):
+        if not isinstance(locations, (list, tuple, set)):
+            locations = [locations]
+        self.locations = {self._location_id(location): location for location in locations}
+        self.start = _aware(start)
+        self.end = _aware(end)
+        self.exclude_event_id = exclude_event_id
+
+        events = {location_id: [] for location_id in self.locations}
+        for event in self._load_events():
+            events[event.location_id].append(event)
+        self.schedules = {
+            location_id: LocationSchedule(location_id, location_events)
+            for location_id, location_events in events.items()
+        }
+
+    @staticmethod
+    def _location_id(location):
+        return getattr(location, 'pk', location)
+
+    @classmethod
+    def for_days(cls, locations, start_day, end_day, **kwargs):
+        """Disponibilidade para os dias de start_day a end_day (inclusive)."""
+        return cls(locations, day_bounds(start_day)[0], day_bounds(end_day)[1], **kwargs)
+
+    def _load_events(self):
+        """
+        Eventos gravados que intersectam o período e ocorrências virtuais dos
+        eventos recorrentes dos estúdios (uma única consulta).
+        """
+        events = Event.objects.filter(
+            Q(start_time__lt=self.end, end_time__gt=self.start)
+            | Q(is_recurring=True, start_time__lt=self.end),
+            location_id__in=list(self.locations),
+            status__in=BOOKING_STATUSES
+        ).select_related('professor')
+        if self.exclude_event_id:
+            events = events.exclude(pk=self.exclude_event_id)
+
+        loaded = []
+        for event in events:
+            if event.start_time < self.end and event.end_time > self.start:
+                loaded.append(event)
+            loaded.extend(expand_event(event, self.start, self.end))
+        return loaded
+
+    def _schedule(self, location=None):
+        if location is None:
+            if len(self.schedules) != 1:
+                raise ValueError('Informe o estúdio: a disponibilidade cobre mais de um.')
+            return next(iter(self.schedules.values()))
+        return self.schedules[self._location_id(location)]
+
+    def conflicts(self, start, end, location=None):
+        """Eventos do estúdio que se sobrepõem ao horário [start, end)."""
+        return self._schedule(location).conflicts(_aware(start), _aware(end))
+
+    def is_free(self, start, end, location=None):
+        return not self.conflicts(start, end, location)
+
+    def free_locations(self, start, end):
+        """IDs dos estúdios sem conflito no horário [start, end)."""
+        start, end = _aware(start), _aware(end)
+        return [
+            location_id for location_id, schedule in self.schedules.items()
+            if not schedule.conflicts(start, end)
+        ]
+
+    def events_on(self, day, location=None):
+        """Eventos do estúdio que ocupam parte do dia."""
+        return self._schedule(location).conflicts(*day_bounds(day))
+
+    def opening_spans(self, day, location=None):
+        """Horários de funcionamento do dia como intervalos de datetime."""
+        location_obj = self.locations[self._schedule(location).location_id]
+        return [
+            (
+                timezone.make_aware(datetime.combine(day, open_start)),
+                timezone.make_aware(datetime.combine(day, open_end)),
+            )
+            for open_start, open_end in get_operating_hours(location_obj).get(day.weekday(), [])
+        ]
+
+    def within_operating_hours(self, start, end, location=None):
+        """Indica se [start, end) cabe inteiro em um horário de funcionamento."""
+        start, end = _aware(start), _aware(end)
+        day = timezone.localtime(start).date()
+        return any(
+            open_start <= start and end <= open_end
+            for open_start, open_end in self.opening_spans(day, location)
+        )
+
+    def busy_spans(self, day, location=None):
+        """Intervalos ocupados do dia."""
+        return self._schedule(location).busy_spans(*day_bounds(day))
+
+    def free_spans(self, day, location=None):
+        """Intervalos livres dentro do horário de funcionamento do dia (varredura única)."""
+        busy = self.busy_spans(day, location)
+        free = []
+        for open_start, open_end in self.opening_spans(day, location):
+            cursor = open_start
+            for busy_start, busy_end in busy:
+                if busy_end <= cursor or busy_start >= open_end:
+                    continue
+                if busy_start > cursor:
+                    free.append((cursor, busy_start))
+                cursor = max(cursor, busy_end)
+            if cursor < open_end:
+                free.append((cursor, open_end))
+        return free
+
+    def slots(self, day, location=None, duration=SLOT_DURATION):
+        """Slots do horário de funcionamento do dia, com o primeiro evento em conflito."""
+        schedule = self._schedule(location)
+        slots = []
+        for open_start, open_end in self.opening_spans(day, location):
+            slot_start = open_start
+            while slot_start < open_end:
+                slot_end = slot_start + duration
+                conflicts = schedule.conflicts(slot_start, slot_end)
+                slots.append({
+                    'start': slot_start,
+                    'end': slot_end,
+                    'available': not conflicts,
+                    'conflicting_event': conflicts[0] if conflicts else None,
+                })
+                slot_start = slot_end
+        return slots
+
+
+def find_conflicts(location, start, end, exclude_event_id=None):
+    """Eventos ativos do estúdio que se sobrepõem ao horário [start, end)."""
+    return Availability(location, start, end, exclude_event_id=exclude_event_id).conflicts(start, end)
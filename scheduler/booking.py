@@ -0,0 +1,148 @@
+"""
+Reserva atômica de horários nos estúdios.
+
+A verificação de conflito e a gravação do evento acontecem na mesma
+transação, para que duas reservas simultâneas do mesmo horário (vários
+workers do gunicorn) não passem ambas pela verificação.
+
+- PostgreSQL: a tabela tem uma restrição de exclusão (ver a migração
+  0007_event_no_overlap) sobre (location, tstzrange(start_time, end_time))
+  para os status ativos. O banco rejeita a segunda reserva sem nenhum lock
+  na aplicação; reservas em estúdios ou horários diferentes seguem em paralelo.
+- Demais bancos: a reserva trava o registro do estúdio (select_for_update)
+  antes de verificar os conflitos. No SQLite, que não tem lock de registro,
+  uma escrita no estúdio adquire o lock de escrita do banco no início da
+  transação.
+
+Em ambos os casos a verificação prévia com o motor de disponibilidade
+continua sendo feita: ela cobre as ocorrências virtuais dos eventos
+recorrentes, que não estão gravadas e, portanto, fora da restrição. Um
+evento recorrente tem cada ocorrência verificada, até
+RECURRENCE_CHECK_HORIZON, contra os eventos gravados e as ocorrências dos
+recorrentes já existentes.
+"""
+from datetime import datetime, timedelta
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .availability import BOOKING_STATUSES, Availability
+from .models import Event, EventLocation
+from .recurrence import expand_event
+
+# Nome da restrição de exclusão criada no PostgreSQL
+EXCLUSION_CONSTRAINT = 'scheduler_event_no_overlap'
+
+# Até quando, a partir do início, as ocorrências de um evento recorrente são verificadas
+RECURRENCE_CHECK_HORIZON = timedelta(days=365)
+
+
+class BookingConflict(Exception):
+    """O horário pedido já está ocupado no estúdio."""
+
+    def __init__(self, event, conflicts):
+        self.event = event
+        self.conflicts = conflicts
+        super().__init__('Este horário já está ocupado. Por favor, escolha outro.')
+
+    def as_dict(self):
+        """Representação estruturada do conflito (respostas JSON e logs)."""
+        return {
+            'error': 'booking_conflict',
+            'message': str(self),
+            'location_id': self.event.location_id,
+            'start': timezone.localtime(self.event.start_time).isoformat(),
+            'end': timezone.localtime(self.event.end_time).isoformat(),
+            'conflicts': [
+                {
+                    'id': conflict.id,
+                    'title': conflict.title,
+                    'start': timezone.localtime(conflict.start_time).isoformat(),
+                    'end': timezone.localtime(conflict.end_time).isoformat(),
+                    'is_occurrence': getattr(conflict, 'is_occurrence', False),
+                }
+                for conflict in self.conflicts
+            ],
+        }
+
+
+def uses_exclusion_constraint(using):
+    """Indica se o banco garante a ausência de sobreposição (PostgreSQL)."""
+    return connections[using].vendor == 'postgresql'
+
+
+def lock_rows(queryset, field):
+    """
+    Trava os registros do queryset até o fim da transação atual. No SQLite,
+    sem lock de registro, uma escrita sem efeito em field adquire o lock de
+    escrita do banco antes das leituras.
+    """
+    if connections[queryset.db].vendor == 'sqlite':
+        queryset.update(**{field: F(field)})
+    else:
+        list(queryset.select_for_update().values_list('pk'))
+
+
+def booking_conflicts(event):
+    """
+    Eventos do estúdio em conflito com o evento ou, se ele for recorrente,
+    com qualquer ocorrência dele até RECURRENCE_CHECK_HORIZON. Uma única
+    disponibilidade cobre todo o período.
+    """
+    spans = [(event.start_time, event.end_time)]
+    spans.extend(
+        (occurrence.start_time, occurrence.end_time)
+        for occurrence in expand_event(event, event.start_time, event.start_time + RECURRENCE_CHECK_HORIZON)
+    )
+    availability = Availability(
+        event.location_id, spans[0][0], max(end for _, end in spans), exclude_event_id=event.pk
+    )
+    conflicts = []
+    seen = set()
+    for start, end in spans:
+        for conflict in availability.conflicts(start, end):
+            key = (conflict.id, conflict.start_time)
+            if key not in seen:
+                seen.add(key)
+                conflicts.append(conflict)
+    return conflicts
+
+
+def book_event(event, **save_kwargs):
+    """
+    Grava o evento (novo ou editado) somente se o horário estiver livre no
+    estúdio. Levanta BookingConflict com os eventos em conflito.
+    """
+    # O modal do calendário envia os horários como texto ISO, sem fuso
+    for field in ('start_time', 'end_time'):
+        value = getattr(event, field)
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        setattr(event, field, value)
+
+    if not event.location_id or event.status not in BOOKING_STATUSES:
+        event.save(**save_kwargs)
+        return event
+
+    using = router.db_for_write(Event, instance=event)
+    with transaction.atomic(using=using):
+        if not uses_exclusion_constraint(using):
+            # Serializa as reservas do estúdio
+            lock_rows(EventLocation.objects.using(using).filter(pk=event.location_id), 'name')
+
+        conflicts = booking_conflicts(event)
+        if conflicts:
+            raise BookingConflict(event, conflicts)
+
+        try:
+            with transaction.atomic(using=using):
+                event.save(**save_kwargs)
+        except IntegrityError as e:
+            if EXCLUSION_CONSTRAINT not in str(e):
+                raise
+            # Outra reserva do mesmo horário foi confirmada entre a verificação e a gravação
+            raise BookingConflict(event, booking_conflicts(event))
+    return event
@@ -8,6 +8,7 @@ from crispy_forms.layout import Layout, Fieldset, Submit, Div, HTML, Field, Row,
 from core.models import User
 from courses.models import Course
 from .models import Event, EventLocation, EventParticipant
+from .recurrence import validate_rule
 
 class EventForm(forms.ModelForm):
     """
@@ -185,6 +186,11 @@ class EventForm(forms.ModelForm):
         
         if is_recurring and not recurrence_rule:
             self.add_error('recurrence_rule', _('Uma regra de recorrência é necessária para eventos recorrentes.'))
+        elif is_recurring:
+            try:
+                validate_rule(recurrence_rule, cleaned_data.get('start_time'))
+            except ValueError as e:
+                self.add_error('recurrence_rule', str(e))
         
         return cleaned_data
     
@@ -0,0 +1,185 @@
+"""
+Exportação da agenda em iCalendar (RFC 5545) para assinatura em aplicativos
+de calendário (Google Agenda, Apple Calendário, Outlook).
+
+Os feeds são gerados de forma incremental: os eventos são lidos em blocos
+(QuerySet.iterator) e cada VEVENT é enviado assim que montado, então o uso de
+memória não cresce com o histórico. Eventos recorrentes são exportados uma
+única vez, com a regra RRULE, em vez das ocorrências expandidas.
+
+Como os aplicativos de calendário assinam o feed sem sessão, o acesso é feito
+por um token assinado (django.core.signing) na própria URL. O token leva a
+versão do link do dono (calendar_token_version do professor ou do estúdio):
+gerar um novo link incrementa a versão e revoga os anteriores.
+
+Sincronização incremental: a resposta traz o cabeçalho X-Sync-Token, que
+representa o updated_at mais recente do feed. Enviando-o de volta em
+?sync_token= o feed traz só os eventos alterados depois disso. Eventos
+cancelados continuam no feed com STATUS:CANCELLED para que os clientes os
+removam.
+"""
+import re
+from datetime import datetime, time
+
+from django.core import signing
+from django.utils import timezone
+
+PRODID = '-//CincoCincoJAM//Agenda//PT-BR'
+
+# Eventos lidos do banco por bloco durante a geração do feed
+ICS_CHUNK_SIZE = 200
+
+FEED_TOKEN_SALT = 'scheduler.ics.feed'
+SYNC_TOKEN_SALT = 'scheduler.ics.sync'
+
+ICS_STATUS = {
+    'SCHEDULED': 'TENTATIVE',
+    'CONFIRMED': 'CONFIRMED',
+    'CANCELLED': 'CANCELLED',
+    'COMPLETED': 'CONFIRMED',
+}
+
+_UNTIL = re.compile(r'UNTIL=(\d{8})(T\d{6})?(Z)?', re.IGNORECASE)
+
+
+def feed_token(kind, owner):
+    """Token do feed de um professor ('professor') ou estúdio ('location')."""
+    return signing.dumps([kind, owner.pk, owner.calendar_token_version], salt=FEED_TOKEN_SALT)
+
+
+def load_feed_token(token, kind):
+    """
+    (ID do objeto, versão do link) do token, ou None se o token for inválido
+    ou de outro tipo. Tokens anteriores às versões valem como versão 1.
+    """
+    try:
+        token_kind, object_id, *version = signing.loads(token, salt=FEED_TOKEN_SALT)
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+    if token_kind != kind or len(version) > 1:
+        return None
+    return object_id, version[0] if version else 1
+
+
+def make_sync_token(timestamp):
+    return signing.dumps(timestamp.isoformat(), salt=SYNC_TOKEN_SALT) if timestamp else None
+
+
+def parse_since(request):
+    """
+    Data a partir da qual o cliente quer as alterações (?sync_token=).
+    Levanta ValueError se o parâmetro for inválido.
+    """
+    token = request.GET.get('sync_token')
+    if not token:
+        return None
+    try:
+        value = signing.loads(token, salt=SYNC_TOKEN_SALT)
+    except signing.BadSignature:
+        raise ValueError('sync_token inválido')
+    return datetime.fromisoformat(value)
+
+
+def _utc(value):
+    return value.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def escape_text(value):
+    """Escapa um valor TEXT (barra, ponto e vírgula, vírgula e quebras de linha)."""
+    return (
+        str(value or '')
+        .replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('\r\n', '\\n')
+        .replace('\n', '\\n')
+    )
+
+
+def fold(line):
+    """Quebra a linha em partes de até 75 octetos, como exige a RFC 5545."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+
+    parts = []
+    current = ''
+    limit = 75
+    for char in line:
+        if len((current + char).encode('utf-8')) > limit:
+            parts.append(current)
+            current = char
+            limit = 74  # As linhas de continuação começam com um espaço
+        else:
+            current += char
+    parts.append(current)
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _rrule_value(rule):
+    """
+    Regra no formato esperado junto de um DTSTART em UTC: sem o prefixo
+    "RRULE:" e com UNTIL também em UTC (UNTIL sem fuso é horário local).
+    """
+    rule = rule.strip()
+    if rule.upper().startswith('RRULE:'):
+        rule = rule[6:]
+
+    def to_utc(match):
+        if match.group(3):
+            return match.group(0)
+        day = datetime.strptime(match.group(1), '%Y%m%d')
+        if match.group(2):
+            until = datetime.combine(day.date(), datetime.strptime(match.group(2), 'T%H%M%S').time())
+        else:
+            until = datetime.combine(day.date(), time.max.replace(microsecond=0))
+        return 'UNTIL=' + _utc(timezone.make_aware(until))
+    return _UNTIL.sub(to_utc, rule)
+
+
+def event_lines(event):
+    """Linhas do VEVENT de um evento."""
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:event-{event.pk}@cincocincojam',
+        f'DTSTAMP:{_utc(event.updated_at)}',
+        f'LAST-MODIFIED:{_utc(event.updated_at)}',
+        f'CREATED:{_utc(event.created_at)}',
+        f'DTSTART:{_utc(event.start_time)}',
+        f'DTEND:{_utc(event.end_time)}',
+        f'SUMMARY:{escape_text(event.title)}',
+        f'STATUS:{ICS_STATUS.get(event.status, "CONFIRMED")}',
+    ]
+    if event.description:
+        lines.append(f'DESCRIPTION:{escape_text(event.description)}')
+    if event.location_id:
+        place = event.location.name
+        if event.location.address:
+            place = f'{place} - {event.location.address}'
+        lines.append(f'LOCATION:{escape_text(place)}')
+    if event.course_id:
+        lines.append(f'CATEGORIES:{escape_text(event.course.title)}')
+    if event.is_recurring and event.recurrence_rule:
+        lines.append(f'RRULE:{_rrule_value(event.recurrence_rule)}')
+    lines.append('END:VEVENT')
+    return lines
+
+
+def iter_calendar(events, name):
+    """
+    Gera o calendário em partes: cabeçalho, um VEVENT por evento (lidos do
+    banco em blocos) e rodapé.
+    """
+    yield ''.join(fold(line) for line in (
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(name)}',
+        f'X-WR-TIMEZONE:{timezone.get_current_timezone_name()}',
+    ))
+    events = events.select_related('location', 'course').order_by('start_time', 'pk')
+    for event in events.iterator(chunk_size=ICS_CHUNK_SIZE):
+        yield ''.join(fold(line) for line in event_lines(event))
+    yield fold('END:VCALENDAR')
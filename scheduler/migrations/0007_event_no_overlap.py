@@ -0,0 +1,56 @@
+from django.db import migrations
+
+# Restrição de exclusão usada por scheduler.booking: dois eventos ativos não
+# podem ocupar o mesmo estúdio em horários sobrepostos. Só existe no
+# PostgreSQL; nos demais bancos a reserva trava o estúdio na aplicação.
+CREATE_CONSTRAINT = """
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+ALTER TABLE scheduler_event ADD CONSTRAINT scheduler_event_no_overlap
+    EXCLUDE USING gist (
+        location_id WITH =,
+        tstzrange(start_time, end_time, '[)') WITH &&
+    )
+    WHERE (status IN ('SCHEDULED', 'CONFIRMED'));
+"""
+
+DROP_CONSTRAINT = "ALTER TABLE scheduler_event DROP CONSTRAINT IF EXISTS scheduler_event_no_overlap;"
+
+
+OVERLAPPING_EVENTS = """
+SELECT a.id, b.id FROM scheduler_event a
+JOIN scheduler_event b
+    ON a.location_id = b.location_id AND a.id < b.id
+    AND a.start_time < b.end_time AND b.start_time < a.end_time
+WHERE a.status IN ('SCHEDULED', 'CONFIRMED') AND b.status IN ('SCHEDULED', 'CONFIRMED')
+"""
+
+
+def create_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(OVERLAPPING_EVENTS)
+        overlapping = cursor.fetchall()
+    if overlapping:
+        pairs = ', '.join(f'{a}/{b}' for a, b in overlapping[:20])
+        raise RuntimeError(
+            f'Existem eventos ativos sobrepostos no mesmo estúdio ({pairs}). '
+            'Cancele ou ajuste esses eventos antes de aplicar a migração.'
+        )
+    schema_editor.execute(CREATE_CONSTRAINT)
+
+
+def drop_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_CONSTRAINT)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0006_alter_eventlocation_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_constraint, drop_constraint),
+    ]
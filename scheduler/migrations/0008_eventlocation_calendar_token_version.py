@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0007_event_no_overlap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventlocation',
+            name='calendar_token_version',
+            field=models.PositiveIntegerField(default=1, help_text='Incrementada ao gerar um novo link de assinatura da agenda; os links antigos deixam de funcionar', verbose_name='Versão do link da agenda'),
+        ),
+    ]
@@ -33,6 +33,8 @@ class EventLocation(models.Model):
     updated_at = models.DateTimeField(_('Atualizado em'), auto_now=True)
     is_active = models.BooleanField(_('Ativo?'), default=True,
                                    help_text=_('Desmarque para ocultar este estúdio sem excluí-lo'))
+    calendar_token_version = models.PositiveIntegerField(_('Versão do link da agenda'), default=1,
+                                   help_text=_('Incrementada ao gerar um novo link de assinatura da agenda; os links antigos deixam de funcionar'))
     
     class Meta:
         verbose_name = _('Estúdio')
@@ -143,6 +145,14 @@ class Event(models.Model):
     def participant_count(self):
         """Retorna o número de participantes confirmados"""
         return self.participants.filter(attendance_status='CONFIRMED').count()
+    
+    def get_occurrences(self, start, end):
+        """
+        Retorna as ocorrências virtuais deste evento recorrente no período
+        [start, end), sem incluir o próprio evento.
+        """
+        from .recurrence import expand_event
+        return expand_event(self, start, end)
 
 class EventParticipant(models.Model):
     """
@@ -0,0 +1,108 @@
+"""
+Gestão em lote dos participantes de um evento.
+
+Adicionar uma turma inteira custa um número fixo de consultas: os novos
+participantes são inseridos com um único bulk_create, os cancelados são
+reativados com um único UPDATE e o limite de vagas (max_participants) é
+verificado com o evento travado, na mesma transação da gravação, para que
+duas inclusões simultâneas não ultrapassem a capacidade.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import User
+from .booking import lock_rows
+from .models import Event, EventParticipant
+
+
+class ParticipantError(Exception):
+    """Erro ao adicionar participantes a um evento."""
+
+
+class CapacityExceeded(ParticipantError):
+    """A inclusão ultrapassaria o limite de participantes do evento."""
+
+    def __init__(self, event, requested, available):
+        self.event = event
+        self.requested = requested
+        self.available = available
+        if available <= 0:
+            message = 'Este evento já atingiu o limite máximo de participantes'
+        else:
+            message = f'Este evento tem apenas {available} vaga(s) disponível(is) para {requested} aluno(s)'
+        super().__init__(message)
+
+
+def active_participants(event):
+    """Participantes que ocupam vaga no evento (cancelados não contam)."""
+    return EventParticipant.objects.filter(event=event).exclude(attendance_status='CANCELLED')
+
+
+def add_participants(event, student_ids, attendance_status='PENDING', strict=False):
+    """
+    Adiciona os alunos ao evento, reativando os que haviam cancelado.
+
+    Retorna um dicionário com:
+    - participants: EventParticipant dos alunos pedidos (com student carregado)
+    - created / reactivated: IDs dos alunos inseridos / reativados
+    - missing: IDs que não correspondem a alunos
+
+    Com strict=True, IDs que não correspondem a alunos levantam
+    ParticipantError sem gravar nada. Levanta CapacityExceeded quando as
+    novas vagas ultrapassam max_participants.
+    """
+    student_ids = {int(student_id) for student_id in student_ids}
+
+    with transaction.atomic():
+        # Serializa as inclusões no evento até o fim da transação
+        lock_rows(Event.objects.filter(pk=event.pk), 'max_participants')
+
+        students = {
+            student.id: student
+            for student in User.objects.filter(id__in=student_ids, user_type='STUDENT')
+        }
+        missing = sorted(student_ids - set(students))
+        if missing and strict:
+            raise ParticipantError('Um ou mais alunos não encontrados')
+
+        existing = dict(
+            EventParticipant.objects.filter(event=event, student_id__in=students)
+            .values_list('student_id', 'attendance_status')
+        )
+        to_create = [student_id for student_id in students if student_id not in existing]
+        to_reactivate = [student_id for student_id, status in existing.items() if status == 'CANCELLED']
+
+        max_participants = Event.objects.filter(pk=event.pk).values_list('max_participants', flat=True).first()
+        requested = len(to_create) + len(to_reactivate)
+        if max_participants and requested:
+            available = max_participants - active_participants(event).count()
+            if requested > available:
+                raise CapacityExceeded(event, requested, max(available, 0))
+
+        now = timezone.now()
+        confirmed_at = now if attendance_status == 'CONFIRMED' else None
+        if to_create:
+            EventParticipant.objects.bulk_create(
+                [
+                    EventParticipant(
+                        event=event, student=students[student_id],
+                        attendance_status=attendance_status, confirmed_at=confirmed_at
+                    )
+                    for student_id in to_create
+                ],
+                ignore_conflicts=True
+            )
+        if to_reactivate:
+            EventParticipant.objects.filter(event=event, student_id__in=to_reactivate).update(
+                attendance_status=attendance_status, confirmed_at=confirmed_at, updated_at=now
+            )
+
+    participants = list(
+        EventParticipant.objects.filter(event=event, student_id__in=students).select_related('student')
+    )
+    return {
+        'participants': participants,
+        'created': set(to_create),
+        'reactivated': set(to_reactivate),
+        'missing': missing,
+    }
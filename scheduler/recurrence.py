@@ -0,0 +1,138 @@
+"""
+Expansão de eventos recorrentes (Event.is_recurring + Event.recurrence_rule).
+
+A regra segue o formato RRULE (RFC 5545), por exemplo
+"FREQ=WEEKLY;BYDAY=TU,TH;COUNT=12". Apenas o evento original fica gravado no
+banco; as demais ocorrências são calculadas sob demanda para a janela pedida
+e representadas por objetos Occurrence, que expõem os mesmos atributos de
+Event usados pelo calendário e pela verificação de conflitos.
+
+As datas são expandidas no horário local (uma aula semanal às 19h continua
+às 19h mesmo com mudança de fuso). As ocorrências de cada regra são
+memorizadas no processo (lru_cache) por mês, então janelas que se repetem
+(semana, mês do calendário, verificação de conflito) não recalculam a regra
+nem fazem consultas. O resultado depende só da regra, do início e do mês,
+então a memória nunca fica desatualizada.
+"""
+import re
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+
+from dateutil.rrule import rrulestr
+from django.utils import timezone
+
+# Limite de ocorrências por mês, para proteger contra regras como FREQ=MINUTELY
+MAX_OCCURRENCES_PER_MONTH = 31 * 24
+
+_UTC_UNTIL = re.compile(r'UNTIL=(\d{8}T\d{6})Z', re.IGNORECASE)
+
+
+def _local_naive(value):
+    return timezone.localtime(value).replace(tzinfo=None) if timezone.is_aware(value) else value
+
+
+def _normalize_rule(rule):
+    """
+    Converte UNTIL em UTC ("...Z") para o horário local, já que a regra é
+    expandida a partir de um DTSTART local sem fuso.
+    """
+    def to_local(match):
+        until = timezone.make_aware(datetime.strptime(match.group(1), '%Y%m%dT%H%M%S'), timezone.utc)
+        return 'UNTIL=' + timezone.localtime(until).strftime('%Y%m%dT%H%M%S')
+    return _UTC_UNTIL.sub(to_local, rule.strip())
+
+
+@lru_cache(maxsize=256)
+def parse_rule(rule, dtstart):
+    """
+    Interpreta a regra a partir de dtstart (datetime local sem fuso).
+    Levanta ValueError quando a regra é inválida.
+    """
+    try:
+        return rrulestr(_normalize_rule(rule), dtstart=dtstart)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f'Regra de recorrência inválida: {e}')
+
+
+def validate_rule(rule, dtstart=None):
+    """Valida a regra; levanta ValueError com a mensagem do erro."""
+    parse_rule(rule, _local_naive(dtstart or timezone.now()).replace(microsecond=0))
+
+
+class Occurrence:
+    """
+    Ocorrência virtual de um evento recorrente. Reaproveita os dados do
+    evento original (event) com outro horário.
+    """
+    is_occurrence = True
+
+    def __init__(self, event, start_time, end_time):
+        self.event = event
+        self.start_time = start_time
+        self.end_time = end_time
+
+    def __getattr__(self, name):
+        # Demais atributos (id, title, location_id, professor...) vêm do evento original
+        return getattr(self.event, name)
+
+    def __repr__(self):
+        return f"<Occurrence {self.event.pk} {self.start_time.isoformat()}>"
+
+
+def _months(start, end):
+    """Primeiro dia de cada mês (local) que intersecta [start, end)."""
+    month = timezone.localtime(start).date().replace(day=1)
+    last = timezone.localtime(end).date()
+    while month <= last:
+        yield month
+        month = (month + timedelta(days=32)).replace(day=1)
+
+
+@lru_cache(maxsize=4096)
+def _month_starts(rule, dtstart, month):
+    """Inícios (datetimes locais sem fuso) das ocorrências da regra no mês."""
+    month_start = datetime.combine(month, time.min)
+    month_end = datetime.combine((month + timedelta(days=32)).replace(day=1), time.min)
+    starts = []
+    for occurrence in parse_rule(rule, dtstart).xafter(month_start, inc=True):
+        if occurrence >= month_end or len(starts) >= MAX_OCCURRENCES_PER_MONTH:
+            break
+        starts.append(occurrence)
+    return tuple(starts)
+
+
+def expand_event(event, start, end):
+    """
+    Ocorrências virtuais do evento recorrente que se sobrepõem a [start, end).
+    A primeira ocorrência é o próprio evento gravado e não é repetida.
+    Regras inválidas não geram ocorrências.
+    """
+    if not event.is_recurring or not event.recurrence_rule:
+        return []
+
+    dtstart = _local_naive(event.start_time)
+    try:
+        parse_rule(event.recurrence_rule, dtstart)
+    except ValueError:
+        return []
+
+    duration = event.end_time - event.start_time
+    occurrences = []
+    # Uma ocorrência que começou antes da janela ainda pode ocupá-la
+    for month in _months(start - duration, end):
+        for occurrence_start in _month_starts(event.recurrence_rule, dtstart, month):
+            if occurrence_start == dtstart:
+                continue
+            occurrence_start = timezone.make_aware(occurrence_start)
+            occurrence_end = occurrence_start + duration
+            if occurrence_start < end and occurrence_end > start:
+                occurrences.append(Occurrence(event, occurrence_start, occurrence_end))
+    return occurrences
+
+
+def expand_events(events, start, end):
+    """Expande vários eventos recorrentes para a janela [start, end)."""
+    occurrences = []
+    for event in events:
+        occurrences.extend(expand_event(event, start, end))
+    return occurrences
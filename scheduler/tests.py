@@ -1,3 +1,80 @@
+from datetime import datetime, timedelta
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+
+from .booking import BookingConflict, book_event
+from .models import Event, EventLocation
+
+
+class BookEventTests(TestCase):
+    """Reserva atômica de horários (scheduler/booking.py)."""
+
+    def setUp(self):
+        self.professor = get_user_model().objects.create_user(
+            email='professor@example.com', password='x', user_type='PROFESSOR'
+        )
+        self.location = EventLocation.objects.create(name='Estúdio 1', created_by=self.professor)
+        # Próxima terça às 10h, com folga para não cair no passado
+        today = timezone.localdate() + timedelta(days=7)
+        self.tuesday = today + timedelta(days=(1 - today.weekday()) % 7)
+
+    def at(self, day, hour):
+        return timezone.make_aware(datetime.combine(day, datetime.min.time()) + timedelta(hours=hour))
+
+    def event(self, start, end, **kwargs):
+        return Event(
+            title='Aula', professor=self.professor, location=self.location,
+            start_time=start, end_time=end, status='SCHEDULED', **kwargs
+        )
+
+    def test_overlapping_booking_is_rejected(self):
+        book_event(self.event(self.at(self.tuesday, 10), self.at(self.tuesday, 11)))
+
+        with self.assertRaises(BookingConflict) as raised:
+            book_event(self.event(self.at(self.tuesday, 10.5), self.at(self.tuesday, 11.5)))
+
+        self.assertEqual(len(raised.exception.conflicts), 1)
+        self.assertEqual(Event.objects.count(), 1)
+
+    def test_adjacent_booking_is_accepted(self):
+        book_event(self.event(self.at(self.tuesday, 10), self.at(self.tuesday, 11)))
+        book_event(self.event(self.at(self.tuesday, 11), self.at(self.tuesday, 12)))
+
+        self.assertEqual(Event.objects.count(), 2)
+
+    def test_recurring_booking_checks_later_occurrences(self):
+        later = self.tuesday + timedelta(weeks=3)
+        book_event(self.event(self.at(later, 10), self.at(later, 11)))
+
+        weekly = self.event(
+            self.at(self.tuesday, 10), self.at(self.tuesday, 11),
+            is_recurring=True, recurrence_rule='FREQ=WEEKLY;COUNT=8'
+        )
+        with self.assertRaises(BookingConflict) as raised:
+            book_event(weekly)
+
+        self.assertEqual(raised.exception.conflicts[0].start_time, self.at(later, 10))
+        self.assertFalse(Event.objects.filter(is_recurring=True).exists())
+
+    def test_booking_over_existing_recurring_occurrence_is_rejected(self):
+        book_event(self.event(
+            self.at(self.tuesday, 10), self.at(self.tuesday, 11),
+            is_recurring=True, recurrence_rule='FREQ=WEEKLY;COUNT=8'
+        ))
+
+        later = self.tuesday + timedelta(weeks=5)
+        with self.assertRaises(BookingConflict):
+            book_event(self.event(self.at(later, 10), self.at(later, 11)))
+
+    def test_editing_recurring_event_ignores_its_own_occurrences(self):
+        weekly = book_event(self.event(
+            self.at(self.tuesday, 10), self.at(self.tuesday, 11),
+            is_recurring=True, recurrence_rule='FREQ=WEEKLY;COUNT=8'
+        ))
+        weekly.title = 'Aula semanal'
+
+        book_event(weekly)
 
-# Create your tests here.
+        self.assertEqual(Event.objects.get().title, 'Aula semanal')
@@ -43,6 +43,10 @@ urlpatterns = [
     
     # Visualização do calendário por estúdio
     path('locations/<int:pk>/calendar/', views.LocationCalendarView.as_view(), name='location_calendar'),
+    path('ics/professor/<str:token>.ics', views.ics_feed, {'kind': 'professor'}, name='ics_professor_feed'),
+    path('ics/location/<str:token>.ics', views.ics_feed, {'kind': 'location'}, name='ics_location_feed'),
+    path('ics/professor/rotate/', views.ics_feed_rotate, {'kind': 'professor'}, name='ics_professor_feed_rotate'),
+    path('ics/location/<int:pk>/rotate/', views.ics_feed_rotate, {'kind': 'location'}, name='ics_location_feed_rotate'),
     
     # Views baseadas em classes
     path('events/class/list/', views.EventListView.as_view(), name='event_list_view'),
@@ -1,24 +1,68 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import JsonResponse, HttpResponseForbidden, HttpResponseRedirect
+from django.http import JsonResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotFound, HttpResponseRedirect, StreamingHttpResponse
 from django.utils.translation import gettext_lazy as _
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Q, Count
+from django.db.models import Q, Count, F, Max, Exists, OuterRef
 from django.urls import reverse, reverse_lazy
 from django.utils.http import url_has_allowed_host_and_scheme as is_safe_url
+from django.views.decorators.http import condition, require_POST
 from django.views.generic import DetailView, ListView, CreateView, UpdateView, DeleteView
 from datetime import timedelta, datetime, time
+import hashlib
 import json
 
 from core.models import User
 from courses.models import Course
 from .models import Event, EventLocation, EventParticipant
 from .forms import EventForm, EventLocationForm, ParticipantForm
+from .availability import Availability, iter_days
+from .booking import BookingConflict, book_event
+from .ics import feed_token, iter_calendar, load_feed_token, make_sync_token, parse_since
+from .participants import CapacityExceeded, ParticipantError, add_participants
+from .recurrence import expand_event
 
 # Placeholder para views que serão implementadas na próxima etapa
 
+def _booking_conflict_response(request, conflict, redirect_url):
+    """
+    Resposta para uma reserva recusada por conflito: JSON estruturado (409)
+    para requisições AJAX ou mensagem de erro e redirecionamento.
+    """
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse(conflict.as_dict(), status=409)
+
+    details = ', '.join(
+        f"{item.title} ({timezone.localtime(item.start_time):%d/%m %H:%M}-{timezone.localtime(item.end_time):%H:%M})"
+        for item in conflict.conflicts
+    )
+    messages.error(request, f"{conflict} {details}".strip())
+    return HttpResponseRedirect(redirect_url)
+
+
+def _can_rotate_location_feed(user, location):
+    """O link da agenda de um estúdio pode ser trocado pelo criador ou por um admin."""
+    return location.created_by_id == user.pk or user.user_type == 'ADMIN'
+
+
+def _invite_selected_students(request, event, selected_students):
+    """
+    Adiciona ao evento os alunos selecionados no formulário (IDs separados
+    por vírgula) em lote e informa o resultado ao professor.
+    """
+    student_ids = [int(sid) for sid in (selected_students or '').split(',') if sid.strip()]
+    if not student_ids:
+        return
+    try:
+        result = add_participants(event, student_ids)
+    except CapacityExceeded as e:
+        messages.warning(request, _(f'Alunos não adicionados: {e}.'))
+        return
+    messages.info(request, _(f'Convites enviados para {len(result["participants"])} aluno(s).'))
+
+
 @login_required
 def calendar_view(request):
     """
@@ -57,6 +101,10 @@ def calendar_view(request):
     context = {
         'upcoming_events': upcoming_events,
         'location': location,
+        'ics_feed_url': request.build_absolute_uri(
+            reverse('scheduler:ics_location_feed', args=[feed_token('location', location)])
+        ),
+        'can_rotate_ics_feed': _can_rotate_location_feed(request.user, location),
         'page_title': _('Agenda - {}'.format(location.name))
     }
     
@@ -166,23 +214,16 @@ def event_create(request):
                 except Course.DoesNotExist:
                     pass
             
-            # Salvar o evento
-            event.save()
+            # Salvar o evento (verificação de conflito e gravação atômicas)
+            try:
+                book_event(event)
+            except BookingConflict as conflict:
+                return _booking_conflict_response(
+                    request, conflict, reverse('scheduler:location_calendar', args=[location_id])
+                )
             
             # Adicionar participantes
-            if request.POST.get('selected_students'):
-                student_ids = [int(sid) for sid in request.POST.get('selected_students').split(',') if sid.strip()]
-                if student_ids:
-                    from core.models import User
-                    students = User.objects.filter(id__in=student_ids, user_type='STUDENT')
-                    for student in students:
-                        EventParticipant.objects.create(
-                            event=event,
-                            student=student,
-                            attendance_status='PENDING'
-                        )
-                    
-                    messages.info(request, _(f'Convites enviados para {len(students)} aluno(s).'))
+            _invite_selected_students(request, event, request.POST.get('selected_students'))
             
             # Mostrar mensagem de sucesso
             messages.success(request, _('Agendamento realizado com sucesso!'))
@@ -196,30 +237,20 @@ def event_create(request):
             print("Form válido, salvando evento...")
             event = form.save(commit=False)
             event.professor = request.user
-            event.save()
+            try:
+                book_event(event)
+            except BookingConflict as conflict:
+                form.add_error(None, str(conflict))
+                return render(request, 'scheduler/event_form.html', {
+                    'form': form,
+                    'page_title': _('Novo Evento')
+                })
             
             # Processar participantes
             selected_students = request.POST.get('selected_students', '')
             print(f"Alunos selecionados: {selected_students}")
             
-            if selected_students:
-                student_ids = [int(id) for id in selected_students.split(',') if id.strip()]
-                if student_ids:
-                    from core.models import User
-                    students = User.objects.filter(id__in=student_ids, user_type='STUDENT')
-                    print(f"Encontrados {students.count()} alunos para adicionar ao evento {event.id}")
-                    
-                    for student in students:
-                        participant = EventParticipant.objects.create(
-                            event=event,
-                            student=student,
-                            attendance_status='PENDING'
-                        )
-                        print(f"Criado participante ID {participant.id} para aluno {student.email}")
-                    
-                    total_participants = EventParticipant.objects.filter(event=event).count()
-                    print(f"Total de participantes após criação: {total_participants}")
-                    messages.info(request, _(f'Convites enviados para {students.count()} aluno(s).'))
+            _invite_selected_students(request, event, selected_students)
             
             messages.success(request, _('Evento criado com sucesso!'))
             return redirect('scheduler:event_detail', pk=event.id)
@@ -283,9 +314,13 @@ def event_edit(request, pk):
     if request.method == 'POST':
         form = EventForm(request.POST, instance=event, professor=request.user)
         if form.is_valid():
-            form.save()
-            messages.success(request, _('Evento atualizado com sucesso!'))
-            return redirect('scheduler:event_detail', pk=event.pk)
+            try:
+                book_event(form.save(commit=False))
+            except BookingConflict as conflict:
+                form.add_error(None, str(conflict))
+            else:
+                messages.success(request, _('Evento atualizado com sucesso!'))
+                return redirect('scheduler:event_detail', pk=event.pk)
     else:
         form = EventForm(instance=event, professor=request.user)
     
@@ -597,6 +632,9 @@ def professor_dashboard(request):
         'confirmed_events': confirmed_events,
         'pending_responses': pending_responses,
         'has_more_events': Event.objects.filter(professor=request.user).count() > 15,
+        'ics_feed_url': request.build_absolute_uri(
+            reverse('scheduler:ics_professor_feed', args=[feed_token('professor', request.user)])
+        ),
         'page_title': _('Dashboard do Professor')
     }
     
@@ -650,64 +688,159 @@ def student_notifications(request):
 
 # Views da API para integração com FullCalendar.js (serão detalhadas na próxima etapa)
 
+def _events_feed_range(request):
+    """
+    Lê o estúdio e o período pedidos pelo FullCalendar.
+    Retorna (location_id, start_date, end_date); location_id é None quando ausente.
+    """
+    location_id = request.GET.get('location')
+    start_date = request.GET.get('start')
+    end_date = request.GET.get('end')
+
+    # Converter de string para data
+    if start_date:
+        start_date = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+    else:
+        start_date = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    if end_date:
+        end_date = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+    else:
+        next_month = start_date.replace(day=28) + timedelta(days=4)
+        end_date = next_month.replace(day=1)
+
+    if timezone.is_naive(start_date):
+        start_date = timezone.make_aware(start_date)
+    if timezone.is_naive(end_date):
+        end_date = timezone.make_aware(end_date)
+
+    return location_id or None, start_date, end_date
+
+
+def _events_feed_queryset(location_id, start_date, end_date):
+    """Eventos do período e eventos recorrentes que podem ter ocorrências nele."""
+    return Event.objects.filter(
+        Q(start_time__gte=start_date, end_time__lte=end_date)
+        | Q(is_recurring=True, start_time__lt=end_date),
+        location_id=location_id
+    )
+
+
+def _events_feed_state(request):
+    """
+    Estado do feed de eventos usado na GET condicional: data da última
+    alteração (eventos e participantes) e quantidades de eventos e
+    participantes no período. Calculado em uma única consulta e guardado
+    na requisição para ser usado pelo ETag e pelo Last-Modified.
+    """
+    if not hasattr(request, '_events_feed_state'):
+        state = None
+        try:
+            location_id, start_date, end_date = _events_feed_range(request)
+        except ValueError:
+            location_id = None
+
+        if location_id:
+            state = _events_feed_queryset(location_id, start_date, end_date).order_by().aggregate(
+                events_updated_at=Max('updated_at'),
+                participants_updated_at=Max('participants__updated_at'),
+                events_count=Count('id', distinct=True),
+                participants_count=Count('participants'),
+            )
+            state['key'] = (location_id, start_date.isoformat(), end_date.isoformat())
+        request._events_feed_state = state
+    return request._events_feed_state
+
+
+def _events_feed_last_modified(request):
+    state = _events_feed_state(request)
+    if not state:
+        return None
+    timestamps = [value for value in (state['events_updated_at'], state['participants_updated_at']) if value]
+    return max(timestamps) if timestamps else None
+
+
+def _events_feed_etag(request):
+    state = _events_feed_state(request)
+    if not state:
+        return None
+    # O feed depende do usuário (can_edit e destaque "my-booking")
+    raw = '|'.join(str(value) for value in (
+        request.user.pk,
+        request.user.is_staff,
+        *state['key'],
+        state['events_updated_at'],
+        state['participants_updated_at'],
+        state['events_count'],
+        state['participants_count'],
+    ))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
 @login_required
+@condition(etag_func=_events_feed_etag, last_modified_func=_events_feed_last_modified)
 def api_events(request):
-    """API para fornecer eventos para o calendário."""
+    """
+    API para fornecer eventos para o calendário.
+    Responde 304 quando nada mudou no período desde a última consulta.
+    """
     try:
-        location_id = request.GET.get('location')
-        start_date = request.GET.get('start')
-        end_date = request.GET.get('end')
-        
+        location_id, start_date, end_date = _events_feed_range(request)
+
         # Verificar se o location_id está vazio ou não é válido
         if not location_id:
             return JsonResponse({'error': 'ID da localização é obrigatório'}, status=400)
-            
-        # Converter de string para data
-        if start_date:
-            start_date = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-        else:
-            start_date = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        if end_date:
-            end_date = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-        else:
-            next_month = start_date.replace(day=28) + timedelta(days=4)
-            end_date = next_month.replace(day=1)
-        
-        events = Event.objects.filter(
-            location_id=location_id,
-            start_time__gte=start_date,
-            end_time__lte=end_date
-        ).select_related('professor', 'course')
-        
-        result = []
+
+        events = _events_feed_queryset(location_id, start_date, end_date).select_related(
+            'professor', 'course'
+        ).annotate(
+            participants_count=Count('participants'),
+            is_my_booking=Exists(
+                EventParticipant.objects.filter(event=OuterRef('pk'), student_id=request.user.pk)
+            )
+        )
+
+        # Eventos gravados no período e ocorrências virtuais dos recorrentes
+        items = []
         for event in events:
-            can_edit = request.user.is_staff or request.user == event.professor
-            
+            if event.start_time >= start_date and event.end_time <= end_date:
+                items.append(event)
+            items.extend(expand_event(event, start_date, end_date))
+        items.sort(key=lambda item: item.start_time)
+
+        result = []
+        for event in items:
+            is_professor = request.user.pk == event.professor_id
+            can_edit = request.user.is_staff or is_professor
+
+            is_occurrence = getattr(event, 'is_occurrence', False)
             event_data = {
-                'id': event.id,
+                # Cada ocorrência precisa de um id próprio no calendário; o do evento original vai em event_id
+                'id': f"{event.id}:{timezone.localtime(event.start_time):%Y%m%dT%H%M}" if is_occurrence else event.id,
                 'title': event.title,
                 'start': event.start_time.isoformat(),
                 'end': event.end_time.isoformat(),
                 'extendedProps': {
+                    'event_id': event.id,
+                    'is_occurrence': is_occurrence,
                     'description': event.description,
                     'event_type': event.event_type,
                     'status': event.status,
                     'professor_name': str(event.professor) if event.professor else None,
                     'course_name': str(event.course) if event.course else None,
                     'max_participants': event.max_participants,
-                    'current_participants': event.participants.count(),
+                    'current_participants': event.participants_count,
                     'can_edit': can_edit
                 },
                 'className': 'booked'
             }
-            
+
             # Se o usuário atual é o professor do evento ou participante, destaque
-            if request.user == event.professor or request.user in event.participants.all():
+            if is_professor or event.is_my_booking:
                 event_data['className'] = 'my-booking'
-            
+
             result.append(event_data)
-        
+
         return JsonResponse(result, safe=False)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -770,13 +903,115 @@ def api_event_detail(request, pk):
     except Event.DoesNotExist:
         return JsonResponse({'error': 'Event not found'}, status=404)
 
+def _ics_feed_state(request, kind, token):
+    """
+    Eventos, nome e estado (último updated_at e quantidade) do feed iCalendar
+    de um professor ou estúdio, calculados uma vez por requisição. None para
+    token inválido; {'error': ...} para parâmetros de sincronização inválidos.
+    """
+    if not hasattr(request, '_ics_feed_state'):
+        state = None
+        object_id, version = load_feed_token(token, kind) or (None, None)
+        if kind == 'professor':
+            owner = User.objects.filter(
+                pk=object_id, user_type='PROFESSOR', calendar_token_version=version
+            ).first() if object_id else None
+            if owner:
+                events = Event.objects.filter(professor=owner)
+                name = f"{_('Agenda')} - {owner.get_full_name() or owner.email}"
+        else:
+            owner = EventLocation.objects.filter(pk=object_id, calendar_token_version=version).first() if object_id else None
+            if owner:
+                events = Event.objects.filter(location=owner)
+                name = f"{_('Agenda')} - {owner.name}"
+
+        if owner:
+            try:
+                since = parse_since(request)
+            except ValueError as e:
+                state = {'error': str(e)}
+            else:
+                if since:
+                    events = events.filter(updated_at__gt=since)
+                state = events.order_by().aggregate(updated_at=Max('updated_at'), count=Count('id'))
+                state.update(events=events, name=name, since=since, key=(kind, object_id))
+        request._ics_feed_state = state
+    return request._ics_feed_state
+
+
+def _ics_feed_last_modified(request, kind, token):
+    state = _ics_feed_state(request, kind, token)
+    return state.get('updated_at') if state else None
+
+
+def _ics_feed_etag(request, kind, token):
+    state = _ics_feed_state(request, kind, token)
+    if not state or 'error' in state:
+        return None
+    raw = '|'.join(str(value) for value in (*state['key'], state['since'], state['updated_at'], state['count']))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+@condition(etag_func=_ics_feed_etag, last_modified_func=_ics_feed_last_modified)
+def ics_feed(request, kind, token):
+    """
+    Feed iCalendar da agenda de um professor ou estúdio, para assinatura em
+    aplicativos de calendário. Acesso pelo token assinado da URL.
+    """
+    state = _ics_feed_state(request, kind, token)
+    if state is None:
+        return HttpResponseNotFound('Calendário não encontrado')
+    if 'error' in state:
+        return HttpResponseBadRequest(state['error'])
+
+    response = StreamingHttpResponse(
+        iter_calendar(state['events'], state['name']),
+        content_type='text/calendar; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'inline; filename="agenda-{kind}.ics"'
+    sync_token = make_sync_token(state['updated_at'] or state['since'])
+    if sync_token:
+        response['X-Sync-Token'] = sync_token
+    return response
+
+
+@login_required
+@require_POST
+def ics_feed_rotate(request, kind, pk=None):
+    """
+    Gera um novo link de assinatura da agenda do professor (a própria) ou de
+    um estúdio (pelo criador ou um admin); os links anteriores deixam de
+    funcionar.
+    """
+    if kind == 'professor':
+        if request.user.user_type != 'PROFESSOR':
+            return HttpResponseForbidden(_('Acesso restrito a professores.'))
+        owners = User.objects.filter(pk=request.user.pk)
+        next_url = reverse('scheduler:professor_dashboard')
+    else:
+        owner = get_object_or_404(EventLocation, pk=pk)
+        if not _can_rotate_location_feed(request.user, owner):
+            return HttpResponseForbidden(_('Você não tem permissão para alterar este estúdio.'))
+        owners = EventLocation.objects.filter(pk=owner.pk)
+        next_url = reverse('scheduler:location_calendar', args=[owner.pk])
+
+    owners.update(calendar_token_version=F('calendar_token_version') + 1)
+    messages.success(request, _('Novo link da agenda gerado. Os links anteriores deixaram de funcionar.'))
+    return redirect(next_url)
+
+
 class LocationCalendarView(LoginRequiredMixin, DetailView):
     model = EventLocation
     template_name = 'scheduler/calendar.html'
+    context_object_name = 'location'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['title'] = f"{_('Agenda')}: {self.object.name}"
+        context['ics_feed_url'] = self.request.build_absolute_uri(
+            reverse('scheduler:ics_location_feed', args=[feed_token('location', self.object)])
+        )
+        context['can_rotate_ics_feed'] = _can_rotate_location_feed(self.request.user, self.object)
         
         # Adicionar cursos do professor ao contexto
         if self.request.user.user_type == 'PROFESSOR':
@@ -794,9 +1029,14 @@ class LocationCalendarView(LoginRequiredMixin, DetailView):
 
 # API Views
 def api_available_slots(request):
-    """API para fornecer horários disponíveis para uma data e unidade específicas."""
+    """
+    API para fornecer horários disponíveis para uma data e unidade específicas.
+    Com end_date (YYYY-MM-DD), devolve também os slots e intervalos livres/ocupados
+    de cada dia do período, calculados com uma única consulta.
+    """
     try:
         date_str = request.GET.get('date')
+        end_date_str = request.GET.get('end_date')
         location_id = request.GET.get('location')
         custom_check = request.GET.get('custom_check') == 'true'
         custom_start = request.GET.get('start_time')  # Formato HH:MM
@@ -807,6 +1047,7 @@ def api_available_slots(request):
         
         # Converter a string de data para um objeto date
         selected_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+        last_date = datetime.strptime(end_date_str, '%Y-%m-%d').date() if end_date_str else selected_date
         
         # Verificar se a data é válida (não é no passado e está dentro do período permitido)
         today = timezone.localdate()
@@ -815,45 +1056,32 @@ def api_available_slots(request):
         if selected_date < today:
             return JsonResponse({'error': 'Não é possível agendar para datas passadas'}, status=400)
         
-        if selected_date > max_future_date:
+        if selected_date > max_future_date or last_date > max_future_date:
             return JsonResponse({'error': 'Não é possível agendar com mais de 3 meses de antecedência'}, status=400)
         
+        if last_date < selected_date:
+            return JsonResponse({'error': 'A data final deve ser posterior à data inicial'}, status=400)
+        
         # Obter unidade
         try:
             location = EventLocation.objects.get(id=location_id, is_active=True)
         except EventLocation.DoesNotExist:
             return JsonResponse({'error': 'Unidade não encontrada'}, status=404)
         
-        # Definir horários de funcionamento do local
-        # Isso deve vir do modelo de Location no futuro, mas por enquanto vamos padronizar
-        operating_hours = {
-            0: [],  # Segunda (0 = segunda na convenção Python para dias da semana)
-            1: [(time(8, 0), time(20, 0))],  # Terça
-            2: [(time(8, 0), time(20, 0))],  # Quarta
-            3: [(time(8, 0), time(20, 0))],  # Quinta
-            4: [(time(8, 0), time(20, 0))],  # Sexta
-            5: [(time(9, 0), time(16, 0))],  # Sábado
-            6: []  # Domingo
-        }
-        
-        # Obter eventos existentes para a data e local
-        day_start = timezone.make_aware(datetime.combine(selected_date, time.min))
-        day_end = timezone.make_aware(datetime.combine(selected_date, time.max))
+        # Eventos do período carregados uma única vez
+        availability = Availability.for_days(location, selected_date, last_date)
         
-        existing_events = Event.objects.filter(
-            location=location,
-            start_time__date=selected_date,
-            status__in=['SCHEDULED', 'CONFIRMED']  # Considerar apenas eventos não cancelados
-        ).order_by('start_time')
+        def serialize_event(event):
+            return {
+                'id': event.id,
+                'title': event.title,
+                'start': event.start_time.isoformat(),
+                'end': event.end_time.isoformat(),
+                'professor': event.professor.get_full_name() or event.professor.email
+            }
         
         # Para fins de debug, também retornamos os eventos existentes
-        existing_events_data = [{
-            'id': event.id,
-            'title': event.title,
-            'start': event.start_time.isoformat(),
-            'end': event.end_time.isoformat(),
-            'professor': event.professor.get_full_name() or event.professor.email
-        } for event in existing_events]
+        existing_events_data = [serialize_event(event) for event in availability.events_on(selected_date)]
         
         # Se for uma verificação de horário personalizado
         if custom_check and custom_start and custom_end:
@@ -873,21 +1101,8 @@ def api_available_slots(request):
                     return JsonResponse({'error': 'Duração máxima permitida é de 3 horas',
                                         'available': False}, status=400)
                 
-                # Verificar disponibilidade
-                is_available = True
-                conflicting_event = None
-                
                 # Verificar se está dentro do horário de funcionamento
-                weekday = selected_date.weekday()
-                within_operating_hours = False
-                
-                if operating_hours[weekday]:
-                    for open_start, open_end in operating_hours[weekday]:
-                        if start_time >= open_start and end_time <= open_end:
-                            within_operating_hours = True
-                            break
-                
-                if not within_operating_hours:
+                if not availability.within_operating_hours(slot_start, slot_end):
                     return JsonResponse({
                         'available': False,
                         'reason': 'outside_hours',
@@ -895,19 +1110,18 @@ def api_available_slots(request):
                     })
                 
                 # Verificar conflitos com outros eventos
-                for event in existing_events:
-                    if (slot_start < event.end_time and slot_end > event.start_time):
-                        is_available = False
-                        conflicting_event = {
-                            'id': event.id,
-                            'title': event.title,
-                            'start': event.start_time.isoformat(),
-                            'end': event.end_time.isoformat()
-                        }
-                        break
+                conflicts = availability.conflicts(slot_start, slot_end)
+                conflicting_event = None
+                if conflicts:
+                    conflicting_event = {
+                        'id': conflicts[0].id,
+                        'title': conflicts[0].title,
+                        'start': conflicts[0].start_time.isoformat(),
+                        'end': conflicts[0].end_time.isoformat()
+                    }
                 
                 return JsonResponse({
-                    'available': is_available,
+                    'available': not conflicts,
                     'custom_start': slot_start.isoformat(),
                     'custom_end': slot_end.isoformat(),
                     'conflicting_event': conflicting_event,
@@ -917,62 +1131,46 @@ def api_available_slots(request):
             except ValueError as e:
                 return JsonResponse({'error': f'Formato de horário inválido: {str(e)}'}, status=400)
         
-        # Criar slots de tempo disponíveis (padrão de 1 hora)
-        weekday = selected_date.weekday()  # 0 = segunda, 6 = domingo
-        available_slots = []
+        # Slots de 1 hora dentro do horário de funcionamento
+        def serialize_slots(day):
+            return [{
+                'start_time': timezone.localtime(slot['start']).strftime('%H:%M'),
+                'end_time': timezone.localtime(slot['end']).strftime('%H:%M'),
+                'start_time_raw': slot['start'].isoformat(),
+                'end_time_raw': slot['end'].isoformat(),
+                'available': slot['available'],
+                'conflicting_event': {
+                    'id': slot['conflicting_event'].id,
+                    'title': slot['conflicting_event'].title
+                } if slot['conflicting_event'] else None
+            } for slot in availability.slots(day)]
         
-        # Se for um dia em que a unidade funciona
-        if operating_hours[weekday]:
-            for start_hour, end_hour in operating_hours[weekday]:
-                current_time = start_hour
-                while current_time < end_hour:
-                    slot_start = timezone.make_aware(datetime.combine(selected_date, current_time))
-                    
-                    # Duração padrão do slot: 1 hora
-                    next_hour = (
-                        datetime.combine(selected_date, current_time) + timedelta(hours=1)
-                    ).time()
-                    
-                    slot_end = timezone.make_aware(datetime.combine(selected_date, next_hour))
-                    
-                    # Verificar se este slot está disponível
-                    is_available = True
-                    conflicting_event = None
-                    
-                    for event in existing_events:
-                        # Verificar se há sobreposição de horário
-                        if (slot_start < event.end_time and slot_end > event.start_time):
-                            is_available = False
-                            conflicting_event = {
-                                'id': event.id,
-                                'title': event.title
-                            }
-                            break
-                    
-                    # Adicionar o slot à lista
-                    time_slot = {
-                        'start_time': slot_start.strftime('%H:%M'),
-                        'end_time': slot_end.strftime('%H:%M'),
-                        'start_time_raw': slot_start.isoformat(),
-                        'end_time_raw': slot_end.isoformat(),
-                        'available': is_available,
-                        'conflicting_event': conflicting_event
-                    }
-                    
-                    available_slots.append(time_slot)
-                    
-                    # Avançar para o próximo slot
-                    current_time = next_hour
+        def serialize_spans(spans):
+            return [{
+                'start': timezone.localtime(start).isoformat(),
+                'end': timezone.localtime(end).isoformat()
+            } for start, end in spans]
         
-        return JsonResponse({
-            'available_slots': available_slots,
+        data = {
+            'available_slots': serialize_slots(selected_date),
             'existing_events': existing_events_data,
             'date': selected_date.isoformat(),
             'location': {
                 'id': location.id,
                 'name': location.name
             }
-        })
+        }
+        
+        if end_date_str:
+            data['end_date'] = last_date.isoformat()
+            data['days'] = [{
+                'date': day.isoformat(),
+                'available_slots': serialize_slots(day),
+                'free': serialize_spans(availability.free_spans(day)),
+                'busy': serialize_spans(availability.busy_spans(day)),
+            } for day in iter_days(selected_date, last_date)]
+        
+        return JsonResponse(data)
     
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -1049,22 +1247,16 @@ class EventCreateView(LoginRequiredMixin, CreateView):
                 except Course.DoesNotExist:
                     pass
             
-            # Salvar o evento
-            event.save()
+            # Salvar o evento (verificação de conflito e gravação atômicas)
+            try:
+                book_event(event)
+            except BookingConflict as conflict:
+                return _booking_conflict_response(
+                    request, conflict, reverse('scheduler:location_calendar', args=[location_id])
+                )
             
             # 2. Adicionar participantes
-            if request.POST.get('selected_students'):
-                student_ids = [int(sid) for sid in request.POST.get('selected_students').split(',') if sid.strip()]
-                if student_ids:
-                    students = User.objects.filter(id__in=student_ids, user_type='STUDENT')
-                    for student in students:
-                        EventParticipant.objects.create(
-                            event=event,
-                            student=student,
-                            attendance_status='PENDING'
-                        )
-                    
-                    messages.info(request, _(f'Convites enviados para {len(students)} aluno(s).'))
+            _invite_selected_students(request, event, request.POST.get('selected_students'))
             
             # 3. Mostrar mensagem de sucesso
             messages.success(request, _('Agendamento realizado com sucesso!'))
@@ -1151,18 +1343,6 @@ class EventCreateView(LoginRequiredMixin, CreateView):
                 except Course.DoesNotExist:
                     messages.warning(self.request, _('Curso selecionado não encontrado ou não pertence a você.'))
             
-            # Verificar se este horário está disponível
-            overlapping_events = Event.objects.filter(
-                location_id=location_id,
-                start_time__lt=form.instance.end_time,
-                end_time__gt=form.instance.start_time,
-                status__in=['SCHEDULED', 'CONFIRMED']
-            )
-            
-            if overlapping_events.exists():
-                messages.error(self.request, _('Este horário já está ocupado. Por favor, escolha outro.'))
-                return self.form_invalid(form)
-            
             # Configurar status inicial
             form.instance.status = 'SCHEDULED'
             
@@ -1170,24 +1350,16 @@ class EventCreateView(LoginRequiredMixin, CreateView):
             if form.instance.event_type == 'OTHER' and self.request.POST.get('other_type'):
                 form.instance.description = f"Tipo: {self.request.POST.get('other_type')}\n\n{form.instance.description or ''}"
             
-            # Salvar o evento
-            response = super().form_valid(form)
+            # Salvar o evento somente se o horário estiver livre (verificação e gravação atômicas)
+            try:
+                self.object = book_event(form.instance)
+            except BookingConflict as conflict:
+                messages.error(self.request, str(conflict))
+                return self.form_invalid(form)
+            response = HttpResponseRedirect(self.get_success_url())
             
             # Criar participantes se alunos foram selecionados
-            if selected_students:
-                student_ids = [int(id) for id in selected_students.split(',') if id.strip()]
-                if student_ids:
-                    from core.models import User
-                    students = User.objects.filter(id__in=student_ids, user_type='STUDENT')
-                    
-                    for student in students:
-                        EventParticipant.objects.create(
-                            event=self.object,
-                            student=student,
-                            attendance_status='PENDING'
-                        )
-                    
-                    messages.info(self.request, _(f'Convites enviados para {len(students)} aluno(s).'))
+            _invite_selected_students(self.request, self.object, selected_students)
             
             # Adicionar mensagem de sucesso
             messages.success(self.request, _('Agendamento realizado com sucesso!'))
@@ -1357,43 +1529,22 @@ def api_manage_participants(request, event_id):
             if not student_ids:
                 return JsonResponse({'error': 'Lista de IDs de alunos é obrigatória'}, status=400)
             
-            # Verificar se o evento já atingiu o limite de participantes
-            if event.max_participants and event.participants.count() >= event.max_participants:
-                return JsonResponse({
-                    'error': 'Este evento já atingiu o limite máximo de participantes'
-                }, status=400)
-            
-            # Verificar alunos
-            from core.models import User
-            students = User.objects.filter(id__in=student_ids, user_type='STUDENT')
+            # Inclusão em lote, com o limite de vagas verificado na mesma transação
+            try:
+                result = add_participants(event, student_ids, strict=True)
+            except ParticipantError as e:
+                return JsonResponse({'error': str(e)}, status=400)
             
-            if len(students) != len(student_ids):
-                return JsonResponse({'error': 'Um ou mais alunos não encontrados'}, status=400)
+            participants_added = [{
+                'id': participant.id,
+                'student_id': participant.student.id,
+                'name': participant.student.get_full_name() or participant.student.email,
+                'email': participant.student.email,
+                'status': participant.attendance_status,
+                'created': participant.student_id in result['created']
+            } for participant in result['participants']]
             
-            # Adicionar alunos como participantes
-            participants_added = []
-            for student in students:
-                participant, created = EventParticipant.objects.get_or_create(
-                    event=event,
-                    student=student,
-                    defaults={'attendance_status': 'PENDING'}
-                )
-                
-                # Se o participante já existia mas estava cancelado, reativar
-                if not created and participant.attendance_status == 'CANCELLED':
-                    participant.attendance_status = 'PENDING'
-                    participant.save()
-                
-                participants_added.append({
-                    'id': participant.id,
-                    'student_id': student.id,
-                    'name': student.get_full_name() or student.email,
-                    'email': student.email,
-                    'status': participant.attendance_status,
-                    'created': created
-                })
-                
-                # TODO: Enviar notificação para o aluno
+            # TODO: Enviar notificação para o aluno
             
             return JsonResponse({
                 'message': f'{len(participants_added)} participante(s) adicionado(s) com sucesso',
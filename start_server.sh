@@ -67,6 +67,8 @@ else
     
     if [ $? -eq 0 ]; then
         echo "✅ Migrations aplicadas com sucesso!"
+        # Tabela do cache compartilhado entre os processos
+        python3 manage.py createcachetable
     else
         echo "🚨 Erro ao aplicar migrations. Verifique os erros acima."
     fi
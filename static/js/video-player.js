@@ -4,7 +4,8 @@
  * 
  * Recursos:
  * - Monitora o progresso de reprodução do vídeo
- * - Salva a posição atual periodicamente na API
+ * - Salva a posição atual periodicamente na API, acumulando os heartbeats e
+ *   enviando-os em lote (/courses/api/video-progress/batch/)
  * - Retoma a reprodução de onde o usuário parou
  * - Rastreia segmentos assistidos do vídeo
  * - Marca aula como concluída automaticamente quando o aluno assiste a uma porcentagem definida
@@ -43,7 +44,11 @@ class VideoProgressTracker {
         this.isPlaying = false;
         this.isPlayerReady = false;
         this.lastUpdateTime = 0;
-        this.updateInterval = 5000; // Atualiza a cada 5 segundos
+        this.updateInterval = 5000; // Registra um heartbeat a cada 5 segundos
+        this.flushInterval = 30000; // Envia os heartbeats acumulados a cada 30 segundos
+        this.maxPendingHeartbeats = 200; // Limite aceito pelo endpoint de lote
+        this.pendingHeartbeats = [];
+        this.lastFlushTime = Date.now();
         this.segments = []; // Segmentos assistidos: [[start1, end1], [start2, end2], ...]
         this.currentSegment = null;
         this.isComplete = false;
@@ -58,6 +63,13 @@ class VideoProgressTracker {
     init() {
         this.log('Inicializando rastreador de progresso de vídeo');
         
+        // Envia os heartbeats acumulados quando a página é escondida ou fechada
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'hidden') {
+                this.flushHeartbeats(true);
+            }
+        });
+        
         // Se for explicitamente marcado como vídeo HTML5
         if (this.isHtml5Video) {
             this.log('Vídeo HTML5 detectado (configuração explícita), inicializando eventos');
@@ -319,10 +331,10 @@ class VideoProgressTracker {
         // Atualiza a barra de progresso, se existir
         this.updateProgressBar();
         
-        // Salva o progresso periodicamente
+        // Registra o progresso periodicamente (enviado em lote)
         const now = Date.now();
         if (now - this.lastUpdateTime > this.updateInterval) {
-            this.saveProgress();
+            this.saveProgress(false);
             this.lastUpdateTime = now;
         }
     }
@@ -456,37 +468,59 @@ class VideoProgressTracker {
     }
 
     /**
-     * Salva o progresso atual na API
+     * Registra o progresso atual como heartbeat e o envia à API
+     * @param {Boolean} immediate Envia já os heartbeats acumulados (pausa, fim do vídeo);
+     *                            caso contrário, só envia quando flushInterval venceu
      */
-    async saveProgress() {
+    async saveProgress(immediate = true) {
         // Finaliza o segmento atual se estiver ativo
         if (this.currentSegment !== null) {
             this.endSegment();
             this.startSegment(); // Reinicia o segmento
         }
         
-        // Otimiza os segmentos para enviar
-        const optimizedSegments = this.optimizeSegments();
-        
-        const formData = new FormData();
-        formData.append('lesson_id', this.lessonId);
-        formData.append('current_time', Math.floor(this.currentTime));
+        const heartbeat = {
+            lesson_id: this.lessonId,
+            current_time: Math.floor(this.currentTime)
+        };
         
         if (this.duration) {
-            formData.append('duration', Math.floor(this.duration));
+            heartbeat.duration = Math.floor(this.duration);
         }
         
+        // Otimiza os segmentos para enviar
+        const optimizedSegments = this.optimizeSegments();
         if (optimizedSegments.length) {
-            formData.append('watched_segments', JSON.stringify(optimizedSegments));
+            heartbeat.watched_segments = optimizedSegments;
+        }
+        
+        this.pendingHeartbeats.push(heartbeat);
+        
+        if (immediate || Date.now() - this.lastFlushTime >= this.flushInterval) {
+            return this.flushHeartbeats();
         }
+        return null;
+    }
+
+    /**
+     * Envia os heartbeats acumulados em uma única requisição
+     * @param {Boolean} keepalive Mantém a requisição ao sair da página
+     */
+    async flushHeartbeats(keepalive = false) {
+        if (!this.pendingHeartbeats.length) return null;
+        
+        const heartbeats = this.pendingHeartbeats.splice(0);
+        this.lastFlushTime = Date.now();
         
         try {
-            const response = await fetch('/courses/api/video-progress/update/', {
+            const response = await fetch('/courses/api/video-progress/batch/', {
                 method: 'POST',
                 headers: {
+                    'Content-Type': 'application/json',
                     'X-CSRFToken': this.csrfToken
                 },
-                body: formData
+                body: JSON.stringify({ heartbeats: heartbeats }),
+                keepalive: keepalive
             });
             
             if (!response.ok) {
@@ -494,12 +528,13 @@ class VideoProgressTracker {
             }
             
             const data = await response.json();
+            const result = data.success && (data.data || []).find(item => item.lesson_id === this.lessonId);
             
-            if (data.success) {
-                this.log('Progresso salvo:', data.data);
+            if (result && result.success) {
+                this.log('Progresso salvo:', result);
                 
                 // Atualiza o status de conclusão
-                if (data.data.is_completed && !this.isComplete) {
+                if (result.is_completed && !this.isComplete) {
                     this.isComplete = true;
                     this.log('Aula marcada como concluída');
                     
@@ -507,18 +542,20 @@ class VideoProgressTracker {
                     const event = new CustomEvent('lessonCompleted', {
                         detail: {
                             lessonId: this.lessonId,
-                            percentage: data.data.percentage
+                            percentage: result.percentage
                         }
                     });
                     document.dispatchEvent(event);
                 }
                 
-                return data.data;
-            } else {
-                throw new Error(data.message || 'Erro desconhecido ao salvar progresso');
+                return result;
             }
+            // Recusa da API (matrícula inativa, por exemplo): não adianta reenviar
+            this.log('Progresso não salvo: ' + ((result && result.message) || data.message || 'erro desconhecido'), 'error');
         } catch (error) {
             this.log('Erro ao salvar progresso: ' + error.message, 'error');
+            // Devolve os heartbeats para a próxima tentativa, sem passar do limite do lote
+            this.pendingHeartbeats = heartbeats.concat(this.pendingHeartbeats).slice(-this.maxPendingHeartbeats);
         }
         
         return null;
@@ -46,9 +46,12 @@ def test_pdf_attachment():
     # Inicializar o serviço de email
     email_service = EmailService()
     
-    # Debug detalhado do processo
-    print("\n🔍 EXECUTANDO DEBUG DETALHADO:")
-    success = email_service.debug_pdf_attachment(invoice)
+    # Mesmo caminho do envio real (cache de documentos, API da NFE.io e focus_pdf_url)
+    print("\n🔍 BUSCANDO O PDF:")
+    pdf_content = email_service.resolve_pdf(invoice)
+    success = bool(pdf_content)
+    if success:
+        print(f"📎 PDF obtido ({len(pdf_content)} bytes)")
     
     if success:
         print("\n✅ TESTE CONCLUÍDO COM SUCESSO!")